@@ -0,0 +1,186 @@
+import httplib
+import json
+import socket
+import struct
+
+# Kafka API keys of the requests the probe sends. Version 0 of both requests is used.
+KAFKA_OFFSET_REQUEST = 2
+KAFKA_METADATA_REQUEST = 3
+KAFKA_CLIENT_ID = 'lambda-activity-probe'
+
+
+class ActivityProbe(object):
+    """
+    Samples the activity of the services of a lambda instance through the master, with one or two
+    cheap requests to every service: the applications of YARN from the ResourceManager REST API,
+    the jobs of Flink from the web server of the JobManager, and the log end offsets of the Kafka
+    partitions that the broker of the master leads. Producers spread their messages over all the
+    partitions of a topic, so any traffic on a topic moves the offsets of the master as well.
+    Every sample of a service that cannot be reached, e.g. because it is not installed, is None.
+    """
+
+    def __init__(self, host, yarn_port=8088, flink_port=8081, kafka_port=9092, timeout=5):
+        """
+        :param host: The host name or the ip of the master.
+        :param yarn_port: The port of the web server of the YARN ResourceManager.
+        :param flink_port: The port of the web server of the Flink JobManager.
+        :param kafka_port: The port of the Kafka broker.
+        :param timeout: The number of seconds to wait for every response.
+        """
+        self.host = host
+        self.yarn_port = yarn_port
+        self.flink_port = flink_port
+        self.kafka_port = kafka_port
+        self.timeout = timeout
+
+    def get_json(self, port, url):
+        connection = httplib.HTTPConnection(self.host, port, timeout=self.timeout)
+        try:
+            connection.request('GET', url, headers={'Accept': 'application/json'})
+            response = connection.getresponse()
+            content = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise IOError("GET {} returned status {}".format(url, response.status))
+        return json.loads(content)
+
+    def yarn_applications(self):
+        """
+        :returns: The number of running and pending YARN applications.
+        """
+        metrics = self.get_json(self.yarn_port, '/ws/v1/cluster/metrics')['clusterMetrics']
+        return metrics['appsRunning'] + metrics['appsPending']
+
+    def flink_jobs(self):
+        """
+        :returns: The number of running Flink jobs.
+        """
+        jobs = self.get_json(self.flink_port, '/jobsInfo')
+        return len([job for job in jobs if job.get('status') in ('CREATED', 'RUNNING')])
+
+    def kafka_request(self, connection, api_key, correlation_id, body):
+        header = struct.pack('>hhih', api_key, 0, correlation_id, len(KAFKA_CLIENT_ID)) + \
+            KAFKA_CLIENT_ID
+        connection.sendall(struct.pack('>i', len(header) + len(body)) + header + body)
+        size = struct.unpack('>i', self.kafka_read(connection, 4))[0]
+        response = KafkaResponse(self.kafka_read(connection, size))
+        if response.int32() != correlation_id:
+            raise IOError("Unexpected Kafka response")
+        return response
+
+    @staticmethod
+    def kafka_read(connection, size):
+        data = ''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise IOError("Kafka closed the connection")
+            data += chunk
+        return data
+
+    def kafka_offset(self):
+        """
+        :returns: The sum of the log end offsets of the Kafka partitions that the broker of the
+                  master leads. It grows whenever messages are produced.
+        """
+        connection = socket.create_connection((self.host, self.kafka_port), self.timeout)
+        try:
+            # List all the topics and their partitions.
+            metadata = self.kafka_request(connection, KAFKA_METADATA_REQUEST, 1,
+                                          struct.pack('>i', 0))
+            for _ in range(metadata.int32()):
+                metadata.int32(), metadata.string(), metadata.int32()
+            partitions = {}
+            for _ in range(metadata.int32()):
+                metadata.int16()
+                topic = metadata.string()
+                partitions[topic] = []
+                for _ in range(metadata.int32()):
+                    metadata.int16()
+                    partitions[topic].append(metadata.int32())
+                    metadata.int32()
+                    for _ in range(metadata.int32()):
+                        metadata.int32()
+                    for _ in range(metadata.int32()):
+                        metadata.int32()
+
+            # Get the latest offset of every partition. The partitions that other brokers lead
+            # return an error and are skipped.
+            body = struct.pack('>ii', -1, len(partitions))
+            for topic, partition_ids in partitions.items():
+                body += struct.pack('>h', len(topic)) + topic + \
+                    struct.pack('>i', len(partition_ids))
+                for partition_id in partition_ids:
+                    body += struct.pack('>iqi', partition_id, -1, 1)
+            offsets = self.kafka_request(connection, KAFKA_OFFSET_REQUEST, 2, body)
+            total = 0
+            for _ in range(offsets.int32()):
+                offsets.string()
+                for _ in range(offsets.int32()):
+                    offsets.int32()
+                    error = offsets.int16()
+                    values = [offsets.int64() for _ in range(offsets.int32())]
+                    if error == 0 and values:
+                        total += values[0]
+            return total
+        finally:
+            connection.close()
+
+    def sample(self):
+        """
+        :returns: Dictionary with the yarn_applications, the flink_jobs and the kafka_offset of
+                  the lambda instance.
+        """
+        result = {}
+        for name, probe in (('yarn_applications', self.yarn_applications),
+                            ('flink_jobs', self.flink_jobs),
+                            ('kafka_offset', self.kafka_offset)):
+            try:
+                result[name] = probe()
+            except (IOError, httplib.HTTPException, ValueError, KeyError, TypeError,
+                    struct.error):
+                result[name] = None
+        return result
+
+
+class KafkaResponse(object):
+    """
+    Reads the fields of a response of the Kafka protocol.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        value = struct.unpack_from(fmt, self.data, self.offset)[0]
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def int16(self):
+        return self.unpack('>h')
+
+    def int32(self):
+        return self.unpack('>i')
+
+    def int64(self):
+        return self.unpack('>q')
+
+    def string(self):
+        length = self.int16()
+        value = self.data[self.offset:self.offset + max(length, 0)]
+        self.offset += max(length, 0)
+        return value
+
+
+def is_active(sample, previous_kafka_offset):
+    """
+    :param sample: A sample of the activity of a lambda instance, as returned by
+                   ActivityProbe.sample.
+    :param previous_kafka_offset: The kafka_offset of the previous sample, if any.
+    :returns: Whether the lambda instance was doing any work when it was sampled.
+    """
+    return bool(sample.get('yarn_applications')) or bool(sample.get('flink_jobs')) or \
+        (sample.get('kafka_offset') is not None and previous_kafka_offset is not None and
+         sample['kafka_offset'] != previous_kafka_offset)
@@ -0,0 +1,135 @@
+import time
+from os import path
+
+# ansible.utils must be imported before ansible.callbacks, otherwise their circular import fails.
+from ansible import utils  # noqa
+from ansible import callbacks
+
+# Outcomes of a task on a host, ordered from the least to the most significant. When a task
+# reports more than once for the same host (e.g. with_items loops), the most significant outcome
+# is the one kept.
+OUTCOMES = ('skipped', 'ok', 'changed', 'failed', 'unreachable')
+
+
+class TaskTimer(object):
+    """
+    Records the start time, the end time and the outcome of every task of a playbook run, for
+    every host the task ran on.
+    Ansible does not report when a task actually starts on a host, so the start time of a task on
+    every host is the time the task was started by the playbook. The end time is the time the
+    last result of the task was reported for the host.
+    """
+
+    def __init__(self, playbook_file, listener=None):
+        """
+        :param playbook_file: The playbook file that is being run.
+        :param listener: Optional callable that gets called with the list of the records of
+                         every task, when the task is completed.
+        """
+        self.playbook = path.basename(playbook_file)
+        self.listener = listener
+        self.records = []
+
+        self.task_name = None
+        self.task_start = None
+        self.pending = {}
+
+    def task_started(self, name):
+        """
+        Completes the records of the previous task and starts timing a new one.
+        :param name: The name of the task.
+        """
+        self.flush()
+        self.task_name = name
+        self.task_start = time.time()
+
+    def host_reported(self, host, outcome):
+        """
+        Updates the record of the current task for the specified host.
+        :param host: The name of the host.
+        :param outcome: One of OUTCOMES.
+        """
+        if self.task_name is None:
+            return
+
+        record = self.pending.get(host)
+        if record is None:
+            record = {'playbook': self.playbook,
+                      'task': self.task_name,
+                      'host': host,
+                      'start': self.task_start,
+                      'outcome': outcome}
+            self.pending[host] = record
+        elif OUTCOMES.index(outcome) > OUTCOMES.index(record['outcome']):
+            record['outcome'] = outcome
+        record['end'] = time.time()
+
+    def flush(self):
+        """
+        Completes the records of the current task.
+        """
+        task_records = [self.pending[host] for host in sorted(self.pending)]
+        self.records.extend(task_records)
+        if task_records and self.listener:
+            self.listener(task_records)
+        self.pending = {}
+        self.task_name = None
+        self.task_start = None
+
+
+class TimingPlaybookCallbacks(callbacks.PlaybookCallbacks):
+    """
+    Playbook callbacks that notify a TaskTimer about the tasks being started.
+    """
+
+    def __init__(self, timer, verbose=False):
+        super(TimingPlaybookCallbacks, self).__init__(verbose=verbose)
+        self.timer = timer
+
+    def on_task_start(self, name, is_conditional):
+        self.timer.task_started(name)
+        super(TimingPlaybookCallbacks, self).on_task_start(name, is_conditional)
+
+    def on_setup(self):
+        self.timer.task_started('GATHERING FACTS')
+        super(TimingPlaybookCallbacks, self).on_setup()
+
+    def on_stats(self, stats):
+        self.timer.flush()
+        super(TimingPlaybookCallbacks, self).on_stats(stats)
+
+
+class TimingRunnerCallbacks(callbacks.PlaybookRunnerCallbacks):
+    """
+    Playbook runner callbacks that notify a TaskTimer about the results of the tasks on every
+    host.
+    """
+
+    def __init__(self, timer, stats, verbose=None):
+        super(TimingRunnerCallbacks, self).__init__(stats, verbose=verbose)
+        self.timer = timer
+
+    def on_ok(self, host, host_result):
+        outcome = 'changed' if host_result.get('changed', False) else 'ok'
+        self.timer.host_reported(host, outcome)
+        super(TimingRunnerCallbacks, self).on_ok(host, host_result)
+
+    def on_failed(self, host, results, ignore_errors=False):
+        self.timer.host_reported(host, 'ok' if ignore_errors else 'failed')
+        super(TimingRunnerCallbacks, self).on_failed(host, results, ignore_errors=ignore_errors)
+
+    def on_unreachable(self, host, results):
+        self.timer.host_reported(host, 'unreachable')
+        super(TimingRunnerCallbacks, self).on_unreachable(host, results)
+
+    def on_skipped(self, host, item=None):
+        self.timer.host_reported(host, 'skipped')
+        super(TimingRunnerCallbacks, self).on_skipped(host, item=item)
+
+    def on_async_ok(self, host, res, jid):
+        self.timer.host_reported(host, 'changed' if res.get('changed', False) else 'ok')
+        super(TimingRunnerCallbacks, self).on_async_ok(host, res, jid)
+
+    def on_async_failed(self, host, res, jid):
+        self.timer.host_reported(host, 'failed')
+        super(TimingRunnerCallbacks, self).on_async_failed(host, res, jid)
@@ -6,6 +6,9 @@ from ansible.playbook import PlayBook
 from ansible import callbacks
 from ansible import utils
 
+from fokia.ansible_callbacks import TaskTimer, TimingPlaybookCallbacks, TimingRunnerCallbacks
+from fokia.cluster_sizing import compute_cluster_settings
+
 
 class Manager:
     def __init__(self, provisioner_response):
@@ -20,6 +23,8 @@ class Manager:
                 {'name': 'snf-' + str(response['id']),
                  'ip': response['internal_ip']})
         self.cidr = provisioner_response['subnet']['cidr']
+        self.cluster_settings = self.get_cluster_settings(provisioner_response['nodes'])
+        self.task_timings = []
 
         with tempfile.NamedTemporaryFile(mode='w', delete=False) as kf:
             kf.write(provisioner_response['pk'])
@@ -32,6 +37,22 @@ class Manager:
         ansible.constants.HOST_KEY_CHECKING = False
         # ansible.constants.DEFAULT_GATHERING = 'explicit'
 
+    @staticmethod
+    def get_cluster_settings(nodes):
+        """
+        Compute the settings of the lambda services from the flavors of the nodes
+        :param nodes: The nodes of the provisioner response
+        :return: The variables of the inventory groups, or None if the flavors are not known
+        """
+        slaves = nodes['slaves']
+        if not slaves or not all(['ram' in node and 'vcpus' in node
+                                  for node in [nodes['master']] + slaves]):
+            return None
+        return compute_cluster_settings(slaves=len(slaves),
+                                        ram_master=nodes['master']['ram'],
+                                        vcpus_slave=min([node['vcpus'] for node in slaves]),
+                                        ram_slave=min([node['ram'] for node in slaves]))
+
     def create_inventory(self):
         """
         Create the inventory using the ansible library objects
@@ -74,21 +95,36 @@ class Manager:
         self.ansible_inventory.add_group(slaves_group)
         all_group.add_child_group(slaves_group)
 
+        if self.cluster_settings:
+            for group, variables in [(all_group, self.cluster_settings['all']),
+                                     (master_group, self.cluster_settings['master']),
+                                     (slaves_group, self.cluster_settings['slaves'])]:
+                for name, value in variables.items():
+                    group.set_variable(name, value)
+
         # print self.ansible_inventory.groups_list()
         return self.ansible_inventory
 
-    def run_playbook(self, playbook_file, tags=None):
+    def run_playbook(self, playbook_file, tags=None, task_listener=None):
         """
-        Run the playbook_file using created inventory and tags specified
+        Run the playbook_file using created inventory and tags specified. The per-task, per-host
+        timings of the run are kept in self.task_timings.
+        :param task_listener: Optional callable that gets called with the timings of every task,
+                              as soon as the task is completed.
         :return:
         """
+        timer = TaskTimer(playbook_file, listener=task_listener)
         stats = callbacks.AggregateStats()
-        playbook_cb = callbacks.PlaybookCallbacks(verbose=utils.VERBOSITY)
-        runner_cb = callbacks.PlaybookRunnerCallbacks(stats, verbose=utils.VERBOSITY)
+        playbook_cb = TimingPlaybookCallbacks(timer, verbose=utils.VERBOSITY)
+        runner_cb = TimingRunnerCallbacks(timer, stats, verbose=utils.VERBOSITY)
         pb = PlayBook(playbook=playbook_file, inventory=self.ansible_inventory, stats=stats,
                       callbacks=playbook_cb,
                       runner_callbacks=runner_cb, only_tags=tags)
-        playbook_result = pb.run()
+        try:
+            playbook_result = pb.run()
+        finally:
+            timer.flush()
+            self.task_timings = timer.records
         return playbook_result
 
     def cleanup(self):
@@ -0,0 +1,143 @@
+"""
+This module derives the memory and parallelism settings of the lambda services from the flavors
+of the VMs and the size of a lambda instance. The settings are passed to the ansible playbooks as
+inventory variables, overriding the defaults of the ansible roles.
+All memory amounts are in MB.
+"""
+
+# Memory reserved for the operating system, based on the total memory of a VM. VMs with more
+# memory than the last entry reserve an eighth of it.
+os_reserved_memory = ((2048, 512), (4096, 1024), (8192, 2048), (16384, 2048), (24576, 4096),
+                      (49152, 6144))
+
+# Minimum size of a YARN container, based on the total memory of a VM. VMs with more memory than
+# the last entry use 2048.
+yarn_minimum_allocation = ((4096, 256), (8192, 512), (24576, 1024))
+
+# Memory that the Apache Flink JobManager needs. It runs in a YARN container on one of the slaves.
+flink_jobmanager_memory = 768
+
+# Maximum number of replicas of HDFS blocks and Apache Kafka partitions.
+max_replication = 3
+
+
+def round_down(amount, step):
+    return amount // step * step
+
+
+def round_up(amount, step):
+    return -(-amount // step) * step
+
+
+def get_os_reserved_memory(ram):
+    for max_ram, reserved in os_reserved_memory:
+        if ram <= max_ram:
+            return reserved
+    return ram // 8
+
+
+def get_yarn_minimum_allocation(ram):
+    for max_ram, minimum_allocation in yarn_minimum_allocation:
+        if ram <= max_ram:
+            return minimum_allocation
+    return 2048
+
+
+def get_kafka_heap(ram):
+    """
+    Apache Kafka relies on the page cache rather than on its heap, so an eighth of the memory, up
+    to Kafka's default of 1GB, is enough.
+    """
+    return min(max(ram // 8, 256), 1024)
+
+
+def get_yarn_memory(ram_slave):
+    """
+    Splits the memory of a slave among YARN and the containers of Apache Flink.
+    :param ram_slave: The memory of every slave.
+    :returns: A tuple with the minimum allocation of YARN, the memory of the NodeManager, and the
+              memory of the JobManager and of the TaskManager containers.
+    """
+    # YARN gets the memory of the slaves that is left by the operating system and Apache Kafka.
+    minimum_allocation = get_yarn_minimum_allocation(ram_slave)
+    nodemanager_memory = max(minimum_allocation, round_down(
+        ram_slave - get_os_reserved_memory(ram_slave) - get_kafka_heap(ram_slave),
+        minimum_allocation))
+
+    # Every TaskManager leaves enough memory on its slave for the JobManager container, so that
+    # the JobManager fits on any of the slaves.
+    jobmanager_memory = round_up(flink_jobmanager_memory, minimum_allocation)
+    taskmanager_memory = round_down(nodemanager_memory - jobmanager_memory, minimum_allocation)
+    if taskmanager_memory < minimum_allocation:
+        jobmanager_memory = minimum_allocation
+        taskmanager_memory = round_down(nodemanager_memory - jobmanager_memory,
+                                        minimum_allocation)
+    return minimum_allocation, nodemanager_memory, jobmanager_memory, taskmanager_memory
+
+
+def fits_flink_session(ram_slave):
+    """
+    :param ram_slave: The memory of every slave.
+    :returns: True if a slave has enough memory for the JobManager and a TaskManager, so that
+              YARN can schedule the Apache Flink session.
+    """
+    minimum_allocation, _, _, taskmanager_memory = get_yarn_memory(ram_slave)
+    return taskmanager_memory >= minimum_allocation
+
+
+def compute_cluster_settings(slaves, ram_master, vcpus_slave, ram_slave):
+    """
+    Computes the settings of Apache Hadoop, Apache Kafka and Apache Flink for a lambda instance.
+    Apache Kafka brokers run on every node, YARN NodeManagers and HDFS DataNodes run on the slaves
+    and Apache Flink runs as a YARN session with one TaskManager on every slave.
+    :param slaves: The number of slaves.
+    :param ram_master: The memory of the master.
+    :param vcpus_slave: The number of CPUs of every slave.
+    :param ram_slave: The memory of every slave.
+    :returns: A dictionary with the variables of the groups all, master and slaves.
+    :raises ValueError: If the slaves do not have enough memory for the Apache Flink session.
+    """
+    if not fits_flink_session(ram_slave):
+        raise ValueError("The slaves need more than {} MB of memory to run Apache Flink".
+                         format(ram_slave))
+
+    brokers = slaves + 1
+    kafka_heap_slave = get_kafka_heap(ram_slave)
+    minimum_allocation, nodemanager_memory, jobmanager_memory, taskmanager_memory = \
+        get_yarn_memory(ram_slave)
+
+    # One task slot for every CPU of the slaves.
+    task_slots = vcpus_slave
+    parallelism = slaves * task_slots
+
+    all_variables = {
+        # Apache Hadoop
+        'dfs_replication': min(max_replication, slaves),
+        'yarn_nodemanager_memory_mb': nodemanager_memory,
+        'yarn_nodemanager_vcores': vcpus_slave,
+        'yarn_scheduler_minimum_allocation_mb': minimum_allocation,
+        'yarn_scheduler_maximum_allocation_mb': nodemanager_memory,
+        'yarn_scheduler_maximum_allocation_vcores': vcpus_slave,
+
+        # Apache Flink, used both by the common and the apache-flink roles.
+        'flink_number_of_task_managers': slaves,
+        'flink_ram_per_task_manager': taskmanager_memory,
+        'flink_ram_per_job_manager': jobmanager_memory,
+        'flink_slots_per_task_manager': task_slots,
+        'number_of_taskmanagers': slaves,
+        'ram_per_task_manager': taskmanager_memory,
+        'ram_per_job_manager': jobmanager_memory,
+        'jobmanager_heap_mb': jobmanager_memory * 3 // 4,
+        'taskmanager_heap_mb': taskmanager_memory * 3 // 4,
+        'taskmanager_numberOfTaskSlots': task_slots,
+        'parallelization_degree_default': parallelism,
+
+        # Apache Kafka. There are enough partitions for every parallel Apache Flink task to
+        # consume from its own partition.
+        'kafka_partitions': max(brokers, parallelism),
+        'kafka_replication_factor': min(max_replication, brokers),
+    }
+
+    return {'all': all_variables,
+            'master': {'kafka_heap_mb': get_kafka_heap(ram_master)},
+            'slaves': {'kafka_heap_mb': kafka_heap_slave}}
@@ -1,6 +1,7 @@
 import time
 from fokia.provisioner import Provisioner
 from fokia.ansible_manager import Manager
+from fokia.ssh_prober import SSHProber
 # script_path = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 script_path = '/var/www/okeanos-LoD/core/fokia'
 
@@ -74,9 +75,11 @@ def create_lambda_instance(auth_token=None, master_name='lambda-master',
 def create_cluster(auth_token=None, master_name='lambda-master',
                    slaves=1, vcpus_master=4, vcpus_slave=4,
                    ram_master=4096, ram_slave=4096, disk_master=40, disk_slave=40,
-                   ip_allocation='master', network_request=1, project_name='lambda.grnet.gr'):
+                   ip_allocation='master', network_request=1, project_name='lambda.grnet.gr',
+                   listener=None):
     provisioner = Provisioner(auth_token=auth_token)
     provisioner.create_lambda_cluster(vm_name=master_name,
+                                      listener=listener,
                                       slaves=slaves,
                                       vcpus_master=vcpus_master,
                                       vcpus_slave=vcpus_slave,
@@ -98,15 +101,75 @@ def create_cluster(auth_token=None, master_name='lambda-master',
         provisioner_response['nodes']['slaves'][i]['internal_ip'] = slave_ip
     provisioner_response['pk'] = provisioner.get_private_key()
 
+    # The flavors of the nodes are used to compute the settings of the lambda services.
+    provisioner_response['nodes']['master'].update(vcpus=vcpus_master, ram=ram_master,
+                                                   disk=disk_master)
+    for slave in provisioner_response['nodes']['slaves']:
+        slave.update(vcpus=vcpus_slave, ram=ram_slave, disk=disk_slave)
+
+    ansible_manager = create_ansible_manager(provisioner_response)
+
+    # The latencies are returned with the response, so that the nodes that are not reachable
+    # are reported and the playbooks are not run on them.
+    provisioner_response['ssh_latencies'] = \
+        wait_for_ssh(ansible_manager, provisioner_response, provisioner.boot_times, listener)
+
+    return ansible_manager, provisioner_response
+
+
+def get_unreachable_nodes(provisioner_response):
+    """
+    :param provisioner_response: The response of create_cluster.
+    :returns: The sorted names of the nodes that were not reachable over SSH.
+    """
+    return sorted(name for name, latency in provisioner_response['ssh_latencies'].items()
+                  if latency is None)
+
+
+def wait_for_ssh(ansible_manager, provisioner_response, boot_times=None, listener=None):
+    """
+    Waits until all the nodes of a cluster accept SSH connections, so that the playbooks can be
+    run on them.
+    :param ansible_manager: The ansible manager of the cluster.
+    :param provisioner_response: The cluster creator response, with the internal ips of the nodes.
+    :param boot_times: Optional dictionary with the names of the nodes as keys and the times
+                       their VMs were created as values.
+    :param listener: Optional callable that gets called with a message when a node is ready.
+    :returns: Dictionary with the names of the nodes as keys and their boot-to-SSH latencies as
+              values. The latency of the nodes that were not reachable is None.
+    """
+    def node_ready(name, latency):
+        if listener:
+            listener('VM ' + name + ' reachable over SSH after ' + str(int(latency)) + ' seconds')
+
+    prober = SSHProber(ansible_manager.inventory['master']['name'] + '.vm.okeanos.grnet.gr',
+                       ansible_manager.temp_file)
+    slave_ips = {slave['name']: slave['internal_ip']
+                 for slave in provisioner_response['nodes']['slaves']}
+    return prober.wait_for_nodes(provisioner_response['nodes']['master']['name'], slave_ips,
+                                 boot_times=boot_times, listener=node_ready)
+
+
+def create_ansible_manager(provisioner_response):
+    """
+    Creates an ansible manager, along with its inventory, for an existing cluster.
+    :param provisioner_response: A dictionary in the format of the cluster creator response. Only
+                                 the ids, the internal ips and the flavors (vcpus, ram) of the
+                                 nodes, the cidr of the subnet and the private key are needed. If
+                                 the flavors are missing, the defaults of the ansible roles are
+                                 used for the settings of the lambda services.
+    :returns: The ansible manager.
+    """
     ansible_manager = Manager(provisioner_response)
     ansible_manager.create_inventory()
 
-    return ansible_manager, provisioner_response
+    return ansible_manager
 
 
-def run_playbook(ansible_manager, playbook):
+def run_playbook(ansible_manager, playbook, task_listener=None):
     ansible_result = ansible_manager.run_playbook(
-        playbook_file=script_path + "/../../ansible/playbooks/" + playbook)
+        playbook_file=script_path + "/../../ansible/playbooks/" + playbook,
+        task_listener=task_listener)
     return ansible_result
 
 
@@ -0,0 +1,208 @@
+import time
+from multiprocessing.pool import ThreadPool
+
+from kamaki.clients import ClientError
+from kamaki.clients.astakos import AstakosClient
+from kamaki.clients.cyclades import CycladesComputeClient, CycladesNetworkClient
+
+# The action of every operation on the VMs and the status the VMs reach when it is complete.
+SERVER_ACTIONS = {
+    'start': ('start_server', 'ACTIVE'),
+    'stop': ('shutdown_server', 'STOPPED'),
+    'destroy': ('delete_server', 'DELETED'),
+}
+
+
+class VMStatusError(Exception):
+    pass
+
+
+def get_steps(operation, master_id, slave_ids):
+    """
+    :returns: The groups of VMs the action of an operation is applied to, one group after the
+              other. Slave nodes must be started before the master node, and the master node must
+              be stopped before the slave nodes, so that the lambda services start and stop
+              properly. Destroying does not care for the lambda services.
+    """
+    master_ids = [master_id] if master_id is not None else []
+    if operation == 'start':
+        return [list(slave_ids), master_ids]
+    elif operation == 'stop':
+        return [master_ids, list(slave_ids)]
+    return [master_ids + list(slave_ids)]
+
+
+def create_clients(auth_url, auth_token):
+    """
+    :returns: A tuple with a cyclades compute client and a cyclades network client.
+    """
+    astakos_client = AstakosClient(auth_url, auth_token)
+    compute_client = CycladesComputeClient(
+        astakos_client.get_endpoint_url(CycladesComputeClient.service_type), auth_token)
+    network_client = CycladesNetworkClient(
+        astakos_client.get_endpoint_url(CycladesNetworkClient.service_type), auth_token)
+    return compute_client, network_client
+
+
+def get_cloud_state(auth_url, auth_token, deleted_since=None):
+    """
+    Lists all the VMs and the networks of a user, with a fixed number of requests, no matter how
+    many they are.
+    :param auth_url: The authentication url for ~okeanos API.
+    :param auth_token: The authentication token of the user.
+    :param deleted_since: Optional ISO 8601 time. The VMs deleted after it are listed as well,
+                          with the status DELETED.
+    :returns: A tuple with a dictionary with the status of every VM and a set with the ids of
+              the networks.
+    """
+    compute_client, network_client = create_clients(auth_url, auth_token)
+    statuses = {}
+    if deleted_since:
+        for server in compute_client.list_servers(detail=True, changes_since=deleted_since):
+            if server['status'] == 'DELETED':
+                statuses[str(server['id'])] = 'DELETED'
+    for server in compute_client.list_servers(detail=True):
+        statuses[str(server['id'])] = server['status']
+    network_ids = {str(network['id']) for network in network_client.list_networks()}
+    return statuses, network_ids
+
+
+class BulkLifecycle(object):
+    """
+    Starts, stops or destroys many lambda instances of the same user at once. The kamaki clients
+    are created once and shared by all the lambda instances, the actions on the VMs are sent
+    concurrently, and a single listing of the VMs of the user is polled for the statuses of all
+    the VMs, instead of waiting for every VM separately. Every lambda instance moves on to its
+    next group of VMs as soon as its current one is ready, without waiting for the others.
+    """
+
+    def __init__(self, auth_url, auth_token, parallelism=8, poll_interval=5, max_wait=600):
+        """
+        :param auth_url: The authentication url for ~okeanos API.
+        :param auth_token: The authentication token of the owner of the lambda instances.
+        :param parallelism: The maximum number of requests to ~okeanos sent concurrently.
+        :param poll_interval: The number of seconds between two listings of the VMs.
+        :param max_wait: The number of seconds after which the lambda instances whose VMs have
+                         not reached the expected status fail.
+        """
+        self.compute_client, self.network_client = create_clients(auth_url, auth_token)
+        self.parallelism = parallelism
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+
+    def get_statuses(self):
+        """
+        :returns: Dictionary with the status of every VM of the user. Deleted VMs are not listed.
+        """
+        return {str(server['id']): server['status']
+                for server in self.compute_client.list_servers(detail=True)}
+
+    def run(self, operations, listener=None):
+        """
+        :param operations: A list of dictionaries, each one containing the uuid, the operation
+                           (start, stop or destroy), the master_id and the slave_ids of a lambda
+                           instance, and for destroy, the public_ip_id and the
+                           private_network_id.
+        :param listener: Optional callable that gets called with the uuid and the failure message,
+                         or None, of every lambda instance, as soon as its operation is complete.
+        :returns: Dictionary with the failure message, or None, of every lambda instance.
+        """
+        results = {}
+        instances = {}
+        for operation in operations:
+            instances[operation['uuid']] = dict(
+                operation, step=0,
+                steps=get_steps(operation['operation'], operation['master_id'],
+                                operation['slave_ids']))
+
+        def finish(instance_uuid, failure_message=None):
+            instances.pop(instance_uuid, None)
+            results[instance_uuid] = failure_message
+            if listener:
+                listener(instance_uuid, failure_message)
+
+        pool = ThreadPool(self.parallelism)
+        try:
+            deadline = time.time() + self.max_wait
+            statuses = self.get_statuses()
+            while True:
+                # Send the actions of every lambda instance whose current group of VMs is ready.
+                calls = []
+                for instance_uuid in list(instances):
+                    try:
+                        calls.extend(self.advance(instances[instance_uuid], statuses))
+                    except VMStatusError as exception:
+                        finish(instance_uuid, str(exception))
+                for instance_uuid, failure_message in pool.map(self.call, calls):
+                    if failure_message and instance_uuid in instances:
+                        finish(instance_uuid, failure_message)
+
+                for instance_uuid in [instance_uuid for instance_uuid, instance in
+                                      instances.items() if instance['step'] is None]:
+                    finish(instance_uuid)
+
+                if not instances:
+                    break
+                if time.time() >= deadline:
+                    for instance_uuid in list(instances):
+                        finish(instance_uuid, "Timed out waiting for the VMs to change status")
+                    break
+                time.sleep(self.poll_interval)
+                statuses = self.get_statuses()
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
+    def advance(self, instance, statuses):
+        """
+        Moves a lambda instance past the groups of VMs that have reached the expected status.
+        :param instance: The operation of the lambda instance, with its current step.
+        :param statuses: The current status of every VM of the user.
+        :returns: A list of the calls to send for the current group of VMs, if it is not ready.
+                  The step of the lambda instance is set to None when all of its VMs are ready.
+        """
+        action, target_status = SERVER_ACTIONS[instance['operation']]
+        steps = instance['steps']
+        while instance['step'] < len(steps):
+            waiting_ids = []
+            for server_id in steps[instance['step']]:
+                server_status = statuses.get(str(server_id), 'DELETED')
+                if server_status == 'ERROR' and target_status != 'DELETED':
+                    raise VMStatusError("VM {} is in ERROR status".format(server_id))
+                if server_status == 'DELETED' and target_status != 'DELETED':
+                    raise VMStatusError("VM {} does not exist".format(server_id))
+                if server_status != target_status:
+                    waiting_ids.append(server_id)
+            if waiting_ids:
+                # Actions are sent only once, while the VMs are changing status they are polled.
+                if instance.get('sent_step') == instance['step']:
+                    return []
+                instance['sent_step'] = instance['step']
+                return [(instance['uuid'], getattr(self.compute_client, action), server_id)
+                        for server_id in waiting_ids]
+            instance['step'] += 1
+
+        instance['step'] = None
+        if instance['operation'] == 'destroy':
+            # The public ip and the private network can be destroyed once the VMs are gone.
+            calls = [(self.network_client.delete_floatingip, instance.get('public_ip_id')),
+                     (self.network_client.delete_network, instance.get('private_network_id'))]
+            return [(instance['uuid'], method, resource_id) for method, resource_id in calls
+                    if resource_id is not None]
+        return []
+
+    @staticmethod
+    def call(call):
+        """
+        :param call: A tuple with the uuid of a lambda instance, the method of a kamaki client and
+                     the ~okeanos id of the resource to call it for.
+        :returns: A tuple with the uuid of the lambda instance and the failure message of the
+                  call, or None.
+        """
+        instance_uuid, method, resource_id = call
+        try:
+            method(resource_id)
+        except ClientError as exception:
+            return instance_uuid, exception.message
+        return instance_uuid, None
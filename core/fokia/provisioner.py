@@ -2,18 +2,20 @@ from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 import logging
 import re
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+import time
 
 from kamaki.clients import astakos, cyclades
 from kamaki.clients import ClientError
 from kamaki.cli.config import Config as KamakiConfig
 from fokia.utils import patch_certs
 from fokia.cluster_error_constants import *
+from fokia.cluster_sizing import fits_flink_session
 from Crypto.PublicKey import RSA
 from base64 import b64encode
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 storage_templates = ['drdb', 'ext_vlmc']
 
 class Provisioner:
@@ -65,6 +67,7 @@ class Provisioner:
         self.vpn = None
         self.subnet = None
         self.private_key = None
+        self.boot_times = {}
         self.image_id = 'c6f5adce-21ad-4ce3-8591-acfe7eb73c02'
 
     """
@@ -122,12 +125,24 @@ class Provisioner:
     CREATE RESOURCES
     """
 
-    def create_lambda_cluster(self, vm_name, wait=True, **kwargs):
+    def create_lambda_cluster(self, vm_name, wait=True, listener=None, **kwargs):
         """
         :param vm_name: hostname of the master
+        :param listener: optional callable that gets called with a message after every
+                         provisioning step.
         :param kwargs: contains specifications of the vms.
         :return: dictionary object with the nodes of the cluster if it was successfully created
         """
+        if listener is None:
+            def listener(message):
+                pass
+
+        # The slaves are checked before any VM is created, since the Apache Flink session could
+        # not be scheduled on them.
+        if not fits_flink_session(kwargs['ram_slave']):
+            msg = 'The slaves do not have enough memory for Apache Flink.'
+            raise ClientError(msg, error_syntax_ram_slave)
+
         quotas = self.get_quotas()
         vcpus = kwargs['slaves'] * kwargs['vcpus_slave'] + kwargs['vcpus_master']
         ram = kwargs['slaves'] * kwargs['ram_slave'] + kwargs['ram_master']
@@ -143,6 +158,8 @@ class Provisioner:
                                             project_name=kwargs['project_name'])
 
         if response:
+            listener('Quotas checked')
+
             # Check flavors for master and slaves
             master_flavor = self.find_flavor(vcpus=kwargs['vcpus_master'],
                                              ram=kwargs['ram_master'],
@@ -179,6 +196,7 @@ class Provisioner:
             self.vpn = self.create_vpn('lambda-vpn', project_id=project_id)
             vpn_id = self.vpn['id']
             self.create_private_subnet(vpn_id)
+            listener('Private network created')
 
             master_ip = None
             slave_ips = [None] * kwargs['slaves']
@@ -191,12 +209,16 @@ class Provisioner:
                                  for i in range(kwargs['slaves'])]
 
             self.ips = [ip for ip in [master_ip] + slave_ips if ip]
+            if self.ips:
+                listener('Public ips reserved')
 
             self.master = self.create_vm(vm_name=vm_name, ip=master_ip,
                                          net_id=vpn_id,
                                          flavor=master_flavor,
                                          personality=master_personality,
                                          **kwargs)
+            self.boot_times[vm_name] = time.time()
+            listener('VM ' + vm_name + ' created')
 
             # Create slaves
             self.slaves = list()
@@ -209,12 +231,16 @@ class Provisioner:
                                        personality=slave_personality,
                                        **kwargs)
                 self.slaves.append(slave)
+                self.boot_times[slave_name] = time.time()
+                listener('VM ' + slave_name + ' created')
 
             # Wait for VMs to complete being built
             if wait:
                 self.cyclades.wait_server(server_id=self.master['id'])
+                listener('VM ' + vm_name + ' built')
                 for slave in self.slaves:
                     self.cyclades.wait_server(slave['id'])
+                    listener('VM ' + slave['name'] + ' built')
 
             # Create cluster dictionary object
             inventory = {
@@ -0,0 +1,145 @@
+import select
+import socket
+import subprocess
+import threading
+import time
+
+
+class SSHProber(object):
+    """
+    Waits until the SSH daemons of the nodes of a lambda instance are ready to accept connections.
+    All the nodes are probed concurrently. The master is probed directly, on its public host name,
+    while the slaves, that only have private ips, are probed through the master, the same way
+    ansible reaches them. A node is considered ready as soon as its SSH banner has been read.
+    """
+
+    def __init__(self, master_host, private_key_file, timeout=600, interval=2,
+                 connect_timeout=5):
+        """
+        :param master_host: The public host name of the master.
+        :param private_key_file: The file of the private key that gives access to the master.
+        :param timeout: The number of seconds after which the nodes that are not ready are
+                        considered unreachable.
+        :param interval: The number of seconds to wait between two probes of the same node.
+        :param connect_timeout: The number of seconds to wait for the banner on every probe.
+        """
+        self.master_host = master_host
+        self.private_key_file = private_key_file
+        self.timeout = timeout
+        self.interval = interval
+        self.connect_timeout = connect_timeout
+
+    def read_master_banner(self):
+        """
+        Connects to the SSH port of the master and reads its banner.
+        :returns: The banner, or None if the master is not ready.
+        """
+        try:
+            connection = socket.create_connection((self.master_host, 22),
+                                                  timeout=self.connect_timeout)
+        except (socket.error, socket.timeout):
+            return None
+        try:
+            return connection.makefile().readline().strip() or None
+        except (socket.error, socket.timeout):
+            return None
+        finally:
+            connection.close()
+
+    def read_slave_banner(self, internal_ip):
+        """
+        Connects to the SSH port of a slave, through the master, and reads its banner.
+        :param internal_ip: The private ip of the slave.
+        :returns: The banner, or None if the slave is not ready.
+        """
+        command = ['ssh', '-i', self.private_key_file,
+                   '-o', 'StrictHostKeyChecking=no',
+                   '-o', 'UserKnownHostsFile=/dev/null',
+                   '-o', 'BatchMode=yes',
+                   '-o', 'ConnectTimeout={}'.format(self.connect_timeout),
+                   '-W', '{}:22'.format(internal_ip),
+                   'root@{}'.format(self.master_host)]
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+        except OSError:
+            return None
+        try:
+            readable, _, _ = select.select([process.stdout], [], [],
+                                           2 * self.connect_timeout)
+            if not readable:
+                return None
+            return process.stdout.readline().strip() or None
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    def wait_for_node(self, read_banner, deadline):
+        """
+        Probes a node until its banner is read or the deadline passes.
+        :param read_banner: Callable that probes the node once.
+        :param deadline: The time after which the node is considered unreachable.
+        :returns: Whether the node is ready.
+        """
+        while True:
+            if read_banner():
+                return True
+            if time.time() + self.interval > deadline:
+                return False
+            time.sleep(self.interval)
+
+    def wait_for_nodes(self, master_name, slave_ips, boot_times=None, listener=None):
+        """
+        Waits until the master and all the slaves are ready, or the timeout passes.
+        :param master_name: The name of the master.
+        :param slave_ips: Dictionary with the names of the slaves as keys and their private ips
+                          as values.
+        :param boot_times: Optional dictionary with the names of the nodes as keys and the times
+                           their VMs were created as values. The latency of every node is
+                           measured from its boot time, or from the start of the probing if its
+                           boot time is not known.
+        :param listener: Optional callable that gets called with the name and the latency of
+                         every node, as soon as the node is ready.
+        :returns: Dictionary with the names of the nodes as keys and their boot-to-SSH latencies
+                  in seconds as values. The latency of the nodes that were not reachable before
+                  the timeout is None.
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        boot_times = boot_times or {}
+        latencies = {}
+        lock = threading.Lock()
+        master_probed = threading.Event()
+
+        def probe(name, read_banner, is_master):
+            # The slaves can only be reached through the master.
+            if not is_master:
+                master_probed.wait(max(deadline - time.time(), 0))
+                if latencies.get(master_name) is None:
+                    with lock:
+                        latencies[name] = None
+                    return
+
+            ready = self.wait_for_node(read_banner, deadline)
+            latency = time.time() - boot_times.get(name, start) if ready else None
+            with lock:
+                latencies[name] = latency
+                if ready and listener:
+                    listener(name, latency)
+            if is_master:
+                master_probed.set()
+
+        threads = [threading.Thread(target=probe,
+                                    args=(master_name, self.read_master_banner, True))]
+        for name, internal_ip in slave_ips.items():
+            threads.append(threading.Thread(
+                target=probe,
+                args=(name, lambda ip=internal_ip: self.read_slave_banner(ip), False)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return latencies
@@ -1,12 +1,14 @@
 import logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
 from kamaki.clients.utils import https
 from kamaki.clients import ClientError
 from kamaki import defaults
 from kamaki.clients.astakos import AstakosClient
-from kamaki.clients.cyclades import CycladesComputeClient, CycladesNetworkClient
+
+from fokia.lifecycle import BulkLifecycle
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 def patch_certs(cert_path=None):
@@ -57,36 +59,75 @@ def check_auth_token(auth_token, auth_url=None):
     return True, user_info
 
 
-def lambda_instance_start(auth_url, auth_token, master_id, slave_ids):
+# The ~okeanos resources that a lambda instance uses, and the units they are counted in.
+QUOTA_RESOURCES = (
+    ('vms', 'cyclades.vm', 1),
+    ('cpus', 'cyclades.cpu', 1),
+    ('ram', 'cyclades.ram', 1024 * 1024),
+    ('disk', 'cyclades.disk', 1024 * 1024 * 1024),
+    ('floating_ips', 'cyclades.floating_ip', 1),
+    ('private_networks', 'cyclades.network.private', 1),
+)
+
+
+def get_available_quotas(auth_url, auth_token, project_name):
     """
-    Starts the VMs of a lambda instance using kamaki. Starting the master node will cause the lambda
-    services to start. That is why all slave nodes must be started before starting the master node.
+    Takes a snapshot of the resources that are still available in the quota of a project.
+    :param auth_url: The authentication url for ~okeanos API.
+    :param auth_token: The authentication token of a member of the project.
+    :param project_name: The name of the project.
+    :returns: Dictionary with the available vms, cpus, ram in MB, disk in GB, floating_ips and
+              private_networks of the project.
+    """
+
+    astakos = AstakosClient(auth_url, auth_token)
+    projects = astakos.get_projects(name=project_name)
+    if not projects:
+        raise ClientError("Project {} was not found".format(project_name), 404)
+    quotas = astakos.get_quotas()[projects[0]['id']]
+
+    available = {}
+    for name, resource, unit in QUOTA_RESOURCES:
+        quota = quotas[resource]
+        available[name] = (quota['project_limit'] - quota['project_usage'] -
+                           quota['project_pending']) / unit
+    return available
+
+
+def run_lifecycle_operation(auth_url, auth_token, operation, master_id, slave_ids, **kwargs):
+    """
+    Runs a lifecycle operation on the VMs of a lambda instance. The actions on the slave nodes are
+    sent concurrently and all the VMs are polled together, with one listing at a time, so the
+    operation takes about as long as it takes for one VM to change status.
     :param auth_url: The authentication url for ~okeanos API.
     :param auth_token: The authentication token of the owner of the lambda instance.
+    :param operation: One of start, stop or destroy.
     :param master_id: The ~okeanos id of the VM that acts as the master node.
     :param slave_ids: The ~okeanos ids of the VMs that act as the slave nodes.
+    :param kwargs: The public_ip_id and the private_network_id, for destroy.
+    :raises ClientError: If the operation failed.
     """
 
-    # Create cyclades compute client.
-    cyclades_compute_url = AstakosClient(auth_url, auth_token).get_endpoint_url(
-        CycladesComputeClient.service_type)
-    cyclades_compute_client = CycladesComputeClient(cyclades_compute_url, auth_token)
+    lifecycle_operation = dict(kwargs, uuid=None, operation=operation, master_id=master_id,
+                               slave_ids=slave_ids)
+    failure_message = BulkLifecycle(auth_url, auth_token, poll_interval=2).\
+        run([lifecycle_operation])[None]
+    if failure_message:
+        raise ClientError(failure_message)
 
-    # Start all slave nodes.
-    for slave_id in slave_ids:
-        if cyclades_compute_client.get_server_details(slave_id)["status"] != "ACTIVE":
-            cyclades_compute_client.start_server(slave_id)
 
-    # Wait until all slave nodes have been started.
-    for slave_id in slave_ids:
-        cyclades_compute_client.wait_server(slave_id, current_status="STOPPED")
-
-    # Start master node.
-    if cyclades_compute_client.get_server_details(master_id)["status"] != "ACTIVE":
-        cyclades_compute_client.start_server(master_id)
+def lambda_instance_start(auth_url, auth_token, master_id, slave_ids):
+    """
+    Starts the VMs of a lambda instance using kamaki. Starting the master node will cause the lambda
+    services to start. That is why all slave nodes must be started before starting the master node.
+    :param auth_url: The authentication url for ~okeanos API.
+    :param auth_token: The authentication token of the owner of the lambda instance.
+    :param master_id: The ~okeanos id of the VM that acts as the master node.
+    :param slave_ids: The ~okeanos ids of the VMs that act as the slave nodes.
+    """
 
-    # Wait until master node has been started.
-    cyclades_compute_client.wait_server(master_id, current_status="STOPPED")
+    # Start all slave nodes concurrently and then the master node.
+    run_lifecycle_operation(auth_url, auth_token, 'start', master_id, slave_ids)
 
 
 def lambda_instance_stop(auth_url, auth_token, master_id, slave_ids):
@@ -100,26 +141,8 @@ def lambda_instance_stop(auth_url, auth_token, master_id, slave_ids):
     :param slave_ids: The ~okeanos ids of the VMs that act as the slave nodes.
     """
 
-    # Create cyclades client.
-    cyclades_compute_url = AstakosClient(auth_url, auth_token).get_endpoint_url(
-        CycladesComputeClient.service_type)
-    cyclades_compute_client = CycladesComputeClient(cyclades_compute_url, auth_token)
-
-    # Stop master node.
-    if cyclades_compute_client.get_server_details(master_id)["status"] != "STOPPED":
-        cyclades_compute_client.shutdown_server(master_id)
-
-    # Wait until master node has been stopped.
-    cyclades_compute_client.wait_server(master_id, current_status="ACTIVE")
-
-    # Stop all slave nodes.
-    for slave_id in slave_ids:
-        if cyclades_compute_client.get_server_details(slave_id)["status"] != "STOPPED":
-            cyclades_compute_client.shutdown_server(slave_id)
-
-    # Wait until all slave nodes have been stopped.
-    for slave_id in slave_ids:
-        cyclades_compute_client.wait_server(slave_id, current_status="ACTIVE")
+    # Stop the master node and then all slave nodes concurrently.
+    run_lifecycle_operation(auth_url, auth_token, 'stop', master_id, slave_ids)
 
 
 def lambda_instance_destroy(auth_url, auth_token, master_id, slave_ids, public_ip_id,
@@ -137,40 +160,7 @@ def lambda_instance_destroy(auth_url, auth_token, master_id, slave_ids, public_i
     :param private_network_id: The ~okeanos id of the private network used by the lambda instance.
     """
 
-    # Create cyclades compute client.
-    cyclades_compute_url = AstakosClient(auth_url, auth_token).get_endpoint_url(
-        CycladesComputeClient.service_type)
-    cyclades_compute_client = CycladesComputeClient(cyclades_compute_url, auth_token)
-
-    # Create cyclades network client.
-    cyclades_network_url = AstakosClient(auth_url, auth_token).get_endpoint_url(
-        CycladesNetworkClient.service_type)
-    cyclades_network_client = CycladesNetworkClient(cyclades_network_url, auth_token)
-
-    # Get the current status of the VMs.
-    master_status = cyclades_compute_client.get_server_details(master_id)["status"]
-    slaves_status = []
-    for slave_id in slave_ids:
-        slaves_status.append(cyclades_compute_client.get_server_details(slave_id)["status"])
-
-    # Destroy all the VMs without caring for properly stopping the lambda services.
-    # Destroy master node.
-    if cyclades_compute_client.get_server_details(master_id)["status"] != "DELETED":
-        cyclades_compute_client.delete_server(master_id)
-
-    # Destroy all slave nodes.
-    for slave_id in slave_ids:
-        if cyclades_compute_client.get_server_details(slave_id)["status"] != "DELETED":
-            cyclades_compute_client.delete_server(slave_id)
-
-    # Wait for all the VMs to be destroyed before destroyed the public ip and the
-    # private network.
-    cyclades_compute_client.wait_server(master_id, current_status=master_status)
-    for i, slave_id in enumerate(slave_ids):
-        cyclades_compute_client.wait_server(slave_id, current_status=slaves_status[i])
-
-    # Destroy the public ip.
-    cyclades_network_client.delete_floatingip(public_ip_id)
-
-    # Destroy the private network.
-    cyclades_network_client.delete_network(private_network_id)
+    # Destroy all the VMs concurrently, without caring for properly stopping the lambda services,
+    # and then the public ip and the private network.
+    run_lifecycle_operation(auth_url, auth_token, 'destroy', master_id, slave_ids,
+                            public_ip_id=public_ip_id, private_network_id=private_network_id)
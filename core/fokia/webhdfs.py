@@ -0,0 +1,196 @@
+import httplib
+import json
+import threading
+import urllib
+from Queue import Queue, Empty
+
+# Number of bytes read from a local file and sent at a time.
+BLOCK_SIZE = 64 * 1024
+
+
+class WebHDFSError(Exception):
+    def __init__(self, message, status=None):
+        super(WebHDFSError, self).__init__(message)
+        self.status = status
+
+
+class WebHDFSClient(object):
+    """
+    Uploads files to the HDFS of a lambda instance through the WebHDFS REST API of HttpFS, that
+    runs on the master. HttpFS receives the data itself and writes it to the datanodes, so the
+    slaves, that only have private ips, do not have to be reachable.
+    A file is uploaded in parts, in parallel, every part to a file of its own, and the parts are
+    concatenated into the destination file by the namenode. The parts are read from the local
+    file and sent one block at a time, so no copy of the file is kept in memory or on disk.
+    """
+
+    def __init__(self, host, port=14000, user='hduser', block_size=128 * 1024 * 1024,
+                 timeout=60):
+        """
+        :param host: The host name or the ip of the master.
+        :param port: The port of HttpFS.
+        :param user: The user that the files are created by.
+        :param block_size: The HDFS block size of the uploaded files. Every part, except for the
+                           last one, is a multiple of it, as HDFS requires in order to
+                           concatenate them.
+        :param timeout: The number of seconds to wait for every response of HttpFS.
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.block_size = block_size
+        self.timeout = timeout
+
+    def request(self, method, hdfs_path, parameters, body=None, length=0):
+        """
+        Sends a request to the WebHDFS REST API.
+        :param method: The HTTP method.
+        :param hdfs_path: The absolute HDFS path the request refers to.
+        :param parameters: Dictionary with the query parameters of the request.
+        :param body: Optional iterable with the blocks of the body of the request.
+        :param length: The length of the body.
+        :returns: The parsed JSON response, or None if the response is empty.
+        """
+        parameters = dict(parameters, **{'user.name': self.user})
+        url = '/webhdfs/v1{}?{}'.format(urllib.quote(hdfs_path), urllib.urlencode(parameters))
+        connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.putrequest(method, url)
+            connection.putheader('Content-Length', str(length))
+            if body is not None:
+                connection.putheader('Content-Type', 'application/octet-stream')
+            connection.endheaders()
+            for block in body or ():
+                connection.send(block)
+            response = connection.getresponse()
+            content = response.read()
+        except (httplib.HTTPException, IOError) as exception:
+            raise WebHDFSError("WebHDFS request to {} failed: {}".format(self.host, exception))
+        finally:
+            connection.close()
+
+        try:
+            result = json.loads(content) if content else None
+        except ValueError:
+            result = None
+        if response.status >= 300:
+            message = result.get('RemoteException', {}).get('message') \
+                if isinstance(result, dict) else None
+            raise WebHDFSError(message or "WebHDFS request failed with status {}".
+                               format(response.status), response.status)
+        return result
+
+    def exists(self, hdfs_path):
+        try:
+            self.request('GET', hdfs_path, {'op': 'GETFILESTATUS'})
+        except WebHDFSError as exception:
+            if exception.status == 404:
+                return False
+            raise
+        return True
+
+    def delete(self, hdfs_path):
+        self.request('DELETE', hdfs_path, {'op': 'DELETE', 'recursive': 'false'})
+
+    def split(self, size, parallelism):
+        """
+        Splits a file into parts, so that every part is uploaded by a different thread.
+        :param size: The size of the file.
+        :param parallelism: The maximum number of parts.
+        :returns: A list of tuples with the offset and the length of every part.
+        """
+        blocks = -(-size // self.block_size)
+        blocks_per_part = max(-(-blocks // parallelism), 1)
+        part_size = blocks_per_part * self.block_size
+        return [(offset, min(part_size, size - offset))
+                for offset in range(0, size, part_size)] or [(0, 0)]
+
+    def upload(self, local_path, hdfs_path, size, parallelism=4, overwrite=False,
+               listener=None):
+        """
+        Uploads a local file to HDFS.
+        :param local_path: The path of the local file.
+        :param hdfs_path: The absolute HDFS path to upload the file to.
+        :param size: The size of the local file.
+        :param parallelism: The maximum number of parts that are uploaded concurrently.
+        :param overwrite: Whether an existing file at hdfs_path is overwritten.
+        :param listener: Optional callable that gets called with the total number of bytes
+                         sent, every time a block has been sent.
+        """
+        if not overwrite and self.exists(hdfs_path):
+            raise WebHDFSError("{} already exists".format(hdfs_path))
+
+        # The parts are uploaded to temporary files, which are concatenated into the first one.
+        # The first one is then renamed to the destination, so that the destination is only
+        # created if the whole upload succeeds.
+        parts = self.split(size, parallelism)
+        part_paths = ['{}._part{}'.format(hdfs_path, index) for index in range(len(parts))]
+
+        progress = {'bytes': 0}
+        lock = threading.Lock()
+        errors = []
+        pending_parts = Queue()
+        for index, part in enumerate(parts):
+            pending_parts.put((index, part))
+
+        def read_part(offset, length):
+            with open(local_path, 'rb') as f:
+                f.seek(offset)
+                while length > 0:
+                    block = f.read(min(BLOCK_SIZE, length))
+                    if not block:
+                        raise WebHDFSError("{} is shorter than expected".format(local_path))
+                    length -= len(block)
+                    with lock:
+                        progress['bytes'] += len(block)
+                        if listener:
+                            listener(progress['bytes'])
+                    yield block
+
+        def upload_parts():
+            while not errors:
+                try:
+                    index, (offset, length) = pending_parts.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self.request('PUT', part_paths[index],
+                                 {'op': 'CREATE', 'data': 'true', 'overwrite': 'true',
+                                  'blocksize': self.block_size},
+                                 body=read_part(offset, length), length=length)
+                except (WebHDFSError, IOError) as exception:
+                    errors.append(exception)
+
+        threads = [threading.Thread(target=upload_parts)
+                   for _ in range(min(parallelism, len(parts)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        try:
+            if errors:
+                raise errors[0]
+            if len(part_paths) > 1:
+                self.request('POST', part_paths[0],
+                             {'op': 'CONCAT', 'sources': ','.join(part_paths[1:])})
+            if overwrite and self.exists(hdfs_path):
+                self.delete(hdfs_path)
+            renamed = self.request('PUT', part_paths[0],
+                                   {'op': 'RENAME', 'destination': hdfs_path})
+            if not renamed or not renamed.get('boolean'):
+                raise WebHDFSError("Could not rename {} to {}".format(part_paths[0], hdfs_path))
+        except (WebHDFSError, IOError):
+            self.cleanup(part_paths)
+            raise
+
+    def cleanup(self, hdfs_paths):
+        """
+        Deletes the files of a failed upload, ignoring any errors.
+        """
+        for hdfs_path in hdfs_paths:
+            try:
+                self.delete(hdfs_path)
+            except WebHDFSError:
+                pass
@@ -0,0 +1,107 @@
+import json
+import struct
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import BaseRequestHandler, TCPServer
+
+import pytest
+
+from fokia.activity import ActivityProbe, is_active
+
+
+class FakeWebServerHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        content = json.dumps(self.server.responses[self.path])
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def kafka_string(value):
+    return struct.pack('>h', len(value)) + value
+
+
+class FakeKafkaHandler(BaseRequestHandler):
+    """
+    A broker that leads partition 0 of the topic input, while another broker leads partition 1.
+    """
+
+    def read(self, size):
+        data = ''
+        while len(data) < size:
+            data += self.request.recv(size - len(data))
+        return data
+
+    def reply(self, correlation_id, body):
+        response = struct.pack('>i', correlation_id) + body
+        self.request.sendall(struct.pack('>i', len(response)) + response)
+
+    def handle(self):
+        for _ in range(2):
+            request = self.read(struct.unpack('>i', self.read(4))[0])
+            api_key, _, correlation_id = struct.unpack_from('>hhi', request)
+            if api_key == 3:
+                brokers = struct.pack('>i', 1) + struct.pack('>i', 0) + \
+                    kafka_string('snf-1') + struct.pack('>i', 9092)
+                partitions = struct.pack('>i', 2) + ''.join(
+                    struct.pack('>hiii', 0, partition_id, leader, 1) +
+                    struct.pack('>i', leader) + struct.pack('>ii', 1, leader)
+                    for partition_id, leader in ((0, 0), (1, 1)))
+                topics = struct.pack('>i', 1) + struct.pack('>h', 0) + kafka_string('input') + \
+                    partitions
+                self.reply(correlation_id, brokers + topics)
+            else:
+                partitions = struct.pack('>i', 2) + \
+                    struct.pack('>ihiq', 0, 0, 1, self.server.offset) + \
+                    struct.pack('>ihi', 1, 6, 0)
+                self.reply(correlation_id,
+                           struct.pack('>i', 1) + kafka_string('input') + partitions)
+
+
+def start(server, request):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    request.addfinalizer(server.shutdown)
+    return server.server_address[1]
+
+
+@pytest.fixture
+def probe(request):
+    web_server = HTTPServer(('127.0.0.1', 0), FakeWebServerHandler)
+    web_server.responses = {
+        '/ws/v1/cluster/metrics': {'clusterMetrics': {'appsRunning': 1, 'appsPending': 1}},
+        '/jobsInfo': [{'jobid': 'a', 'status': 'RUNNING'}, {'jobid': 'b', 'status': 'FAILED'}]}
+    web_port = start(web_server, request)
+
+    TCPServer.allow_reuse_address = True
+    kafka_server = TCPServer(('127.0.0.1', 0), FakeKafkaHandler)
+    kafka_server.offset = 42
+    kafka_port = start(kafka_server, request)
+
+    return ActivityProbe('127.0.0.1', yarn_port=web_port, flink_port=web_port,
+                         kafka_port=kafka_port, timeout=1)
+
+
+def test_sample(probe):
+    assert probe.sample() == {'yarn_applications': 2, 'flink_jobs': 1, 'kafka_offset': 42}
+
+
+def test_unreachable_services():
+    probe = ActivityProbe('127.0.0.1', yarn_port=1, flink_port=1, kafka_port=1, timeout=1)
+    assert probe.sample() == {'yarn_applications': None, 'flink_jobs': None,
+                              'kafka_offset': None}
+
+
+def test_is_active():
+    idle = {'yarn_applications': 0, 'flink_jobs': 0, 'kafka_offset': 42}
+    assert not is_active(idle, 42)
+    assert not is_active(idle, None)
+    assert is_active(idle, 40)
+    assert is_active(dict(idle, flink_jobs=1), 42)
+    assert not is_active({'yarn_applications': None, 'flink_jobs': None,
+                          'kafka_offset': None}, 42)
@@ -0,0 +1,44 @@
+from mock import patch
+
+from fokia.ansible_callbacks import TaskTimer
+
+
+def test_task_timer():
+    notified_tasks = []
+    with patch('fokia.ansible_callbacks.time') as tm:
+        timer = TaskTimer('/some/path/cluster-install.yml', listener=notified_tasks.append)
+        tm.time.return_value = 10
+        timer.task_started('install java')
+        tm.time.return_value = 12
+        timer.host_reported('snf-666977.local', 'ok')
+        tm.time.return_value = 15
+        timer.host_reported('snf-666976.vm.okeanos.grnet.gr', 'changed')
+        tm.time.return_value = 16
+        timer.host_reported('snf-666977.local', 'failed')
+        timer.host_reported('snf-666977.local', 'ok')
+        timer.task_started('format hdfs')
+        tm.time.return_value = 20
+        timer.host_reported('snf-666976.vm.okeanos.grnet.gr', 'unreachable')
+        timer.flush()
+
+    records = timer.records
+    assert len(records) == 3
+    assert notified_tasks == [records[:2], records[2:]]
+
+    assert records[0] == {'playbook': 'cluster-install.yml', 'task': 'install java',
+                          'host': 'snf-666976.vm.okeanos.grnet.gr', 'start': 10, 'end': 15,
+                          'outcome': 'changed'}
+    assert records[1] == {'playbook': 'cluster-install.yml', 'task': 'install java',
+                          'host': 'snf-666977.local', 'start': 10, 'end': 16,
+                          'outcome': 'failed'}
+    assert records[2] == {'playbook': 'cluster-install.yml', 'task': 'format hdfs',
+                          'host': 'snf-666976.vm.okeanos.grnet.gr', 'start': 16, 'end': 20,
+                          'outcome': 'unreachable'}
+
+
+def test_task_timer_ignores_results_outside_tasks():
+    timer = TaskTimer('initialize.yml')
+    timer.host_reported('snf-666977.local', 'ok')
+    timer.flush()
+
+    assert timer.records == []
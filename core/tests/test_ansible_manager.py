@@ -1,3 +1,5 @@
+import copy
+
 from fokia.ansible_manager import Manager
 from mock import patch
 
@@ -35,5 +37,25 @@ def test_playbook_run():
                0].name == u'snf-666977.local'
 
 
+def test_inventory_cluster_settings():
+    provisioner_response = copy.deepcopy(test_provisioner_response)
+    provisioner_response['nodes']['master'].update(vcpus=2, ram=4096, disk=20)
+    provisioner_response['nodes']['slaves'][0].update(vcpus=4, ram=8192, disk=40)
+
+    inventory = Manager(provisioner_response).create_inventory()
+
+    all_variables = inventory.groups[0].get_variables()
+    assert all_variables['yarn_nodemanager_vcores'] == 4
+    assert all_variables['taskmanager_numberOfTaskSlots'] == 4
+    assert inventory.groups[1].get_variables()['kafka_heap_mb'] == 512
+    assert inventory.groups[2].get_variables()['kafka_heap_mb'] == 1024
+
+
+def test_inventory_without_flavors():
+    inventory = Manager(test_provisioner_response).create_inventory()
+
+    assert 'yarn_nodemanager_memory_mb' not in inventory.groups[0].get_variables()
+
+
 if __name__ == "__main__":
     test_playbook_run()
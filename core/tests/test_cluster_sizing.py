@@ -0,0 +1,53 @@
+import pytest
+
+from fokia.cluster_sizing import compute_cluster_settings, fits_flink_session
+
+
+def test_small_cluster_settings():
+    settings = compute_cluster_settings(slaves=2, ram_master=2048, vcpus_slave=2, ram_slave=2048)
+    all_variables = settings['all']
+
+    assert all_variables['yarn_scheduler_minimum_allocation_mb'] == 256
+    assert all_variables['yarn_nodemanager_memory_mb'] == 1280
+    assert all_variables['flink_ram_per_job_manager'] == 768
+    assert all_variables['flink_ram_per_task_manager'] == 512
+    assert all_variables['taskmanager_heap_mb'] == 384
+    assert all_variables['taskmanager_numberOfTaskSlots'] == 2
+    assert all_variables['parallelization_degree_default'] == 4
+    assert all_variables['dfs_replication'] == 2
+    assert all_variables['kafka_partitions'] == 4
+    assert all_variables['kafka_replication_factor'] == 3
+    assert settings['master'] == {'kafka_heap_mb': 256}
+    assert settings['slaves'] == {'kafka_heap_mb': 256}
+
+
+def test_large_cluster_settings():
+    settings = compute_cluster_settings(slaves=5, ram_master=8192, vcpus_slave=8, ram_slave=32768)
+    all_variables = settings['all']
+
+    assert all_variables['yarn_scheduler_minimum_allocation_mb'] == 2048
+    assert all_variables['yarn_nodemanager_memory_mb'] == 24576
+    assert all_variables['flink_ram_per_job_manager'] == 2048
+    assert all_variables['flink_ram_per_task_manager'] == 22528
+    assert all_variables['yarn_nodemanager_vcores'] == 8
+    assert all_variables['dfs_replication'] == 3
+    assert all_variables['kafka_partitions'] == 40
+    assert all_variables['kafka_replication_factor'] == 3
+    assert settings['slaves'] == {'kafka_heap_mb': 1024}
+
+
+def test_small_slaves_fit_the_flink_session():
+    settings = compute_cluster_settings(slaves=1, ram_master=1024, vcpus_slave=1, ram_slave=1536)
+    all_variables = settings['all']
+
+    assert all_variables['flink_ram_per_task_manager'] >= 256
+    assert all_variables['flink_ram_per_job_manager'] >= 256
+    # The JobManager and a TaskManager fit in the NodeManager of the same slave.
+    assert all_variables['flink_ram_per_job_manager'] + \
+        all_variables['flink_ram_per_task_manager'] <= all_variables['yarn_nodemanager_memory_mb']
+
+
+def test_tiny_slaves_are_rejected():
+    assert not fits_flink_session(1024)
+    with pytest.raises(ValueError):
+        compute_cluster_settings(slaves=1, ram_master=1024, vcpus_slave=1, ram_slave=1024)
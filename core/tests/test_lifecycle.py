@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+from kamaki.clients import ClientError
+from mock import patch
+
+from fokia import utils
+from fokia.lifecycle import BulkLifecycle, get_cloud_state
+
+
+class FakeCyclades(object):
+    """
+    VMs that reach the status of an action at the next listing after it.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.pending = {}
+        self.calls = []
+        self.listings = 0
+        self.lock = threading.Lock()
+
+    def list_servers(self, detail=False):
+        self.listings += 1
+        self.statuses.update(self.pending)
+        self.pending = {}
+        return [{'id': int(server_id), 'status': server_status}
+                for server_id, server_status in self.statuses.items()
+                if server_status != 'DELETED']
+
+    def act(self, action, server_id, target_status):
+        with self.lock:
+            self.calls.append((action, server_id))
+            if str(server_id) not in self.statuses:
+                raise ClientError("Server not found", 404)
+            self.pending[str(server_id)] = target_status
+
+    def start_server(self, server_id):
+        self.act('start', server_id, 'ACTIVE')
+
+    def shutdown_server(self, server_id):
+        self.act('shutdown', server_id, 'STOPPED')
+
+    def delete_server(self, server_id):
+        self.act('delete', server_id, 'DELETED')
+
+    def delete_floatingip(self, floating_ip_id):
+        with self.lock:
+            self.calls.append(('delete_floatingip', floating_ip_id))
+
+    def delete_network(self, network_id):
+        with self.lock:
+            self.calls.append(('delete_network', network_id))
+
+
+def run(cyclades, operations, **kwargs):
+    with patch('fokia.lifecycle.AstakosClient'), \
+            patch('fokia.lifecycle.CycladesComputeClient', return_value=cyclades), \
+            patch('fokia.lifecycle.CycladesNetworkClient', return_value=cyclades):
+        bulk_lifecycle = BulkLifecycle('https://accounts.okeanos.grnet.gr/identity/v2.0',
+                                       'token', poll_interval=0, **kwargs)
+    completed = []
+    results = bulk_lifecycle.run(operations, listener=lambda *result: completed.append(result))
+    return results, completed
+
+
+def test_bulk_operations():
+    cyclades = FakeCyclades({'1': 'STOPPED', '2': 'STOPPED', '3': 'STOPPED',
+                             '4': 'ACTIVE', '5': 'ACTIVE',
+                             '6': 'STOPPED', '7': 'ACTIVE'})
+    results, completed = run(cyclades, [
+        {'uuid': 'a', 'operation': 'start', 'master_id': 1, 'slave_ids': [2, 3]},
+        {'uuid': 'b', 'operation': 'stop', 'master_id': 4, 'slave_ids': [5]},
+        {'uuid': 'c', 'operation': 'destroy', 'master_id': 6, 'slave_ids': [7],
+         'public_ip_id': 8, 'private_network_id': 9}])
+
+    assert results == {'a': None, 'b': None, 'c': None}
+    assert sorted(completed) == [('a', None), ('b', None), ('c', None)]
+    assert cyclades.statuses == {'1': 'ACTIVE', '2': 'ACTIVE', '3': 'ACTIVE',
+                                 '4': 'STOPPED', '5': 'STOPPED',
+                                 '6': 'DELETED', '7': 'DELETED'}
+
+    # The slaves are started before the master and stopped after it.
+    calls = cyclades.calls
+    assert calls.index(('start', 1)) > max(calls.index(('start', 2)), calls.index(('start', 3)))
+    assert calls.index(('shutdown', 5)) > calls.index(('shutdown', 4))
+    assert calls.index(('delete_floatingip', 8)) > calls.index(('delete', 7))
+    assert ('delete_network', 9) in calls
+    # All the lambda instances are polled with one listing at a time.
+    assert cyclades.listings == 3
+
+
+def test_failed_operation():
+    cyclades = FakeCyclades({'1': 'ACTIVE', '2': 'ACTIVE', '3': 'ERROR', '4': 'STOPPED'})
+    results, completed = run(cyclades, [
+        {'uuid': 'a', 'operation': 'stop', 'master_id': 1, 'slave_ids': [2]},
+        {'uuid': 'b', 'operation': 'start', 'master_id': 4, 'slave_ids': [3]},
+        {'uuid': 'c', 'operation': 'start', 'master_id': 5, 'slave_ids': []}])
+
+    # The failure of a lambda instance does not affect the others.
+    assert results == {'a': None, 'b': "VM 3 is in ERROR status", 'c': "VM 5 does not exist"}
+    assert ('start', 4) not in cyclades.calls
+
+
+def test_timeout():
+    cyclades = FakeCyclades({'1': 'ACTIVE'})
+    cyclades.shutdown_server = lambda server_id: None
+    results, completed = run(cyclades, [
+        {'uuid': 'a', 'operation': 'stop', 'master_id': 1, 'slave_ids': []}], max_wait=0)
+
+    assert results == {'a': "Timed out waiting for the VMs to change status"}
+
+
+def test_get_cloud_state():
+    cyclades = FakeCyclades({'1': 'ACTIVE', '2': 'STOPPED'})
+    cyclades.list_servers = lambda detail=False, changes_since=None: \
+        [{'id': 3, 'status': 'DELETED'}, {'id': 2, 'status': 'STOPPED'}] if changes_since else \
+        [{'id': 1, 'status': 'ACTIVE'}, {'id': 2, 'status': 'STOPPED'}]
+    cyclades.list_networks = lambda: [{'id': '143713'}]
+
+    with patch('fokia.lifecycle.AstakosClient'), \
+            patch('fokia.lifecycle.CycladesComputeClient', return_value=cyclades), \
+            patch('fokia.lifecycle.CycladesNetworkClient', return_value=cyclades):
+        statuses, network_ids = get_cloud_state('https://accounts.okeanos.grnet.gr/identity/v2.0',
+                                                'token', deleted_since='2015-10-01T00:00:00Z')
+
+    assert statuses == {'1': 'ACTIVE', '2': 'STOPPED', '3': 'DELETED'}
+    assert network_ids == {'143713'}
+
+
+def test_lambda_instance_start():
+    cyclades = FakeCyclades({'1': 'STOPPED', '2': 'STOPPED', '3': 'STOPPED'})
+    with patch('fokia.lifecycle.AstakosClient'), \
+            patch('fokia.lifecycle.CycladesComputeClient', return_value=cyclades), \
+            patch('fokia.lifecycle.CycladesNetworkClient', return_value=cyclades), \
+            patch('fokia.lifecycle.time.sleep'):
+        utils.lambda_instance_start('https://accounts.okeanos.grnet.gr/identity/v2.0', 'token',
+                                    1, [2, 3])
+
+    # The slaves are started together and polled with one listing, then the master.
+    assert cyclades.calls[-1] == ('start', 1)
+    assert set(cyclades.calls[:2]) == {('start', 2), ('start', 3)}
+    assert cyclades.listings == 3
+
+    cyclades.statuses['2'] = 'ERROR'
+    with patch('fokia.lifecycle.AstakosClient'), \
+            patch('fokia.lifecycle.CycladesComputeClient', return_value=cyclades), \
+            patch('fokia.lifecycle.CycladesNetworkClient', return_value=cyclades), \
+            patch('fokia.lifecycle.time.sleep'), pytest.raises(ClientError):
+        utils.lambda_instance_stop('https://accounts.okeanos.grnet.gr/identity/v2.0', 'token',
+                                   1, [2, 3])
@@ -0,0 +1,39 @@
+import time
+
+from mock import patch
+
+from fokia.ssh_prober import SSHProber
+
+
+def test_wait_for_nodes():
+    prober = SSHProber('snf-666976.vm.okeanos.grnet.gr', '/tmp/key', timeout=0.5, interval=0.01)
+    master_probes = ['', None, 'SSH-2.0-OpenSSH_6.7p1']
+    ready_nodes = []
+    boot_time = time.time() - 60
+
+    with patch.object(prober, 'read_master_banner', side_effect=lambda: master_probes.pop(0)), \
+            patch.object(prober, 'read_slave_banner',
+                         side_effect=lambda ip: 'SSH-2.0-OpenSSH_6.7p1'
+                         if ip == '192.168.0.3' else None) as read_slave_banner:
+        latencies = prober.wait_for_nodes(
+            'lambda-master', {'lambda-node1': '192.168.0.3', 'lambda-node2': '192.168.0.4'},
+            boot_times={'lambda-master': boot_time},
+            listener=lambda name, latency: ready_nodes.append(name))
+
+    assert master_probes == []
+    assert 60 <= latencies['lambda-master'] < 61
+    assert 0 <= latencies['lambda-node1'] < 1
+    assert latencies['lambda-node2'] is None
+    assert ready_nodes == ['lambda-master', 'lambda-node1']
+    assert read_slave_banner.call_count > 2
+
+
+def test_unreachable_master():
+    prober = SSHProber('snf-666976.vm.okeanos.grnet.gr', '/tmp/key', timeout=0.05, interval=0.01)
+
+    with patch.object(prober, 'read_master_banner', return_value=None), \
+            patch.object(prober, 'read_slave_banner') as read_slave_banner:
+        latencies = prober.wait_for_nodes('lambda-master', {'lambda-node1': '192.168.0.3'})
+
+    assert latencies == {'lambda-master': None, 'lambda-node1': None}
+    assert not read_slave_banner.called
@@ -0,0 +1,121 @@
+import json
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import pytest
+
+from fokia.webhdfs import WebHDFSClient, WebHDFSError
+
+
+class FakeHttpFS(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeHttpFSHandler)
+        self.files = {}
+        self.failing_paths = set()
+        self.lock = threading.Lock()
+
+
+class FakeHttpFSHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, result=None):
+        content = json.dumps(result) if result is not None else ''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_request(self):
+        url = urlparse.urlparse(self.path)
+        hdfs_path = url.path[len('/webhdfs/v1'):]
+        parameters = dict(urlparse.parse_qsl(url.query))
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        files = self.server.files
+        operation = parameters['op']
+
+        if hdfs_path in self.server.failing_paths:
+            return self.reply(500, {'RemoteException': {'message': 'Disk failure'}})
+        with self.server.lock:
+            if operation == 'GETFILESTATUS':
+                if hdfs_path not in files:
+                    return self.reply(404, {'RemoteException': {'message': 'Not found'}})
+                return self.reply(200, {'FileStatus': {'length': len(files[hdfs_path])}})
+            elif operation == 'CREATE':
+                files[hdfs_path] = body
+                return self.reply(201)
+            elif operation == 'CONCAT':
+                for source in parameters['sources'].split(','):
+                    files[hdfs_path] += files.pop(source)
+                return self.reply(200)
+            elif operation == 'RENAME':
+                if parameters['destination'] in files:
+                    return self.reply(200, {'boolean': False})
+                files[parameters['destination']] = files.pop(hdfs_path)
+                return self.reply(200, {'boolean': True})
+            elif operation == 'DELETE':
+                return self.reply(200, {'boolean': files.pop(hdfs_path, None) is not None})
+
+    do_GET = do_PUT = do_POST = do_DELETE = handle_request
+
+
+@pytest.fixture
+def httpfs(request):
+    server = FakeHttpFS()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    request.addfinalizer(server.shutdown)
+    return server
+
+
+@pytest.fixture
+def local_file(tmpdir):
+    local_file = tmpdir.join('dataset.csv')
+    local_file.write('0123456789' * 3)
+    return str(local_file)
+
+
+def create_client(httpfs):
+    return WebHDFSClient('127.0.0.1', port=httpfs.server_address[1], block_size=4)
+
+
+def test_split():
+    client = WebHDFSClient('master', block_size=4)
+    assert client.split(30, 3) == [(0, 12), (12, 12), (24, 6)]
+    assert client.split(3, 4) == [(0, 3)]
+    assert client.split(0, 4) == [(0, 0)]
+
+
+def test_upload(httpfs, local_file):
+    sent_bytes = []
+    create_client(httpfs).upload(local_file, '/user/hduser/dataset.csv', 30, parallelism=3,
+                                 listener=sent_bytes.append)
+
+    assert httpfs.files == {'/user/hduser/dataset.csv': '0123456789' * 3}
+    assert sent_bytes[-1] == 30
+
+
+def test_upload_failure(httpfs, local_file):
+    httpfs.failing_paths.add('/user/hduser/dataset.csv._part1')
+
+    with pytest.raises(WebHDFSError):
+        create_client(httpfs).upload(local_file, '/user/hduser/dataset.csv', 30, parallelism=3)
+
+    # The parts that were uploaded are deleted and the destination is not created.
+    assert httpfs.files == {}
+
+
+def test_upload_existing_file(httpfs, local_file):
+    httpfs.files['/user/hduser/dataset.csv'] = 'old'
+
+    with pytest.raises(WebHDFSError):
+        create_client(httpfs).upload(local_file, '/user/hduser/dataset.csv', 30)
+    assert httpfs.files == {'/user/hduser/dataset.csv': 'old'}
+
+    create_client(httpfs).upload(local_file, '/user/hduser/dataset.csv', 30, overwrite=True)
+    assert httpfs.files == {'/user/hduser/dataset.csv': '0123456789' * 3}
@@ -0,0 +1,209 @@
+"""
+Admission control of the builds of lambda instances. Every requested build reserves the
+resources it needs in a ledger and waits until it is admitted. The builds in progress are limited
+globally and per project, the queued builds are admitted in the fair order of the scheduler, by
+weighted round robin among the projects and their users, and every build is admitted only if the
+quota of its project, minus the claims of the admitted builds whose VMs are not created yet,
+covers it. A build that does not fit is rejected before any of its VMs is created.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BuildReservation
+from .scheduler import fair_order
+
+ADMITTED = 'admitted'
+WAITING = 'waiting'
+REJECTED = 'rejected'
+
+# The cache key of the positions of the queued builds, that are read by every poll of the status
+# of a lambda instance.
+QUEUE_POSITIONS_KEY = 'admission:queue-positions'
+
+RESOURCES = ('vms', 'cpus', 'ram', 'disk', 'floating_ips', 'private_networks')
+
+
+def get_claims(specs):
+    """
+    :param specs: Dictionary with the specifications of a lambda instance, as they are given to
+                  create_lambda_instance.
+    :returns: Dictionary with the resources that the lambda instance needs.
+    """
+    vms = specs['slaves'] + 1
+    floating_ips = {'master': 1, 'all': vms}.get(specs['ip_allocation'], 0)
+    return {'vms': vms,
+            'cpus': specs['slaves'] * specs['vcpus_slave'] + specs['vcpus_master'],
+            'ram': specs['slaves'] * specs['ram_slave'] + specs['ram_master'],
+            'disk': specs['slaves'] * specs['disk_slave'] + specs['disk_master'],
+            'floating_ips': floating_ips,
+            'private_networks': specs['network_request']}
+
+
+def get_reservations():
+    """
+    Locks the ledger, until the end of the transaction, and drops the reservations of builds
+    that were lost, e.g. with the worker that ran them.
+    :returns: The reservations, ordered by the time they were requested.
+    """
+    reservations = list(BuildReservation.objects.select_for_update().order_by('id'))
+    expired = timezone.now() - \
+        timedelta(seconds=settings.ADMISSION_RESERVATION_TIMEOUT)
+    lost = {reservation.id for reservation in reservations if reservation.created_at < expired}
+    if lost:
+        BuildReservation.objects.filter(id__in=lost).delete()
+        update_queue_positions()
+    return [reservation for reservation in reservations if reservation.id not in lost]
+
+
+def get_next(reservations):
+    """
+    :param reservations: The reservations, ordered by the time they were requested.
+    :returns: The queued reservation that should be admitted next, the first one in the fair
+              order of a project that has not reached its limit, or None if the limits do not
+              allow any.
+    """
+    in_progress = [reservation for reservation in reservations
+                   if reservation.status != BuildReservation.QUEUED]
+    if len(in_progress) >= settings.ADMISSION_MAX_BUILDS:
+        return None
+
+    builds = Counter(reservation.project_name for reservation in in_progress)
+    return next((reservation for reservation in get_order(reservations)
+                 if builds[reservation.project_name] < settings.ADMISSION_MAX_BUILDS_PER_PROJECT),
+                None)
+
+
+def get_order(reservations):
+    """
+    :param reservations: The reservations, ordered by the time they were requested.
+    :returns: The queued reservations, in the order they should be admitted.
+    """
+    return fair_order([reservation for reservation in reservations
+                       if reservation.status == BuildReservation.QUEUED],
+                      [reservation for reservation in reservations
+                       if reservation.status != BuildReservation.QUEUED])
+
+
+def reserve(instance_uuid, owner, project_name, specs):
+    """
+    Queues a build in the ledger.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param owner: The user that requested the build.
+    :param project_name: The name of the project of the lambda instance.
+    :param specs: The specifications of the lambda instance.
+    :returns: False if the project has ADMISSION_MAX_QUEUED_PER_PROJECT builds queued already.
+    """
+    with transaction.atomic():
+        queued = [reservation for reservation in get_reservations()
+                  if reservation.project_name == project_name and
+                  reservation.status == BuildReservation.QUEUED]
+        if len(queued) >= settings.ADMISSION_MAX_QUEUED_PER_PROJECT:
+            return False
+        BuildReservation.objects.create(instance_uuid=instance_uuid, owner=owner,
+                                        project_name=project_name, **get_claims(specs))
+    update_queue_positions()
+    return True
+
+
+def admit(instance_uuid, get_available_quotas):
+    """
+    Tries to admit a queued build.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param get_available_quotas: A callable that returns a snapshot of the available quota of the
+                                 project of the lambda instance. It is only called when it is the
+                                 turn of the build.
+    :returns: A tuple with ADMITTED, WAITING or REJECTED, and a message for the owner. A rejected
+              build is removed from the ledger.
+    """
+    with transaction.atomic():
+        reservations = get_reservations()
+        reservation = next((reservation for reservation in reservations
+                            if str(reservation.instance_uuid) == str(instance_uuid)), None)
+        if reservation is None:
+            return REJECTED, "The reservation of the build has expired"
+        if reservation.status != BuildReservation.QUEUED:
+            return ADMITTED, ""
+        if timezone.now() - reservation.created_at > \
+                timedelta(seconds=settings.ADMISSION_QUEUE_TIMEOUT):
+            reservation.delete()
+            update_queue_positions()
+            return REJECTED, "Timed out waiting for the builds of other lambda instances"
+        if get_next(reservations) != reservation:
+            return WAITING, "Waiting for the builds of other lambda instances"
+
+    # The quota is read outside of the transaction, so that the ledger is not locked during the
+    # call to ~okeanos, and the turn of the build is checked again afterwards.
+    available = get_available_quotas()
+
+    with transaction.atomic():
+        reservations = get_reservations()
+        if get_next(reservations) != reservation:
+            return WAITING, "Waiting for the builds of other lambda instances"
+
+        claimed = Counter()
+        for other in reservations:
+            if other.project_name == reservation.project_name and \
+                    other.status == BuildReservation.ADMITTED:
+                for resource in RESOURCES:
+                    claimed[resource] += getattr(other, resource)
+        missing = [resource for resource in RESOURCES
+                   if getattr(reservation, resource) > available[resource] - claimed[resource]]
+        if missing:
+            reservation.delete()
+            update_queue_positions()
+            return REJECTED, "Not enough quota in project {} for {}".\
+                format(reservation.project_name, ", ".join(missing))
+
+        reservation.status = BuildReservation.ADMITTED
+        reservation.save()
+    update_queue_positions()
+    return ADMITTED, ""
+
+
+def mark_provisioned(instance_uuid):
+    """
+    Stops counting the claims of a build whose VMs have been created.
+    :param instance_uuid: The uuid of the lambda instance.
+    """
+    BuildReservation.objects.filter(instance_uuid=instance_uuid).\
+        update(status=BuildReservation.PROVISIONED)
+
+
+def release(instance_uuid):
+    """
+    Removes a complete build from the ledger.
+    :param instance_uuid: The uuid of the lambda instance.
+    """
+    BuildReservation.objects.filter(instance_uuid=instance_uuid).delete()
+    update_queue_positions()
+
+
+def update_queue_positions():
+    """
+    Stores the positions of the queued builds in the cache, after every change of the ledger.
+    :returns: Dictionary with the uuids of the lambda instances as keys, and the create operation
+              and the positions of their builds, starting from 1, as values.
+    """
+    positions = {str(reservation.instance_uuid): {'operation': 'create', 'position': position}
+                 for position, reservation in
+                 enumerate(get_order(BuildReservation.objects.order_by('id')), 1)}
+    cache.set(QUEUE_POSITIONS_KEY, positions, None)
+    return positions
+
+
+def get_queue_position(instance_uuid):
+    """
+    :param instance_uuid: The uuid of a lambda instance.
+    :returns: Dictionary with the create operation and the position of the build of the lambda
+              instance in the queue, or None if the build is not queued.
+    """
+    positions = cache.get(QUEUE_POSITIONS_KEY)
+    if positions is None:
+        positions = update_queue_positions()
+    return positions.get(str(instance_uuid))
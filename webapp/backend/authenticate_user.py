@@ -1,10 +1,18 @@
+import hashlib
+import hmac
+import threading
+from datetime import timedelta
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.views import exceptions
-from django.contrib.auth.hashers import make_password
-from django.utils import timezone
 
 from fokia.utils import check_auth_token
 
+from .metrics import AUTH_CACHE_REQUESTS
 from .models import Token, User
 
 
@@ -12,31 +20,134 @@ class OldTokenException(Exception):
     pass
 
 
+def get_token_digest(key):
+    """
+    Creates a deterministic digest of an ~okeanos token, keyed with the SECRET_KEY of the service,
+    so that the tokens themselves are never stored and can still be looked up.
+    :param key: The ~okeanos token.
+    """
+    return hmac.new(settings.SECRET_KEY.encode('utf-8'), key.encode('utf-8'),
+                    hashlib.sha256).hexdigest()
+
+
+class VerifiedTokenCache(object):
+    """
+    An in-process LRU cache of the tokens that have been verified with Astakos. Every entry
+    expires when the token it refers to expires.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        """
+        :param digest: The digest of the token.
+        :returns: The Token object of the digest, or None if it is not cached or has expired.
+        """
+        with self.lock:
+            token = self.entries.pop(digest, None)
+            if token is None or get_token_expiration(token) < timezone.now():
+                return None
+            self.entries[digest] = token
+            return token
+
+    def set(self, digest, token):
+        with self.lock:
+            self.entries.pop(digest, None)
+            self.entries[digest] = token
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def get_token_expiration(token):
+    """
+    :param token: A Token object.
+    :returns: The time after which the token must be verified with Astakos again. This is its
+              Astakos expiration date, but no later than TOKEN_VERIFICATION_TIMEOUT seconds after
+              its last verification.
+    """
+    expiration_date = token.creation_date + \
+        timedelta(seconds=settings.TOKEN_VERIFICATION_TIMEOUT)
+    if token.expiration_date:
+        expiration_date = min(expiration_date, token.expiration_date)
+    return expiration_date
+
+
+verified_tokens = VerifiedTokenCache(settings.TOKEN_VERIFICATION_CACHE_SIZE)
+
+# Verifications with Astakos that are in progress, by token digest. Concurrent requests with
+# the same token wait for the verification that is in progress instead of starting their own.
+pending_verifications = {}
+pending_verifications_lock = threading.Lock()
+
+
 class KamakiTokenAuthentication(TokenAuthentication):
     model = Token
 
     def authenticate_credentials(self, key):
-        hashed_token_key = make_password(key)
+        digest = get_token_digest(key)
+
+        token = verified_tokens.get(digest)
+        if token is not None:
+            AUTH_CACHE_REQUESTS.labels('hit').inc()
+            return token.user, token
+
+        with pending_verifications_lock:
+            verification = pending_verifications.get(digest)
+            leader = verification is None
+            if leader:
+                verification = threading.Event()
+                pending_verifications[digest] = verification
+
+        if not leader:
+            verification.wait(settings.TOKEN_VERIFICATION_WAIT)
+            token = verified_tokens.get(digest)
+            if token is not None:
+                AUTH_CACHE_REQUESTS.labels('hit').inc()
+                return token.user, token
+
+        AUTH_CACHE_REQUESTS.labels('miss').inc()
         try:
-            token = self.model.objects.get(key=hashed_token_key)
-            if timezone.now() > token.creation_date + timezone.timedelta(days=5):
+            token = self.verify_token(key, digest)
+        finally:
+            if leader:
+                with pending_verifications_lock:
+                    del pending_verifications[digest]
+                verification.set()
+
+        verified_tokens.set(digest, token)
+        return token.user, token
+
+    def verify_token(self, key, digest):
+        """
+        Finds the Token object of a token. The token is verified with Astakos, if it is not
+        stored or it has expired.
+        :param key: The ~okeanos token.
+        :param digest: The digest of the token.
+        """
+        try:
+            token = self.model.objects.select_related('user').get(key=digest)
+            if timezone.now() > get_token_expiration(token):
                 raise OldTokenException
         except (self.model.DoesNotExist, OldTokenException):
             status, info = check_auth_token(key)
             if status:
                 uuid = info['access']['user']['id']
-                if User.objects.filter(uuid=uuid).count() == 0:
-                    user = User.objects.create(uuid=uuid)
-                else:
-                    user = User.objects.get(uuid=uuid)
-
-                if Token.objects.filter(user=user).count() == 0:
-                    token = Token.objects.create(user=user, key=hashed_token_key,
-                                                 creation_date=timezone.now())
-                else:
-                    token = Token.objects.get(user=user)
-                    token.key = hashed_token_key
-                    token.save()
+                expiration_date = parse_datetime(info['access']['token'].get('expires', ''))
+                user, _ = User.objects.get_or_create(uuid=uuid)
+
+                token, _ = Token.objects.get_or_create(
+                    user=user, defaults={'creation_date': timezone.now()})
+                token.key = digest
+                token.creation_date = timezone.now()
+                token.expiration_date = expiration_date
+                token.save()
             else:
                 raise exceptions.AuthenticationFailed('Invalid token')
-        return token.user, token
+        return token
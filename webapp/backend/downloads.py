@@ -0,0 +1,143 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from .uploads import BLOCK_SIZE
+
+range_pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def get_etag(project_file, file_stat):
+    """
+    :param project_file: A ProjectFile.
+    :param file_stat: The result of os.stat on the file.
+    :returns: The entity tag of the file. It is the checksum of the file, if it is known, or
+              else it is derived from the modification time and the size of the file.
+    """
+    if project_file.checksum:
+        return quote_etag(project_file.checksum)
+    return quote_etag('{:x}-{:x}'.format(int(file_stat.st_mtime), file_stat.st_size))
+
+
+def parse_range(range_header, size):
+    """
+    Parses the Range header of a request. Only single byte ranges are supported, a request for
+    multiple ranges gets the whole file, as HTTP allows.
+    :param range_header: The value of the Range header.
+    :param size: The size of the file.
+    :returns: A tuple with the first and the last byte of the range, or None if the whole file
+              should be sent.
+    """
+    match = range_pattern.match(range_header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range, the last bytes of the file.
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise RangeNotSatisfiable
+    return first, last
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    :returns: Whether the copy of the file the client has is still valid, according to the
+              If-None-Match and If-Modified-Since headers of the request.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # parse_etags returns the tags unquoted before Django 1.11 and quoted since then.
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or etag.strip('"') in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def is_range_valid(request, etag, last_modified):
+    """
+    :returns: Whether the Range of the request should be honored. A range is only valid for the
+              version of the file that the If-Range header of the request refers to.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return if_range == http_date(last_modified)
+
+
+def read_file(file_path, first, length):
+    with open(file_path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            block = f.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def build_file_response(request, project_file):
+    """
+    Builds the response to a download request for a file. Conditional requests are answered
+    without sending the file. If FILE_DOWNLOAD_OFFLOAD is set, the web server is asked to send
+    the file, and ranges, itself, through X-Sendfile or X-Accel-Redirect, so that no worker of the
+    service streams the file. Otherwise the requested range of the file is streamed one block at
+    a time.
+    :param request: The request.
+    :param project_file: The ProjectFile to send.
+    """
+    file_path = project_file.path
+    file_stat = os.stat(file_path)
+    size = file_stat.st_size
+    etag = get_etag(project_file, file_stat)
+    last_modified = file_stat.st_mtime
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponse(status=304)
+    elif settings.FILE_DOWNLOAD_OFFLOAD == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = file_path
+    elif settings.FILE_DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX + \
+            os.path.relpath(file_path, settings.FILE_STORAGE)
+    else:
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and is_range_valid(request, etag, last_modified):
+            try:
+                byte_range = parse_range(request.META['HTTP_RANGE'], size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{}'.format(size)
+                return response
+
+        first, last = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(read_file(file_path, first, last - first + 1),
+                                         status=206 if byte_range else 200)
+        response['Content-Length'] = str(last - first + 1)
+        if byte_range:
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(first, last, size)
+
+    # The stored bytes are sent as they are. A compressed file, e.g. a .gz, is not sent with a
+    # Content-Encoding, so that clients do not decompress it while downloading it.
+    content_type, encoding = mimetypes.guess_type(project_file.name)
+    response['Content-Type'] = content_type if content_type and not encoding \
+        else 'application/octet-stream'
+    response['Content-Disposition'] = 'attachment; filename="{}"'.\
+        format(project_file.name.replace('"', ''))
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
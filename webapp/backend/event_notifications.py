@@ -0,0 +1,95 @@
+"""
+Notifications of the progress events of lambda instances, for the API clients that wait for
+them. Every lambda instance has an events version in the cache, that the events tasks delete as
+soon as they insert events of the lambda instance, so a waiting request reads the cache on every
+check and queries the DataBase only after new events have been published.
+Every waiting request holds a process of the web server, so at most
+LAMBDA_INSTANCE_EVENTS_MAX_WAITING requests wait at a time, counted in the cache, which is shared
+by the processes in production. The rest are answered without waiting.
+"""
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .response_cache import normalize_uuid
+
+WAITING_KEY = 'lambda-instance-events:waiting'
+
+
+def get_version_key(instance_uuid):
+    return 'lambda-instance:{}:events-version'.format(normalize_uuid(instance_uuid))
+
+
+def get_version(instance_uuid):
+    """
+    :param instance_uuid: The uuid of a lambda instance.
+    :returns: The current events version of the lambda instance. A new version is created if
+              events have been published since the last check.
+    """
+    version_key = get_version_key(instance_uuid)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, None)
+        version = cache.get(version_key)
+    return version
+
+
+def notify(instance_uuids):
+    """
+    Wakes up the requests that wait for events of some lambda instances. It should be called
+    after the events have been inserted into the DataBase.
+    :param instance_uuids: The uuids of the lambda instances.
+    """
+    cache.delete_many([get_version_key(instance_uuid) for instance_uuid in instance_uuids])
+
+
+def acquire_waiting_slot():
+    """
+    :returns: True if the request can wait for events, in which case it should call
+              release_waiting_slot when it stops waiting.
+    """
+    cache.add(WAITING_KEY, 0, None)
+    try:
+        waiting = cache.incr(WAITING_KEY)
+    except ValueError:
+        # The counter was evicted from the cache in the meantime.
+        return False
+    if waiting > settings.LAMBDA_INSTANCE_EVENTS_MAX_WAITING:
+        release_waiting_slot()
+        return False
+    return True
+
+
+def release_waiting_slot():
+    try:
+        cache.decr(WAITING_KEY)
+    except ValueError:
+        pass
+
+
+def wait_for_events(instance_uuid, instance_events, cursor, deadline):
+    """
+    Waits until there are events of a lambda instance after a cursor, or until a deadline.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param instance_events: A queryset of the events of the lambda instance, ordered by id.
+    :param cursor: The id of the last event the client has received.
+    :param deadline: The time to stop waiting at, in seconds since the epoch.
+    :returns: The list of the events after the cursor, which is empty if the deadline has passed
+              without any new events.
+    """
+    version = None
+    while True:
+        current_version = get_version(instance_uuid)
+        if current_version != version:
+            version = current_version
+            new_events = list(instance_events.filter(id__gt=cursor))
+            if new_events:
+                return new_events
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return []
+        time.sleep(min(settings.LAMBDA_INSTANCE_EVENTS_POLL_INTERVAL, remaining))
@@ -1,8 +1,26 @@
+import json
+import logging
+import time
+from datetime import datetime
+
 from celery import shared_task
+from celery.contrib.batches import Batches
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 from .models import LambdaInstance
 from .models import Server
 from .models import PrivateNetwork
+from .models import AnsibleTaskTiming
+from .models import LambdaInstanceEvent
+from .models import LambdaInstanceStatusTransition
+from .models import HDFSTransfer
+from .models import LambdaInstanceActivity
+from . import response_cache
+from . import event_notifications
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -20,22 +38,144 @@ def create_new_lambda_instance(instance_uuid, instance_name, specs='{}'):
 
     LambdaInstance.objects.create(
         uuid=instance_uuid, name=instance_name, instance_info=specs, status=LambdaInstance.PENDING)
+    response_cache.invalidate(instance_uuid)
+    create_status_event(instance_uuid, LambdaInstance.PENDING)
+    LambdaInstanceStatusTransition.objects.create(
+        instance_uuid=instance_uuid, status=LambdaInstance.PENDING, timestamp=timezone.now())
 
 
-@shared_task
-def set_lambda_instance_status(instance_uuid, status, failure_message=""):
+class StatusUpdates(Batches):
+    """
+    Buffers status updates and applies them in batches. Every status update gets a sequence
+    number, the time in microseconds it was sent, so that it can be ordered against the other
+    updates of the same lambda instance, no matter the order they are delivered in.
+    celery.contrib.batches was removed in Celery 4, which is why requirements.txt pins Celery 3.1.
+    """
+
+    abstract = True
+
+    # Batches uses the old task API, where apply_async is a classmethod.
+    @classmethod
+    def apply_async(cls, args=None, kwargs=None, **options):
+        kwargs = dict(kwargs or {})
+        kwargs.setdefault('sequence', int(time.time() * 1000000))
+        return super(StatusUpdates, cls).apply_async(args, kwargs, **options)
+
+
+@shared_task(base=StatusUpdates, flush_every=100, flush_interval=1)
+def set_lambda_instance_status(requests):
+    """
+    Sets the status of lambda instances. Every request has the arguments instance_uuid, status,
+    failure_message (optional) and sequence. See update_lambda_instance_statuses.
     """
-    Sets the status of a specified lambda instance to the specified status.
-    The existence of the lambda instance should have been previously checked.
+
+    status_updates = []
+    for request in requests:
+        status_update = dict(zip(('instance_uuid', 'status', 'failure_message'), request.args))
+        status_update.update(request.kwargs)
+        status_updates.append(status_update)
+    update_lambda_instance_statuses(status_updates)
+
+
+def update_lambda_instance_status(instance_uuid, status, failure_message="", sequence=None):
+    """
+    Sets the status of a specified lambda instance to the specified status, without waiting for
+    a batch of status updates.
     instance_uuid: The uuid of the lambda instance.
     status: The integer that specifies the new status of the specified lambda instance.
             For more information see models.py.
+    failure_message: The failure message of the lambda instance, if any.
+    sequence: The sequence number of the update. Defaults to the current time in microseconds.
     """
 
-    lambda_instance = LambdaInstance.objects.get(uuid=instance_uuid)
-    lambda_instance.status = status
-    lambda_instance.failure_message = failure_message
-    lambda_instance.save()
+    if sequence is None:
+        sequence = int(time.time() * 1000000)
+    update_lambda_instance_statuses([{'instance_uuid': instance_uuid, 'status': status,
+                                      'failure_message': failure_message,
+                                      'sequence': sequence}])
+
+
+def update_lambda_instance_statuses(status_updates):
+    """
+    Applies a batch of status updates. Only the most recent update of every lambda instance is
+    written to the lambda instance, with a single UPDATE that is skipped if a more recent update
+    has already been applied. The updates that are more recent than the applied ones are
+    recorded as status events and status transitions, in the order of their sequence numbers.
+    The time of a transition is the time its update was sent.
+    The updates of lambda instances that have not been inserted into the DataBase yet are sent
+    again later, see retry_status_update.
+    status_updates: A list of dictionaries, each one containing the instance_uuid, the status,
+                    the failure_message (optional) and the sequence of an update.
+    """
+
+    status_updates = sorted(status_updates, key=lambda status_update: status_update['sequence'])
+    instance_uuids = {str(status_update['instance_uuid']) for status_update in status_updates}
+    applied_sequences = {str(instance_uuid): sequence for instance_uuid, sequence in
+                         LambdaInstance.objects.filter(uuid__in=instance_uuids).
+                         values_list('uuid', 'status_sequence')}
+
+    latest_updates = {}
+    status_events = []
+    status_transitions = []
+    for status_update in status_updates:
+        instance_uuid = str(status_update['instance_uuid'])
+        if instance_uuid not in applied_sequences:
+            retry_status_update(status_update)
+            continue
+        if status_update['sequence'] <= applied_sequences[instance_uuid]:
+            continue
+        latest_updates[instance_uuid] = status_update
+        status_events.append(build_status_event(instance_uuid, status_update['status'],
+                                                status_update.get('failure_message', "")))
+        status_transitions.append(LambdaInstanceStatusTransition(
+            instance_uuid=instance_uuid, status=status_update['status'],
+            timestamp=datetime.fromtimestamp(status_update['sequence'] / 1000000.0,
+                                             timezone.utc)))
+
+    for instance_uuid, status_update in latest_updates.items():
+        LambdaInstance.objects.\
+            filter(uuid=instance_uuid, status_sequence__lt=status_update['sequence']).\
+            update(status=status_update['status'],
+                   failure_message=status_update.get('failure_message', ""),
+                   status_sequence=status_update['sequence'])
+    response_cache.invalidate_many(latest_updates.keys())
+
+    LambdaInstanceEvent.objects.bulk_create(status_events)
+    event_notifications.notify(latest_updates.keys())
+    LambdaInstanceStatusTransition.objects.bulk_create(status_transitions)
+
+
+def retry_status_update(status_update):
+    """
+    Sends again a status update of a lambda instance that is not in the DataBase, in case the
+    update was applied before the lambda instance was inserted. The update keeps its sequence
+    number, so it is still ordered against the other updates of the lambda instance.
+    status_update: A dictionary as in update_lambda_instance_statuses. Its retries are counted
+                   in the 'retries' key.
+    """
+
+    retries = status_update.get('retries', 0)
+    if retries >= settings.LAMBDA_INSTANCE_STATUS_MAX_RETRIES:
+        logger.warning("Status update of unknown lambda instance %s",
+                       status_update['instance_uuid'])
+        return
+
+    status_update = dict(status_update, instance_uuid=str(status_update['instance_uuid']),
+                         retries=retries + 1)
+    # The batches of set_lambda_instance_status ignore the countdown of their requests, so the
+    # update is delayed by a task of its own.
+    retry_lambda_instance_status.apply_async(
+        (status_update,), countdown=settings.LAMBDA_INSTANCE_STATUS_RETRY_DELAY)
+
+
+@shared_task
+def retry_lambda_instance_status(status_update):
+    """
+    Applies a status update that has been sent again by retry_status_update.
+    status_update: A dictionary as in update_lambda_instance_statuses.
+    """
+
+    update_lambda_instance_statuses([status_update])
 
 
 @shared_task
@@ -48,25 +188,153 @@ def insert_cluster_info(instance_uuid, specs, provisioner_response):
     """
 
     lambda_instance = LambdaInstance.objects.get(uuid=instance_uuid)
+    lambda_instance.private_key = provisioner_response['pk']
+    lambda_instance.save()
+
     master = provisioner_response['nodes']['master']
-    Server.objects.create(id=master['id'],
-                          lambda_instance=lambda_instance,
-                          cpus=specs['vcpus_master'],
-                          ram=specs['ram_master'],
-                          disk=specs['disk_master'],
-                          priv_ip=master['internal_ip'],
-                          pub_ip=provisioner_response['ips'][0]['floating_ip_address'],
-                          pub_ip_id=provisioner_response['ips'][0]['id'])
+    servers = [Server(id=master['id'],
+                      lambda_instance=lambda_instance,
+                      cpus=specs['vcpus_master'],
+                      ram=specs['ram_master'],
+                      disk=specs['disk_master'],
+                      priv_ip=master['internal_ip'],
+                      pub_ip=provisioner_response['ips'][0]['floating_ip_address'],
+                      pub_ip_id=provisioner_response['ips'][0]['id'])]
 
     for slave in provisioner_response['nodes']['slaves']:
-        Server.objects.create(id=slave['id'],
+        servers.append(Server(id=slave['id'],
                               lambda_instance=lambda_instance,
                               cpus=specs['vcpus_slave'],
                               ram=specs['ram_slave'],
                               disk=specs['disk_slave'],
-                              priv_ip=slave['internal_ip'])
+                              priv_ip=slave['internal_ip']))
+    Server.objects.bulk_create(servers)
 
     PrivateNetwork.objects.create(id=provisioner_response['vpn']['id'],
                                   lambda_instance=lambda_instance,
                                   subnet=provisioner_response['subnet']['cidr'],
                                   gateway=provisioner_response['subnet']['gateway_ip'])
+    response_cache.invalidate(instance_uuid)
+
+
+@shared_task
+def insert_ansible_task_timings(instance_uuid, task_timings):
+    """
+    Inserts the timings of the ansible tasks run on a lambda instance into the DataBase.
+    instance_uuid: The uuid of the lambda instance
+    task_timings: A list of dictionaries, as recorded by fokia.ansible_callbacks.TaskTimer,
+                  containing the playbook, task, host, start, end and outcome of every task.
+    """
+
+    lambda_instance = LambdaInstance.objects.get(uuid=instance_uuid)
+    AnsibleTaskTiming.objects.bulk_create([
+        AnsibleTaskTiming(lambda_instance=lambda_instance,
+                          playbook=task_timing['playbook'],
+                          task=task_timing['task'],
+                          host=task_timing['host'],
+                          start_time=datetime.fromtimestamp(task_timing['start'], timezone.utc),
+                          end_time=datetime.fromtimestamp(task_timing['end'], timezone.utc),
+                          duration=task_timing['end'] - task_timing['start'],
+                          outcome=task_timing['outcome'])
+        for task_timing in task_timings])
+
+
+@shared_task
+def publish_lambda_instance_events(instance_uuid, instance_events):
+    """
+    Publishes progress events of a lambda instance by inserting them into the DataBase, from
+    where they are streamed to the API clients.
+    instance_uuid: The uuid of the lambda instance
+    instance_events: A list of dictionaries, each one containing the event_type, the message,
+                     the data and the timestamp (seconds since the epoch) of an event.
+    """
+
+    LambdaInstanceEvent.objects.bulk_create([
+        LambdaInstanceEvent(instance_uuid=instance_uuid,
+                            event_type=instance_event['event_type'],
+                            message=instance_event['message'],
+                            data=json.dumps(instance_event.get('data', {})),
+                            timestamp=datetime.fromtimestamp(instance_event['timestamp'],
+                                                             timezone.utc))
+        for instance_event in instance_events])
+    event_notifications.notify([instance_uuid])
+
+
+def create_status_event(instance_uuid, status, failure_message=""):
+    """
+    Inserts an event denoting the status change of a lambda instance into the DataBase.
+    instance_uuid: The uuid of the lambda instance.
+    status: The new status of the lambda instance.
+    failure_message: The failure message of the lambda instance, if any.
+    """
+
+    build_status_event(instance_uuid, status, failure_message).save()
+    event_notifications.notify([instance_uuid])
+
+
+def build_status_event(instance_uuid, status, failure_message=""):
+    """
+    Creates, without saving, an event denoting the status change of a lambda instance.
+    """
+
+    return LambdaInstanceEvent(
+        instance_uuid=instance_uuid, event_type=LambdaInstanceEvent.STATUS,
+        message=dict(LambdaInstance.status_choices)[status],
+        data=json.dumps({'status': status, 'failure_message': failure_message}),
+        timestamp=timezone.now())
+
+
+@shared_task
+def update_hdfs_transfer(transfer_uuid, status, bytes_transferred, failure_message=""):
+    """
+    Updates the progress of a transfer of a file into the HDFS of a lambda instance. Progress
+    updates that arrive after the transfer has ended are ignored.
+    transfer_uuid: The uuid of the transfer.
+    status: The status of the transfer.
+    bytes_transferred: The number of bytes that have been sent so far.
+    failure_message: The reason the transfer failed, if it failed.
+    """
+
+    transfers = HDFSTransfer.objects.filter(uuid=transfer_uuid)
+    if status == HDFSTransfer.RUNNING:
+        transfers = transfers.exclude(status__in=[HDFSTransfer.COMPLETED, HDFSTransfer.FAILED])
+    transfers.update(status=status, bytes_transferred=bytes_transferred,
+                     failure_message=failure_message)
+
+
+@shared_task
+def update_lambda_instance_activities(activities):
+    """
+    Stores the latest samples of the activity of lambda instances.
+    activities: A list of dictionaries, each one containing the instance_uuid, the sampled_at and
+                the last_active times (seconds since the epoch), the kafka_offset and the
+                idle_notified flag of a lambda instance.
+    """
+
+    instance_ids = dict(LambdaInstance.objects.
+                        filter(uuid__in=[activity['instance_uuid'] for activity in activities]).
+                        values_list('uuid', 'id'))
+    instance_ids = {str(instance_uuid): instance_id
+                    for instance_uuid, instance_id in instance_ids.items()}
+    existing_ids = set(LambdaInstanceActivity.objects.
+                       filter(lambda_instance_id__in=instance_ids.values()).
+                       values_list('lambda_instance_id', flat=True))
+
+    new_activities = []
+    with transaction.atomic():
+        for activity in activities:
+            instance_id = instance_ids.get(str(activity['instance_uuid']))
+            if instance_id is None:
+                continue
+            fields = {'sampled_at': datetime.fromtimestamp(activity['sampled_at'], timezone.utc),
+                      'last_active': datetime.fromtimestamp(activity['last_active'],
+                                                            timezone.utc),
+                      'kafka_offset': activity['kafka_offset'],
+                      'idle_notified': activity['idle_notified']}
+            if instance_id in existing_ids:
+                LambdaInstanceActivity.objects.filter(lambda_instance_id=instance_id).\
+                    update(**fields)
+            else:
+                new_activities.append(LambdaInstanceActivity(lambda_instance_id=instance_id,
+                                                             **fields))
+        LambdaInstanceActivity.objects.bulk_create(new_activities)
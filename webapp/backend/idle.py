@@ -0,0 +1,72 @@
+"""
+Detection of the started lambda instances that have been idle for long, according to the idle
+policy of their project, so that they can be stopped and the quota they hold released.
+"""
+
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from fokia.activity import is_active
+
+NOTIFY = 'notify'
+STOP = 'stop'
+
+
+def get_idle_policy(lambda_instance):
+    """
+    :param lambda_instance: A LambdaInstance.
+    :returns: The idle policy of the project of the lambda instance, a dictionary with idle_after,
+              the number of idle seconds after which the lambda instance is stopped, or None if it
+              should never be stopped, and notify_before, the number of seconds before stopping
+              that the owner is notified.
+    """
+    try:
+        project_name = json.loads(lambda_instance.instance_info).get('project_name')
+    except ValueError:
+        project_name = None
+    return dict(settings.IDLE_SUSPEND_POLICIES['default'],
+                **settings.IDLE_SUSPEND_POLICIES.get(project_name, {}))
+
+
+def evaluate(lambda_instance, activity, sample, now):
+    """
+    Updates the activity of a lambda instance with a new sample and decides what should be done
+    with it.
+    :param lambda_instance: A started LambdaInstance.
+    :param activity: The LambdaInstanceActivity of the lambda instance, or None if it has never
+                     been sampled.
+    :param sample: The new sample, as returned by ActivityProbe.sample.
+    :param now: The time of the sample.
+    :returns: A tuple with a dictionary with the updated fields of the activity, the action,
+              NOTIFY, STOP or None, and the number of seconds the lambda instance has been idle.
+    """
+    # The lambda instance is considered active when it is first sampled and when it is started,
+    # so that it always gets a whole idle period, with a new notification.
+    started_at = datetime.fromtimestamp(lambda_instance.status_sequence / 1000000.0,
+                                        timezone.utc)
+    last_active = max(activity.last_active, started_at) if activity else now
+    idle_notified = activity.idle_notified and activity.last_active >= started_at \
+        if activity else False
+    if is_active(sample, activity.kafka_offset if activity else None):
+        last_active = now
+        idle_notified = False
+
+    fields = {'sampled_at': now, 'last_active': last_active,
+              'kafka_offset': sample.get('kafka_offset'), 'idle_notified': idle_notified}
+    idle_seconds = (now - last_active).total_seconds()
+
+    policy = get_idle_policy(lambda_instance)
+    # Nothing is decided for a lambda instance whose services cannot be reached at all.
+    if policy['idle_after'] is None or all(value is None for value in sample.values()):
+        return fields, None, idle_seconds
+    # The owner is always notified before the lambda instance is stopped.
+    if idle_seconds >= policy['idle_after'] - policy['notify_before'] and not idle_notified:
+        fields['idle_notified'] = True
+        return fields, NOTIFY, idle_seconds
+    if idle_seconds >= policy['idle_after']:
+        fields['idle_notified'] = False
+        return fields, STOP, idle_seconds
+    return fields, None, idle_seconds
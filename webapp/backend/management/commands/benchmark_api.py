@@ -0,0 +1,329 @@
+import json
+import random
+import threading
+import time
+import uuid
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from backend import authenticate_user
+from backend.models import User, Token, LambdaInstance, Server, PrivateNetwork, ProjectFile
+from backend.pagination import encode_cursor
+from fokia.utils import check_auth_token
+
+from .benchmark_event_latency import percentile
+
+# The seeded objects are marked, so that they are reused by later runs and removed without
+# touching anything else.
+PREFIX = 'benchmark-'
+# The ~okeanos ids of the seeded servers and networks start from here.
+ID_BASE = 10 ** 12
+
+
+class FakeAstakosHandler(BaseHTTPRequestHandler):
+    """
+    Answers the authentication requests of the service like Astakos does. The token
+    benchmark-token-<name> belongs to the user benchmark-user-<name>, every other token is
+    rejected.
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader('content-length') or 0))
+        self.server.calls += 1
+        time.sleep(self.server.latency)
+
+        token = self.headers.getheader('x-auth-token', '')
+        if not token.startswith(PREFIX + 'token-'):
+            self.respond(401, {'unauthorized': {'code': 401, 'message': "Invalid token"}})
+            return
+
+        user_id = PREFIX + 'user-' + token[len(PREFIX + 'token-'):]
+        url = 'http://{}:{}'.format(*self.server.server_address)
+        self.respond(200, {'access': {
+            'token': {'id': token, 'expires': '2100-01-01T00:00:00+00:00',
+                      'tenant': {'id': user_id, 'name': user_id}},
+            'user': {'id': user_id, 'name': user_id, 'roles': [], 'roles_links': []},
+            'serviceCatalog': [{'name': 'astakos_account', 'type': 'account', 'endpoints': [
+                {'versionId': 'v1.0', 'publicURL': url + '/account/v1.0',
+                 'SNF:uiURL': url + '/ui'}]}]}})
+
+    def respond(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeAstakos(object):
+    """
+    A local Astakos, that the service authenticates its users with while the command runs.
+    """
+
+    def __init__(self, latency):
+        self.server = HTTPServer(('127.0.0.1', 0), FakeAstakosHandler)
+        self.server.calls = 0
+        self.server.latency = latency
+        self.auth_url = 'http://127.0.0.1:{}/identity/v2.0'.format(self.server.server_port)
+
+    @property
+    def calls(self):
+        return self.server.calls
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever).start()
+        authenticate_user.check_auth_token = \
+            lambda auth_token: check_auth_token(auth_token, self.auth_url)
+        return self
+
+    def __exit__(self, *exc_info):
+        authenticate_user.check_auth_token = check_auth_token
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def batches(objects, size):
+    """
+    Splits an iterable into lists of at most size objects, so that huge fixtures are never kept
+    in memory.
+    """
+    objects = iter(objects)
+    batch = list(islice(objects, size))
+    while batch:
+        yield batch
+        batch = list(islice(objects, size))
+
+
+class Command(BaseCommand):
+    help = "Measures the throughput, the latency and the queries of the REST API with realistic " \
+           "volumes of data. The DataBase is seeded with lambda instances, servers and files, " \
+           "which are reused by later runs if --keep is given, and the endpoints are requested " \
+           "by concurrent clients inside this process, authenticated by a local fake Astakos. " \
+           "It only runs on a dedicated DataBase, with --settings=webapp.benchmark_settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instances', type=int, default=100000,
+                            help="Number of lambda instances to seed.")
+        parser.add_argument('--servers-per-instance', type=int, default=10,
+                            help="Number of servers of every seeded lambda instance.")
+        parser.add_argument('--files', type=int, default=100000,
+                            help="Number of files to seed.")
+        parser.add_argument('--users', type=int, default=100,
+                            help="Number of users that own the files and send the requests.")
+        parser.add_argument('--clients', type=int, default=8,
+                            help="Number of concurrent clients.")
+        parser.add_argument('--requests', type=int, default=1000,
+                            help="Number of requests to every endpoint.")
+        parser.add_argument('--endpoints', default=None,
+                            help="Comma separated names of the endpoints to request. Defaults "
+                                 "to all of them.")
+        parser.add_argument('--astakos-latency', type=float, default=0.05,
+                            help="Seconds the fake Astakos takes to answer.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Number of objects inserted with every query while seeding.")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the seeded data for the next runs.")
+
+    def handle(self, *args, **options):
+        # The seeded lambda instances would be probed by the idle detection and scanned by the
+        # reconciliation of the service, if they were inserted into its DataBase.
+        if not settings.BENCHMARK_DATABASE:
+            raise CommandError("The benchmark only runs on a dedicated DataBase, use "
+                               "--settings=webapp.benchmark_settings")
+
+        endpoints = self.get_endpoints()
+        names = options['endpoints'].split(',') if options['endpoints'] else sorted(endpoints)
+        unknown = set(names) - set(endpoints)
+        if unknown:
+            self.stderr.write("Unknown endpoints: " + ", ".join(sorted(unknown)))
+            return
+
+        self.seed(options)
+        self.instance_ids = list(LambdaInstance.objects.filter(name__startswith=PREFIX).
+                                 values_list('id', flat=True))
+        self.instance_uuids = [str(instance_uuid) for instance_uuid in
+                               LambdaInstance.objects.filter(name__startswith=PREFIX).
+                               values_list('uuid', flat=True)]
+        self.users = options['users']
+
+        # Every run starts without verified tokens, so that the first request of every user is
+        # verified with Astakos.
+        authenticate_user.verified_tokens.clear()
+        Token.objects.filter(user__uuid__startswith=PREFIX).delete()
+
+        try:
+            with FakeAstakos(options['astakos_latency']) as astakos:
+                self.stdout.write("{:<24} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}".
+                                  format("Endpoint", "Requests", "Errors", "Req/s", "p50 ms",
+                                         "p95 ms", "p99 ms", "Max ms", "Queries",
+                                         "Max q."))
+                for name in names:
+                    self.report(name, *self.run(endpoints[name], options['requests'],
+                                                options['clients']))
+                self.stdout.write("Requests to Astakos: {}".format(astakos.calls))
+        finally:
+            if not options['keep']:
+                self.clean(options['batch_size'])
+
+    def get_endpoints(self):
+        """
+        :returns: Dictionary with the names of the endpoints as keys, and callables that return
+                  the path and the token of a random request as values.
+        """
+        def token():
+            return PREFIX + 'token-{}'.format(random.randrange(self.users))
+
+        def instance():
+            return '/backend/lambda-instances/{}/'.format(random.choice(self.instance_uuids))
+
+        def page():
+            return encode_cursor(random.choice(self.instance_ids))
+
+        return {
+            'instance-list': lambda: ('/backend/lambda-instances/?limit=20&cursor=' + page(),
+                                      token()),
+            'instance-list-servers': lambda: ('/backend/lambda-instances/?limit=20&fields=id,'
+                                              'uuid,name,servers&cursor=' + page(), token()),
+            'instance-detail': lambda: (instance(), token()),
+            'instance-status': lambda: (instance() + 'status/', token()),
+            'file-list': lambda: ('/backend/user_files/', token()),
+            'file-list-page': lambda: ('/backend/user_files/?limit=20&cursor=', token()),
+            # Every request has a token that has not been verified yet.
+            'token-verification': lambda: (instance() + 'status/',
+                                           PREFIX + 'token-new-' + str(uuid.uuid4())),
+        }
+
+    def run(self, endpoint, requests, clients):
+        """
+        Sends requests to an endpoint from concurrent clients.
+        :returns: The results of the requests, as (latency, status code, queries) tuples, and the
+                  seconds they took.
+        """
+        results = []
+        remaining = [requests]
+        lock = threading.Lock()
+
+        def client():
+            http_client = Client()
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    path, auth_token = endpoint()
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.time()
+                        response = http_client.get(path,
+                                                   HTTP_AUTHORIZATION='Token ' + auth_token)
+                        latency = time.time() - start
+                    with lock:
+                        results.append((latency, response.status_code, len(queries)))
+            finally:
+                connection.close()
+
+        start = time.time()
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.time() - start
+
+    def report(self, name, results, duration):
+        latencies = [latency * 1000 for latency, _, _ in results]
+        queries = [query_count for _, _, query_count in results]
+        errors = len([status for _, status, _ in results if status >= 400])
+        self.stdout.write("{:<24} {:>8} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} "
+                          "{:>8.1f} {:>8}".format(name, len(results), errors,
+                                                  len(results) / duration,
+                                                  percentile(latencies, 0.5),
+                                                  percentile(latencies, 0.95),
+                                                  percentile(latencies, 0.99), max(latencies),
+                                                  float(sum(queries)) / len(queries),
+                                                  max(queries)))
+
+    def seed(self, options):
+        """
+        Seeds the DataBase with the users, the lambda instances, their servers and networks, and
+        the files of the benchmark, unless they are there from an earlier run.
+        """
+        if LambdaInstance.objects.filter(name__startswith=PREFIX).exists():
+            self.stdout.write("Reusing the seeded data of an earlier run")
+            return
+
+        batch_size = options['batch_size']
+        start = time.time()
+        User.objects.bulk_create(User(uuid=PREFIX + 'user-{}'.format(index))
+                                 for index in range(options['users']))
+        users = list(User.objects.filter(uuid__startswith=PREFIX).values_list('id', flat=True))
+
+        statuses = [LambdaInstance.STARTED, LambdaInstance.STOPPED, LambdaInstance.FAILED,
+                    LambdaInstance.DESTROYED]
+        for batch in batches(range(options['instances']), batch_size):
+            LambdaInstance.objects.bulk_create(
+                LambdaInstance(name=PREFIX + str(index), uuid=uuid.uuid4(),
+                               status=statuses[index % len(statuses)],
+                               instance_info=json.dumps({
+                                   'slaves': options['servers_per_instance'] - 1,
+                                   'project_name': PREFIX + 'project-{}'.format(index % 10)}))
+                for index in batch)
+        instance_ids = list(LambdaInstance.objects.filter(name__startswith=PREFIX).
+                            order_by('id').values_list('id', flat=True))
+
+        for batch in batches(enumerate(instance_ids), batch_size):
+            PrivateNetwork.objects.bulk_create(
+                PrivateNetwork(id=ID_BASE + index, subnet='192.168.0.0/24',
+                               gateway='192.168.0.1', lambda_instance_id=instance_id)
+                for index, instance_id in batch)
+
+        def servers():
+            for index, instance_id in enumerate(instance_ids):
+                for node in range(options['servers_per_instance']):
+                    server_id = ID_BASE + index * options['servers_per_instance'] + node
+                    yield Server(id=server_id, hostname='snf-{}.vm.okeanos.grnet.gr'.
+                                 format(server_id), cpus=4, ram=4096, disk=40,
+                                 pub_ip='10.{}.{}.{}'.format(index >> 16, (index >> 8) & 255,
+                                                             index & 255) if node == 0 else None,
+                                 pub_ip_id=server_id if node == 0 else None,
+                                 priv_ip='192.168.0.{}'.format(node % 254 + 2),
+                                 lambda_instance_id=instance_id)
+
+        for batch in batches(servers(), batch_size):
+            Server.objects.bulk_create(batch)
+
+        for batch in batches(range(options['files']), batch_size):
+            ProjectFile.objects.bulk_create(
+                ProjectFile(name=PREFIX + 'file-{}'.format(index),
+                            path='/benchmark/file-{}'.format(index),
+                            owner_id=users[index % len(users)], checksum='0' * 64)
+                for index in batch)
+
+        self.stdout.write("Seeded {} lambda instances, {} servers and {} files in {:.0f} seconds".
+                          format(len(instance_ids),
+                                 len(instance_ids) * options['servers_per_instance'],
+                                 options['files'], time.time() - start))
+
+    def clean(self, batch_size):
+        """
+        Removes the seeded data, and the users of the tokens that were verified by the fake
+        Astakos.
+        """
+        Server.objects.filter(id__gte=ID_BASE).delete()
+        PrivateNetwork.objects.filter(id__gte=ID_BASE).delete()
+        ProjectFile.objects.filter(name__startswith=PREFIX).delete()
+        instance_ids = LambdaInstance.objects.filter(name__startswith=PREFIX).\
+            values_list('id', flat=True)
+        for batch in batches(list(instance_ids), batch_size):
+            LambdaInstance.objects.filter(id__in=batch).delete()
+        User.objects.filter(uuid__startswith=PREFIX).delete()
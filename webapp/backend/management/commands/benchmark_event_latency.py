@@ -0,0 +1,82 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend import events
+from backend.models import LambdaInstanceEvent
+from webapp.celery import occupy_worker
+
+
+def get_routing_key(queue_name):
+    for queue in settings.CELERY_QUEUES:
+        if queue.name == queue_name:
+            return queue.routing_key
+    raise ValueError("Unknown queue " + queue_name)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Measures how long events take to be written to the DataBase, while the " \
+           "provisioning queue is saturated with long running tasks. Running it with " \
+           "--events-queue=provisioning_queue shows the latency when events share the " \
+           "queue of the builds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--builds', type=int, default=8,
+                            help="Number of long running tasks sent to the provisioning queue.")
+        parser.add_argument('--build-duration', type=float, default=60,
+                            help="Seconds every long running task takes.")
+        parser.add_argument('--events', type=int, default=20,
+                            help="Number of events to send.")
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help="Seconds between two events.")
+        parser.add_argument('--events-queue', default='events_queue',
+                            help="The queue to send the events to.")
+        parser.add_argument('--timeout', type=float, default=None,
+                            help="Seconds to wait for the events. Defaults to the time needed "
+                                 "to run all the long running tasks one after the other.")
+
+    def handle(self, *args, **options):
+        instance_uuid = str(uuid.uuid4())
+        timeout = options['timeout']
+        if timeout is None:
+            timeout = options['builds'] * options['build_duration'] + 60
+
+        for _ in range(options['builds']):
+            occupy_worker.apply_async((options['build_duration'],), queue='provisioning_queue',
+                                      routing_key=get_routing_key('provisioning_queue'))
+
+        sent_times = {}
+        for event_number in range(options['events']):
+            message = "Benchmark event {}".format(event_number)
+            sent_times[message] = time.time()
+            events.publish_lambda_instance_events.apply_async(
+                (instance_uuid, [{'event_type': LambdaInstanceEvent.PROVISIONING,
+                                  'message': message, 'timestamp': sent_times[message]}]),
+                queue=options['events_queue'],
+                routing_key=get_routing_key(options['events_queue']))
+            time.sleep(options['interval'])
+
+        # The events are written with the time they were sent, so their latency is measured by
+        # polling for them.
+        latencies = {}
+        deadline = time.time() + timeout
+        while len(latencies) < len(sent_times) and time.time() < deadline:
+            for message in LambdaInstanceEvent.objects.filter(instance_uuid=instance_uuid).\
+                    exclude(message__in=list(latencies)).values_list('message', flat=True):
+                latencies[message] = time.time() - sent_times[message]
+            time.sleep(0.1)
+        LambdaInstanceEvent.objects.filter(instance_uuid=instance_uuid).delete()
+
+        self.stdout.write("Events written: {} of {}".format(len(latencies), len(sent_times)))
+        if latencies:
+            values = list(latencies.values())
+            self.stdout.write("Latency (seconds): min {:.3f}, median {:.3f}, p95 {:.3f}, "
+                              "max {:.3f}".format(min(values), percentile(values, 0.5),
+                                                  percentile(values, 0.95), max(values)))
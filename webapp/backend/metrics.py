@@ -0,0 +1,200 @@
+"""
+Prometheus metrics of the service. The web server and the Celery workers run in many processes,
+so the metrics of every process are written in METRICS_DIRECTORY and aggregated when they are
+exported. The metrics that reflect the current state of the service, the lambda instances per
+status and the messages waiting in every queue, are computed when they are exported.
+"""
+
+import logging
+import os
+import re
+import socket
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count
+
+# The multiprocess mode of prometheus_client is chosen when it is imported.
+if settings.METRICS_DIRECTORY:
+    os.environ.setdefault('prometheus_multiproc_dir', settings.METRICS_DIRECTORY)
+
+from astakosclient import AstakosClient
+from celery import current_app
+from celery.signals import task_prerun, task_postrun
+from kamaki.clients import Client
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .models import LambdaInstance
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram('lambda_request_duration_seconds',
+                            "Time to respond to the API requests.", ['view', 'method', 'status'])
+
+AUTH_CACHE_REQUESTS = Counter('lambda_auth_cache_requests_total',
+                              "Lookups of tokens in the cache of verified tokens.", ['result'])
+
+TASK_DURATION = Histogram('lambda_celery_task_duration_seconds',
+                          "Time to run the Celery tasks.", ['task', 'state'],
+                          buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600,
+                                   float('inf')))
+
+CLOUD_API_LATENCY = Histogram('lambda_cloud_api_duration_seconds',
+                              "Time to complete the calls to the ~okeanos API.",
+                              ['service', 'method', 'endpoint'])
+
+CLOUD_API_ERRORS = Counter('lambda_cloud_api_errors_total',
+                           "Calls to the ~okeanos API that failed.",
+                           ['service', 'method', 'endpoint', 'status'])
+
+# The path segments of the ~okeanos API that are ids or uuids. They are replaced, so that every
+# endpoint is one time series.
+ID_SEGMENT = re.compile(r'^[0-9a-fA-F-]*[0-9][0-9a-fA-F-]*$')
+
+task_start_times = {}
+
+
+def get_endpoint(path):
+    """
+    :param path: The path of a call to the ~okeanos API.
+    :returns: The path, without the query and with every id replaced by {id}.
+    """
+    segments = path.split('?')[0].strip('/').split('/')
+    return '/'.join('{id}' if ID_SEGMENT.match(segment) else segment for segment in segments)
+
+
+def observe_cloud_api(service, method, path, call):
+    """
+    Calls the ~okeanos API and records the duration of the call, or the failure.
+    :param service: The ~okeanos service that is called, e.g. compute.
+    :param method: The HTTP method of the call.
+    :param path: The path of the call.
+    :param call: A callable that makes the call.
+    """
+    labels = (service, method.upper(), get_endpoint(path))
+    start = time.time()
+    try:
+        result = call()
+    except Exception as exception:
+        CLOUD_API_ERRORS.labels(*(labels + (str(getattr(exception, 'status', 0)),))).inc()
+        raise
+    finally:
+        CLOUD_API_LATENCY.labels(*labels).observe(time.time() - start)
+    return result
+
+
+def instrument_cloud_clients():
+    """
+    Records the calls of the kamaki clients, used for Cyclades, and of the astakos client, used
+    for the authentication, since the ~okeanos API is called from many places of fokia.
+    """
+    if getattr(Client.request, 'instrumented', False):
+        return
+
+    request = Client.request
+    call_astakos = AstakosClient._call_astakos
+
+    @wraps(request)
+    def instrumented_request(client, method, path, *args, **kwargs):
+        return observe_cloud_api(client.service_type or type(client).__name__, method, path,
+                                 lambda: request(client, method, path, *args, **kwargs))
+
+    @wraps(call_astakos)
+    def instrumented_call_astakos(client, request_path, *args, **kwargs):
+        return observe_cloud_api('identity', kwargs.get('method', 'GET'), request_path,
+                                 lambda: call_astakos(client, request_path, *args, **kwargs))
+
+    instrumented_request.instrumented = True
+    Client.request = instrumented_request
+    AstakosClient._call_astakos = instrumented_call_astakos
+
+
+instrument_cloud_clients()
+
+
+@task_prerun.connect
+def on_task_prerun(task_id=None, **kwargs):
+    task_start_times[task_id] = time.time()
+
+
+@task_postrun.connect
+def on_task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = task_start_times.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.time() - start)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Records the time to respond to every request, by the name of the view that handled it.
+    """
+
+    def process_request(self, request):
+        request.metrics_start = time.time()
+
+    def process_response(self, request, response):
+        start = getattr(request, 'metrics_start', None)
+        if start is not None:
+            resolver_match = getattr(request, 'resolver_match', None)
+            view = resolver_match.view_name if resolver_match else 'unresolved'
+            REQUEST_LATENCY.labels(view, request.method, str(response.status_code)).\
+                observe(time.time() - start)
+        return response
+
+
+def get_queue_depths():
+    """
+    :returns: Dictionary with the names of the Celery queues as keys and the number of messages
+              waiting in them as values, or None if the broker cannot be reached.
+    """
+    with current_app.connection() as connection:
+        try:
+            connection.ensure_connection(max_retries=1)
+            channel = connection.default_channel
+            return {queue.name: channel.queue_declare(queue=queue.name, passive=True)[1]
+                    for queue in settings.CELERY_QUEUES}
+        except connection.connection_errors + connection.channel_errors + (socket.error,) \
+                as exception:
+            logger.warning("Cannot get the depths of the queues: %s", exception)
+            return None
+
+
+class StateCollector(object):
+    """
+    Collects the metrics of the current state of the service when they are exported.
+    """
+
+    def collect(self):
+        status_names = dict(LambdaInstance.status_choices)
+        instances = GaugeMetricFamily('lambda_instances', "Lambda instances per status.",
+                                      labels=['status'])
+        counts = LambdaInstance.objects.values('status').annotate(count=Count('id'))
+        for row in counts.order_by('status'):
+            instances.add_metric([status_names.get(row['status'], row['status'])],
+                                 row['count'])
+        yield instances
+
+        queue_depths = get_queue_depths()
+        if queue_depths is not None:
+            queues = GaugeMetricFamily('lambda_celery_queue_messages',
+                                       "Messages waiting in every Celery queue.",
+                                       labels=['queue'])
+            for queue, depth in sorted(queue_depths.items()):
+                queues.add_metric([queue], depth)
+            yield queues
+
+
+def export():
+    """
+    :returns: The metrics of every process of the service, in the Prometheus text format.
+    """
+    registry = CollectorRegistry()
+    if settings.METRICS_DIRECTORY:
+        MultiProcessCollector(registry)
+    else:
+        registry.register(REGISTRY)
+    registry.register(StateCollector())
+    return generate_latest(registry)
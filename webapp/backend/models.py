@@ -52,6 +52,29 @@ class Project(models.Model):
         app_label = 'backend'
 
 
+class FileBlob(models.Model):
+    """
+    Stores the content of the uploaded files. Every content is stored once, at a path derived
+    from its checksum, no matter how many files have it.
+    checksum: the SHA-256 checksum of the content.
+    size: the size of the content, in bytes.
+    path: the path the content is stored at.
+    references: the number of files that have the content. The content is deleted when no file
+                has it.
+    """
+    id = models.AutoField("id", primary_key=True)
+    checksum = models.CharField(max_length=64, unique=True,
+                                help_text="SHA-256 checksum of the content.")
+    size = models.BigIntegerField(help_text="Size of the content, in bytes.")
+    path = models.CharField(max_length=400)
+    references = models.IntegerField(default=1, help_text="Number of files with the content.")
+    creation_date = models.DateTimeField("Creation Date", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "FileBlob"
+        app_label = "backend"
+
+
 class ProjectFile(models.Model):
     id = models.AutoField("id", primary_key=True, unique=True, help_text="Project file id.")
     uuid = models.UUIDField("uuid", unique=True, default=uuid.uuid4, help_text="Project file uuid.")
@@ -59,16 +82,60 @@ class ProjectFile(models.Model):
     path = models.CharField(max_length=400)
     description = models.CharField(max_length=400, blank=True, default='')
     owner = models.ForeignKey(User, default=None, on_delete=models.SET_NULL, null=True)
+    checksum = models.CharField(max_length=64, blank=True, default='',
+                                help_text="SHA-256 checksum of the file.")
+    # The content of the file. The path of the file is the path of its blob.
+    blob = models.ForeignKey(FileBlob, null=True, on_delete=models.PROTECT,
+                             related_name="project_files")
 
     class Meta:
         verbose_name = "ProjectFile"
         app_label = "backend"
+        # The files of every user are paginated by their id.
+        index_together = (('owner', 'id'),)
+
+
+class ProjectFileUpload(models.Model):
+    """
+    Stores every chunked upload of a file that is in progress. The received chunks are appended
+    to a partial file, which becomes a ProjectFile when all of its bytes have been received.
+    uuid: the identifier of the upload, used by the API.
+    name: the name of the file.
+    size: the size of the whole file, in bytes.
+    checksum: the SHA-256 checksum of the whole file.
+    offset: the number of bytes that have been received and verified. An interrupted upload is
+            resumed from this offset.
+    update_date: the time the upload was started or received its last chunk. Uploads that are
+                 not updated for UPLOAD_EXPIRATION seconds are abandoned and removed.
+    """
+    id = models.AutoField("id", primary_key=True)
+    uuid = models.UUIDField("uuid", unique=True, default=uuid.uuid4, help_text="Upload uuid.")
+    name = models.CharField(max_length=100)
+    description = models.CharField(max_length=400, blank=True, default='')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    size = models.BigIntegerField(help_text="Size of the whole file, in bytes.")
+    checksum = models.CharField(max_length=64, help_text="SHA-256 checksum of the whole file.")
+    offset = models.BigIntegerField(default=0,
+                                    help_text="Number of bytes received and verified.")
+    creation_date = models.DateTimeField("Creation Date", auto_now_add=True)
+    update_date = models.DateTimeField("Update Date", auto_now=True)
+
+    class Meta:
+        verbose_name = "ProjectFileUpload"
+        app_label = "backend"
 
 
 class Token(models.Model):
+    """
+    Stores the last verified ~okeanos token of every lambda-user.
+    key: a keyed digest of the token. The token itself is not stored.
+    creation_date: the time the token was last verified with Astakos.
+    expiration_date: the time the token expires, as reported by Astakos.
+    """
     user = models.OneToOneField(User, related_name='kamaki_token')
-    key = models.CharField(max_length=100, null=True)
+    key = models.CharField(max_length=100, null=True, db_index=True)
     creation_date = models.DateTimeField('Creation Date')
+    expiration_date = models.DateTimeField('Expiration Date', null=True)
 
     class Meta:
         verbose_name = "Token"
@@ -82,6 +149,9 @@ class LambdaInstance(models.Model):
     uuid: A unique id asigned to every Lambda Instance. This key will be used by the API
           to reference a specific Lambda Instance.
     failure_message: Message that denotes the reason of failure of the lambda instance.
+    private_key: The private ssh key that gives access to the VMs of the lambda instance.
+    status_sequence: The sequence number of the last status update applied to the lambda
+                     instance. Status updates with lower sequence numbers are stale.
     """
     id = models.AutoField("Instance ID", primary_key=True, null=False,
                           help_text="Auto-increment instance id.")
@@ -100,6 +170,11 @@ class LambdaInstance(models.Model):
     failure_message = models.TextField(default="",
                                        help_text="Error message regarding this lambda instance")
 
+    # The private key is used to connect to the VMs of the lambda instance, in order to run
+    # ansible playbooks on them after the lambda instance has been created.
+    private_key = models.TextField(default="",
+                                   help_text="Private ssh key of the lambda instance.")
+
     STARTED = "0"
     STOPPED = "1"
     PENDING = "2"
@@ -122,6 +197,9 @@ class LambdaInstance(models.Model):
     KAFKA_FAILED = "19"
     FLINK_INSTALLED = "20"
     FLINK_FAILED = "21"
+    PAUSING = "22"
+    PAUSED = "23"
+    UNPAUSING = "24"
     status_choices = (
         (STARTED, 'STARTED'),
         (STOPPED, 'STOPPED'),
@@ -145,10 +223,16 @@ class LambdaInstance(models.Model):
         (KAFKA_FAILED, 'KAFKA_FAILED'),
         (FLINK_INSTALLED, 'FLINK_INSTALLED'),
         (FLINK_FAILED, 'FLINK_FAILED'),
+        (PAUSING, 'PAUSING'),
+        (PAUSED, 'PAUSED'),
+        (UNPAUSING, 'UNPAUSING'),
 
     )
     status = models.CharField(max_length=10, choices=status_choices, default=PENDING,
                               help_text="The status of this instance.")
+    status_sequence = models.BigIntegerField(default=0,
+                                             help_text="Sequence number of the last status "
+                                                       "update.")
 
     def __unicode__(self):
         info = "Instance id: " + str(self.id) + "\n" + \
@@ -238,6 +322,325 @@ class PrivateNetwork(models.Model):
         app_label = 'backend'
 
 
+class AnsibleTaskTiming(models.Model):
+    """
+    Stores the timing of an ansible task on a host of a lambda instance, as recorded while
+    running the playbooks that build the lambda instance.
+    playbook: the playbook the task belongs to.
+    task: the name of the task.
+    host: the host the task ran on.
+    start_time: the time the task was started.
+    end_time: the time the last result of the task was reported for the host.
+    duration: end_time - start_time, in seconds.
+    outcome: the result of the task on the host.
+    lambda_instance: the lambda instance the host belongs to.
+    :model: models.LambdaInstance.
+    """
+    OK = "ok"
+    CHANGED = "changed"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    UNREACHABLE = "unreachable"
+    outcome_choices = (
+        (OK, 'OK'),
+        (CHANGED, 'CHANGED'),
+        (SKIPPED, 'SKIPPED'),
+        (FAILED, 'FAILED'),
+        (UNREACHABLE, 'UNREACHABLE'),
+    )
+
+    id = models.AutoField("id", primary_key=True)
+    playbook = models.CharField(max_length=100, help_text="The playbook of the task.")
+    task = models.CharField(max_length=255, help_text="The name of the task.")
+    host = models.CharField(max_length=255, db_index=True,
+                            help_text="The host the task ran on.")
+    start_time = models.DateTimeField("Start time", help_text="The time the task started.")
+    end_time = models.DateTimeField("End time", help_text="The time the task ended.")
+    duration = models.FloatField("Duration", db_index=True,
+                                 help_text="The duration of the task in seconds.")
+    outcome = models.CharField(max_length=20, choices=outcome_choices,
+                               help_text="The result of the task on the host.")
+    lambda_instance = models.ForeignKey(LambdaInstance, null=False, blank=False, unique=False,
+                                        default=None, on_delete=models.CASCADE,
+                                        related_name="ansible_task_timings")
+
+    def __unicode__(self):
+        info = "Playbook: " + str(self.playbook) + "\n" + \
+               "Task: " + str(self.task) + "\n" + \
+               "Host: " + str(self.host) + "\n" + \
+               "Duration: " + str(self.duration) + "\n" + \
+               "Outcome: " + str(self.outcome) + "\n" + \
+               "Lambda Instance id: " + str(self.lambda_instance.id)
+        return info
+
+    class Meta:
+        verbose_name = "AnsibleTaskTiming"
+        app_label = 'backend'
+        index_together = (('playbook', 'task'),)
+
+
+class LambdaInstanceEvent(models.Model):
+    """
+    Stores the progress events of every lambda instance, e.g. status changes, provisioning steps
+    and completed ansible tasks. The events of a lambda instance are streamed to the API clients,
+    which use the id of the last event they have received as a cursor to resume the stream.
+    id: an auto-increment id, used as the cursor of the stream.
+    instance_uuid: the uuid of the lambda instance the event refers to.
+    event_type: the type of the event.
+    message: a human readable description of the event.
+    data: additional information about the event in json format.
+    timestamp: the time the event happened.
+    """
+    STATUS = "status"
+    PROVISIONING = "provisioning"
+    TASK = "task"
+    IDLE = "idle"
+    event_type_choices = (
+        (STATUS, 'STATUS'),
+        (PROVISIONING, 'PROVISIONING'),
+        (TASK, 'TASK'),
+        (IDLE, 'IDLE'),
+    )
+
+    id = models.AutoField("id", primary_key=True)
+    # The lambda instance is referenced by its uuid, since events may be published before the
+    # entry of the lambda instance is inserted into the DataBase.
+    instance_uuid = models.UUIDField("Instance UUID", db_index=True,
+                                     help_text="The uuid of the lambda instance.")
+    event_type = models.CharField(max_length=20, choices=event_type_choices,
+                                  help_text="The type of the event.")
+    message = models.TextField(default="", help_text="Description of the event.")
+    data = models.TextField(default='{}', help_text="Event information in json format.")
+    timestamp = models.DateTimeField("Timestamp", help_text="The time the event happened.")
+
+    def __unicode__(self):
+        info = "Event id: " + str(self.id) + "\n" + \
+               "Instance uuid: " + str(self.instance_uuid) + "\n" + \
+               "Type: " + str(self.event_type) + "\n" + \
+               "Message: " + str(self.message)
+        return info
+
+    class Meta:
+        verbose_name = "LambdaInstanceEvent"
+        app_label = 'backend'
+        index_together = (('instance_uuid', 'id'),)
+
+
+class LambdaInstanceStatusTransition(models.Model):
+    """
+    Stores every status change of every lambda instance. Entries are only appended, so that the
+    time spent in every stage of the life of a lambda instance can be calculated.
+    id: a unique identifier.
+    instance_uuid: the uuid of the lambda instance.
+    status: the status the lambda instance changed to.
+    timestamp: the time the status changed.
+    """
+
+    id = models.AutoField("id", primary_key=True)
+    instance_uuid = models.UUIDField("Instance UUID", db_index=True,
+                                     help_text="The uuid of the lambda instance.")
+    status = models.CharField(max_length=10, choices=LambdaInstance.status_choices,
+                              help_text="The status the lambda instance changed to.")
+    timestamp = models.DateTimeField("Timestamp", db_index=True,
+                                     help_text="The time the status changed.")
+
+    def __unicode__(self):
+        info = "Instance uuid: " + str(self.instance_uuid) + "\n" + \
+               "Status: " + str(self.status) + "\n" + \
+               "Timestamp: " + str(self.timestamp)
+        return info
+
+    class Meta:
+        verbose_name = "LambdaInstanceStatusTransition"
+        app_label = 'backend'
+        index_together = (('instance_uuid', 'timestamp'), ('status', 'timestamp'))
+
+
+class HDFSTransfer(models.Model):
+    """
+    Stores every transfer of an uploaded file into the HDFS of a lambda instance.
+    uuid: the identifier of the transfer, used by the API.
+    lambda_instance: the lambda instance the file is transferred to.
+    project_file: the file that is transferred.
+    destination: the HDFS path the file is transferred to.
+    size: the size of the file, in bytes.
+    bytes_transferred: the number of bytes that have been sent so far.
+    status: the status of the transfer.
+    failure_message: the reason a failed transfer failed.
+    """
+    PENDING = "0"
+    RUNNING = "1"
+    COMPLETED = "2"
+    FAILED = "3"
+    status_choices = (
+        (PENDING, 'PENDING'),
+        (RUNNING, 'RUNNING'),
+        (COMPLETED, 'COMPLETED'),
+        (FAILED, 'FAILED'),
+    )
+
+    id = models.AutoField("id", primary_key=True)
+    uuid = models.UUIDField("uuid", unique=True, default=uuid.uuid4, help_text="Transfer uuid.")
+    lambda_instance = models.ForeignKey(LambdaInstance, on_delete=models.CASCADE,
+                                        related_name="hdfs_transfers")
+    project_file = models.ForeignKey(ProjectFile, null=True, on_delete=models.SET_NULL,
+                                     related_name="hdfs_transfers")
+    destination = models.CharField(max_length=400, help_text="HDFS path of the file.")
+    size = models.BigIntegerField(help_text="Size of the file, in bytes.")
+    bytes_transferred = models.BigIntegerField(default=0,
+                                               help_text="Number of bytes sent so far.")
+    status = models.CharField(max_length=10, choices=status_choices, default=PENDING,
+                              help_text="The status of the transfer.")
+    failure_message = models.TextField(default="", help_text="The reason the transfer failed.")
+    creation_date = models.DateTimeField("Creation Date", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "HDFSTransfer"
+        app_label = 'backend'
+
+
+class LambdaInstanceActivity(models.Model):
+    """
+    Stores the last sample of the activity of the services of every started lambda instance,
+    that is used to detect the lambda instances that have been idle for long.
+    lambda_instance: the lambda instance.
+    sampled_at: the time of the last sample.
+    last_active: the last time the lambda instance was found doing any work.
+    kafka_offset: the sum of the Kafka offsets of the last sample, if Kafka could be reached.
+    idle_notified: whether the owner has been notified that the lambda instance will be stopped.
+    """
+    lambda_instance = models.OneToOneField(LambdaInstance, on_delete=models.CASCADE,
+                                           related_name="activity")
+    sampled_at = models.DateTimeField("Sampled at", help_text="The time of the last sample.")
+    last_active = models.DateTimeField("Last active",
+                                       help_text="The last time the lambda instance was active.")
+    kafka_offset = models.BigIntegerField(null=True, help_text="The sum of the Kafka offsets.")
+    idle_notified = models.BooleanField(default=False,
+                                        help_text="Whether the owner has been notified.")
+
+    def __unicode__(self):
+        info = "Lambda instance id: " + str(self.lambda_instance_id) + "\n" + \
+               "Last active: " + str(self.last_active)
+        return info
+
+    class Meta:
+        verbose_name = "LambdaInstanceActivity"
+        app_label = 'backend'
+
+
+class BuildReservation(models.Model):
+    """
+    Stores the resources that a requested build of a lambda instance claims from the quota of its
+    project, from the time it is requested until the build is complete. The builds are admitted
+    one at a time, so that the claims of the builds in progress are always checked against the
+    quota. The claims of a build stop counting when its VMs are created, since they are then part
+    of the usage of the project.
+    instance_uuid: the uuid of the lambda instance that is built.
+    owner: the user that requested the build.
+    project_name: the name of the ~okeanos project of the lambda instance.
+    vms, cpus, ram, disk, floating_ips, private_networks: the resources that the build claims.
+                                                          ram is in MB and disk in GB.
+    status: QUEUED until the build is admitted, ADMITTED until its VMs are created, PROVISIONED
+            until the build is complete.
+    created_at: the time the build was requested.
+    """
+    instance_uuid = models.UUIDField("Instance UUID", unique=True,
+                                     help_text="The uuid of the lambda instance.")
+    owner = models.ForeignKey(User, null=True, on_delete=models.SET_NULL,
+                              help_text="The user that requested the build.")
+    project_name = models.CharField(max_length=255, help_text="The project of the build.")
+    vms = models.IntegerField(help_text="The number of VMs.")
+    cpus = models.IntegerField(help_text="The number of CPUs.")
+    ram = models.IntegerField(help_text="The RAM in MB.")
+    disk = models.IntegerField(help_text="The disk space in GB.")
+    floating_ips = models.IntegerField(help_text="The number of public ips.")
+    private_networks = models.IntegerField(help_text="The number of private networks.")
+
+    QUEUED = "0"
+    ADMITTED = "1"
+    PROVISIONED = "2"
+    status_choices = (
+        (QUEUED, 'QUEUED'),
+        (ADMITTED, 'ADMITTED'),
+        (PROVISIONED, 'PROVISIONED'),
+    )
+    status = models.CharField(max_length=10, choices=status_choices, default=QUEUED,
+                              help_text="The status of the build.")
+    created_at = models.DateTimeField("Created at", auto_now_add=True,
+                                      help_text="The time the build was requested.")
+
+    def __unicode__(self):
+        info = "Instance uuid: " + str(self.instance_uuid) + "\n" + \
+               "Project: " + self.project_name
+        return info
+
+    class Meta:
+        verbose_name = "BuildReservation"
+        app_label = 'backend'
+
+
+class ScheduledOperation(models.Model):
+    """
+    Stores a lifecycle operation on a lambda instance, from the time it is requested until its
+    task is complete. The operations wait for their turn in the order of the scheduler, since the
+    tasks of the lifecycle worker are otherwise run in the order they were sent. A task that
+    operates on many lambda instances has one scheduled operation for each of them.
+    task_id: the id of the task that runs the operation.
+    instance_uuid: the uuid of the lambda instance.
+    operation: the operation, one of DESTROY, STOP and START, in the order of their priority.
+    owner: the user that requested the operation.
+    project_name: the name of the ~okeanos project of the lambda instance.
+    status: QUEUED until the task is let run, RUNNING until it is complete, or CANCELLED if the
+            operation was preempted by another operation on the same lambda instance before its
+            task started.
+    created_at: the time the operation was requested.
+    started_at: the time its task was let run, if it has started.
+    """
+    task_id = models.CharField("Task id", max_length=36, db_index=True,
+                               help_text="The id of the task of the operation.")
+    instance_uuid = models.UUIDField("Instance UUID", db_index=True,
+                                     help_text="The uuid of the lambda instance.")
+
+    DESTROY = "0"
+    STOP = "1"
+    START = "2"
+    operation_choices = (
+        (DESTROY, 'DESTROY'),
+        (STOP, 'STOP'),
+        (START, 'START'),
+    )
+    operation = models.CharField(max_length=10, choices=operation_choices,
+                                 help_text="The operation.")
+    owner = models.ForeignKey(User, null=True, on_delete=models.SET_NULL,
+                              help_text="The user that requested the operation.")
+    project_name = models.CharField(max_length=255, default="",
+                                    help_text="The project of the lambda instance.")
+
+    QUEUED = "0"
+    RUNNING = "1"
+    CANCELLED = "2"
+    status_choices = (
+        (QUEUED, 'QUEUED'),
+        (RUNNING, 'RUNNING'),
+        (CANCELLED, 'CANCELLED'),
+    )
+    status = models.CharField(max_length=10, choices=status_choices, default=QUEUED,
+                              help_text="The status of the operation.")
+    created_at = models.DateTimeField("Created at", auto_now_add=True,
+                                      help_text="The time the operation was requested.")
+    started_at = models.DateTimeField("Started at", null=True,
+                                      help_text="The time the task of the operation started.")
+
+    def __unicode__(self):
+        info = "Task id: " + self.task_id + "\n" + \
+               "Instance uuid: " + str(self.instance_uuid)
+        return info
+
+    class Meta:
+        verbose_name = "ScheduledOperation"
+        app_label = 'backend'
+
+
 """
 OBJECT CONNECTIONS
 """
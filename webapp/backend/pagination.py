@@ -0,0 +1,90 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db import connection
+
+
+class BadPaginationParameter(Exception):
+    pass
+
+
+def encode_cursor(last_id):
+    """
+    Creates an opaque cursor that points after the object with the specified id.
+    :param last_id: The id of the last object of a page.
+    """
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}))
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: A cursor created by encode_cursor, or an empty string for the first page.
+    :returns: The id of the last object of the previous page, or None for the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['id']
+    except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+        raise BadPaginationParameter("Bad cursor")
+    if not isinstance(last_id, (int, long)):
+        raise BadPaginationParameter("Bad cursor")
+    return last_id
+
+
+def estimate_count(queryset):
+    """
+    Estimates the number of the objects of a queryset. On PostgreSQL the estimate of the query
+    planner is used, so that the objects are not counted. On other databases the objects are
+    counted.
+    :param queryset: The queryset.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    query, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, basestring):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def paginate_by_cursor(queryset, query_params):
+    """
+    Retrieves a page of a queryset, ordered by id. Instead of skipping the objects of the
+    previous pages, the page starts after the id that the cursor points to, so every page is
+    retrieved equally fast.
+    :param queryset: The queryset to paginate.
+    :param query_params: The query parameters of the request. cursor points after the last object
+                         of the previous page, limit is the number of the objects in the page and
+                         count requests an estimate of the number of all the objects.
+    :returns: A tuple with the objects of the page and a dictionary with the cursor of the next
+              page, which is None on the last page, and the estimate of the count, if it was
+              requested.
+    """
+    try:
+        limit = int(query_params.get('limit', settings.PAGINATION_DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise BadPaginationParameter("Bad parameter")
+    if limit <= 0:
+        raise BadPaginationParameter("Zero or negative indexing not supported")
+    limit = min(limit, settings.PAGINATION_MAX_LIMIT)
+
+    last_id = decode_cursor(query_params.get('cursor'))
+
+    page_queryset = queryset.order_by('id')
+    if last_id is not None:
+        page_queryset = page_queryset.filter(id__gt=last_id)
+
+    # One more object than needed is retrieved, to find out whether there is a next page.
+    page = list(page_queryset[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1].id) if len(page) > limit else None
+
+    pagination = {'next_cursor': next_cursor}
+    if query_params.get('count', '').lower() == 'true':
+        pagination['count'] = estimate_count(queryset)
+
+    return page[:limit], pagination
@@ -0,0 +1,95 @@
+"""
+Reconciliation of the statuses of the lambda instances with the state of their VMs on ~okeanos,
+for the lambda instances whose VMs were stopped, started or deleted outside the service, or whose
+lifecycle task never completed.
+"""
+
+from .models import LambdaInstance
+
+# The statuses that are corrected whenever they differ from the state of the VMs.
+RECONCILED_STATUSES = (LambdaInstance.STARTED, LambdaInstance.STOPPED)
+
+# The statuses of lifecycle tasks in progress. They are only corrected if they have not changed
+# for RECONCILIATION_STALE_AFTER seconds, since their task may still be running.
+TRANSITIONAL_STATUSES = (LambdaInstance.STARTING, LambdaInstance.STOPPING,
+                         LambdaInstance.DESTROYING)
+
+
+def get_observed_status(server_ids, server_statuses):
+    """
+    :param server_ids: The ~okeanos ids of the VMs of a lambda instance.
+    :param server_statuses: The status of every VM of the owner of the lambda instance. VMs that
+                            are not listed have been deleted.
+    :returns: A tuple with the status and the failure message that the state of the VMs
+              corresponds to, or None if the VMs are changing status.
+    """
+    statuses = {server_id: server_statuses.get(str(server_id), 'DELETED')
+                for server_id in server_ids}
+    deleted_ids = sorted(server_id for server_id, server_status in statuses.items()
+                         if server_status == 'DELETED')
+    error_ids = sorted(server_id for server_id, server_status in statuses.items()
+                       if server_status == 'ERROR')
+
+    if len(deleted_ids) == len(statuses):
+        return LambdaInstance.DESTROYED, ""
+    if deleted_ids:
+        return LambdaInstance.FAILED, "VMs {} were deleted outside the service".\
+            format(", ".join(str(server_id) for server_id in deleted_ids))
+    if error_ids:
+        return LambdaInstance.FAILED, "VMs {} are in ERROR status".\
+            format(", ".join(str(server_id) for server_id in error_ids))
+    if set(statuses.values()) == {'ACTIVE'}:
+        return LambdaInstance.STARTED, ""
+    if set(statuses.values()) == {'STOPPED'}:
+        return LambdaInstance.STOPPED, ""
+    return None
+
+
+def find_account(lambda_instance, cloud_states):
+    """
+    :param lambda_instance: A lambda instance, with its servers and private networks prefetched.
+    :param cloud_states: A list of tuples, one for every account, with the status of every VM and
+                         the ids of the networks of the account.
+    :returns: The index of the account the lambda instance belongs to, the one that lists any of
+              its VMs or its network, or None if no account lists them.
+    """
+    server_ids = {str(server.id) for server in lambda_instance.servers.all()}
+    network_ids = {str(network.id) for network in lambda_instance.private_network.all()}
+    for index, (server_statuses, account_network_ids) in enumerate(cloud_states):
+        if server_ids & set(server_statuses) or network_ids & account_network_ids:
+            return index
+    return None
+
+
+def get_corrections(lambda_instances, cloud_states, stale_sequence):
+    """
+    Compares the lambda instances with the state of their VMs.
+    :param lambda_instances: The lambda instances, with their servers and private networks
+                             prefetched.
+    :param cloud_states: A list of tuples, one for every account the lambda instances may belong
+                         to, with the status of every VM and the ids of the networks of the
+                         account.
+    :param stale_sequence: The status sequence before which transitional statuses are stale.
+    :returns: A list of tuples with the uuid, the status and the failure message of every lambda
+              instance whose status should be corrected.
+    """
+    corrections = []
+    for lambda_instance in lambda_instances:
+        server_ids = [server.id for server in lambda_instance.servers.all()]
+        # The lambda instances that no account lists are left as they are.
+        index = find_account(lambda_instance, cloud_states)
+        if index is None or not server_ids:
+            continue
+        server_statuses = cloud_states[index][0]
+
+        observed = get_observed_status(server_ids, server_statuses)
+        if observed is None or observed[0] == lambda_instance.status:
+            continue
+
+        current_status = lambda_instance.status
+        if current_status in RECONCILED_STATUSES or \
+                (current_status in TRANSITIONAL_STATUSES and
+                 lambda_instance.status_sequence < stale_sequence) or \
+                observed[0] == LambdaInstance.DESTROYED:
+            corrections.append((str(lambda_instance.uuid),) + observed)
+    return corrections
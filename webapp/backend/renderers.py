@@ -0,0 +1,31 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Renderer for server-sent events. It only takes part in content negotiation, the views that
+    accept it stream their responses themselves.
+    """
+
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class FileRenderer(BaseRenderer):
+    """
+    Renderer for file downloads. It only takes part in content negotiation, the views that
+    accept it send the files themselves. Errors are rendered as JSON.
+    """
+
+    media_type = 'application/octet-stream'
+    format = 'file'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data)
@@ -0,0 +1,84 @@
+"""
+Cache of the representations of the lambda instances that the API clients poll. Every lambda
+instance has a version in the cache, that the events tasks delete as soon as they update the
+lambda instance. Cached representations are stored under the version they were built for, so
+deleting the version invalidates all of them at once, and the ETag of a representation is
+derived from the version, so a request whose ETag is still valid is answered from the cache
+alone.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+
+def normalize_uuid(instance_uuid):
+    """
+    :returns: The canonical form of a uuid, so that a lambda instance has the same keys, however
+              its uuid is written in a request.
+    """
+    try:
+        return str(uuid.UUID(str(instance_uuid)))
+    except ValueError:
+        return str(instance_uuid)
+
+
+def get_version_key(instance_uuid):
+    return 'lambda-instance:{}:version'.format(normalize_uuid(instance_uuid))
+
+
+def get_representation_key(instance_uuid, representation, version):
+    return 'lambda-instance:{}:{}:{}'.format(normalize_uuid(instance_uuid), representation,
+                                             version)
+
+
+def get_version(instance_uuid):
+    """
+    :param instance_uuid: The uuid of a lambda instance.
+    :returns: The current version of the lambda instance. A new version is created if the
+              lambda instance has been updated since the last request.
+    """
+    version_key = get_version_key(instance_uuid)
+    version = cache.get(version_key)
+    if version is None:
+        # If another request creates a version at the same time, both use the one stored first.
+        cache.add(version_key, uuid.uuid4().hex, settings.LAMBDA_INSTANCE_CACHE_TIMEOUT)
+        version = cache.get(version_key)
+    return version
+
+
+def get_etag(representation, version):
+    return quote_etag('{}-{}'.format(representation, version))
+
+
+def get_representation(instance_uuid, representation, version, build):
+    """
+    :param instance_uuid: The uuid of a lambda instance.
+    :param representation: The name of the representation, e.g. detail or status.
+    :param version: The version of the lambda instance, as returned by get_version.
+    :param build: Callable that builds the representation from the DataBase, if it is not
+                  cached.
+    :returns: The representation.
+    """
+    representation_key = get_representation_key(instance_uuid, representation, version)
+    data = cache.get(representation_key)
+    if data is None:
+        data = build()
+        cache.set(representation_key, data, settings.LAMBDA_INSTANCE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate(instance_uuid):
+    """
+    Invalidates the cached representations of a lambda instance. It should be called after the
+    lambda instance has been updated in the DataBase, so that no representation that is built
+    after the call can be stale.
+    :param instance_uuid: The uuid of the lambda instance.
+    """
+    cache.delete(get_version_key(instance_uuid))
+
+
+def invalidate_many(instance_uuids):
+    cache.delete_many([get_version_key(instance_uuid) for instance_uuid in instance_uuids])
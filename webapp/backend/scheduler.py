@@ -0,0 +1,241 @@
+"""
+Scheduler of the lifecycle operations of lambda instances. The tasks of the operations are sent
+through the scheduler, which records them in a ledger, and every task waits, by retrying, until
+the scheduler lets it run. At most SCHEDULER_MAX_RUNNING tasks run at a time. The queued tasks
+are ordered by priority, destroy before stop before start, and the tasks of the same priority
+by weighted round robin among the projects, and among the users of every project, so that the
+operations of one user cannot delay the operations of everyone else. An operation whose task has
+not started yet is preempted by a destroy of the same lambda instance.
+"""
+
+import json
+import uuid
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScheduledOperation
+
+STARTED = 'started'
+WAITING = 'waiting'
+CANCELLED = 'cancelled'
+
+OPERATIONS = {
+    'destroy': ScheduledOperation.DESTROY,
+    'stop': ScheduledOperation.STOP,
+    'start': ScheduledOperation.START,
+}
+OPERATION_NAMES = {operation: name for name, operation in OPERATIONS.items()}
+
+# The cache key of the positions of the queued operations, that are read by every poll of the
+# status of a lambda instance.
+QUEUE_POSITIONS_KEY = 'scheduler:queue-positions'
+
+# The scheduled operations of a task. A task of many operations has the lowest priority of them.
+Task = namedtuple('Task', ['task_id', 'priority', 'owner_id', 'project_name', 'status', 'id',
+                           'operations'])
+
+
+def get_weight(project_name):
+    """
+    :param project_name: The name of an ~okeanos project.
+    :returns: The weight of the project in SCHEDULER_PROJECT_WEIGHTS.
+    """
+    weights = settings.SCHEDULER_PROJECT_WEIGHTS
+    return weights.get(project_name, weights['default'])
+
+
+def fair_order(queued, in_progress):
+    """
+    Orders the queued work of many users and projects by weighted round robin. Every project gets
+    a share of the turns that is proportional to its weight, and the share of a project is split
+    equally among its users. The work in progress counts as turns that have been taken already.
+    :param queued: The queued work, in the order it was requested. Every item has a project_name
+                   and an owner_id.
+    :param in_progress: The work in progress, with the same attributes.
+    :returns: The queued work, in the order it should run.
+    """
+    users = defaultdict(set)
+    for item in list(queued) + list(in_progress):
+        users[item.project_name].add(item.owner_id)
+    turns = Counter((item.project_name, item.owner_id) for item in in_progress)
+
+    tags = []
+    for item in queued:
+        flow = (item.project_name, item.owner_id)
+        turns[flow] += 1
+        weight = float(get_weight(item.project_name)) / len(users[item.project_name])
+        tags.append(turns[flow] / weight)
+    # The sort is stable, so the work with the same tag runs in the order it was requested.
+    return [item for tag, item in sorted(zip(tags, queued), key=lambda pair: pair[0])]
+
+
+def get_operations():
+    """
+    Locks the ledger, until the end of the transaction, and drops the operations of running tasks
+    that were lost, e.g. with the worker that ran them. The queued tasks keep their operations,
+    since they are retried until they run.
+    :returns: The scheduled operations, ordered by the time they were requested.
+    """
+    operations = list(ScheduledOperation.objects.select_for_update().order_by('id'))
+    expired = timezone.now() - timedelta(seconds=settings.SCHEDULER_OPERATION_TIMEOUT)
+    lost = {operation.id for operation in operations
+            if operation.status == ScheduledOperation.RUNNING and operation.started_at < expired}
+    if lost:
+        ScheduledOperation.objects.filter(id__in=lost).delete()
+        update_queue_positions()
+    return [operation for operation in operations if operation.id not in lost]
+
+
+def get_tasks(operations):
+    """
+    :param operations: The scheduled operations, ordered by the time they were requested.
+    :returns: The tasks of the operations, ordered by the time they were requested.
+    """
+    grouped = defaultdict(list)
+    for operation in operations:
+        grouped[operation.task_id].append(operation)
+
+    tasks = []
+    for task_operations in grouped.values():
+        first = task_operations[0]
+        tasks.append(Task(first.task_id,
+                          max(operation.operation for operation in task_operations),
+                          first.owner_id, first.project_name, first.status, first.id,
+                          {str(operation.instance_uuid): operation.operation
+                           for operation in task_operations}))
+    return sorted(tasks, key=lambda task: task.id)
+
+
+def get_order(tasks):
+    """
+    :param tasks: The scheduled tasks, ordered by the time they were requested.
+    :returns: The queued tasks, in the order they should run.
+    """
+    running = [task for task in tasks if task.status == ScheduledOperation.RUNNING]
+    order = []
+    for priority in sorted(set(task.priority for task in tasks)):
+        order.extend(fair_order([task for task in tasks if task.priority == priority and
+                                 task.status == ScheduledOperation.QUEUED], running))
+    return order
+
+
+def get_project_name(instance_info):
+    """
+    :param instance_info: The instance info of a lambda instance.
+    :returns: The name of the ~okeanos project of the lambda instance, or an empty string if it
+              is not known.
+    """
+    try:
+        return json.loads(instance_info).get('project_name', "")
+    except (TypeError, ValueError, AttributeError):
+        return ""
+
+
+def submit(task, args, operations, owner):
+    """
+    Schedules the operations of a task and sends the task.
+    :param task: The lifecycle task.
+    :param args: The arguments of the task.
+    :param operations: List of (instance_uuid, operation, project_name) tuples, with the name of
+                       every operation, one of start, stop and destroy.
+    :param owner: The user that requested the operations, or None.
+    :returns: The id of the task.
+    """
+    task_id = str(uuid.uuid4())
+    ScheduledOperation.objects.bulk_create([
+        ScheduledOperation(task_id=task_id, instance_uuid=instance_uuid,
+                           operation=OPERATIONS[operation], owner=owner,
+                           project_name=project_name or "")
+        for instance_uuid, operation, project_name in operations])
+    update_queue_positions()
+    task.apply_async(args=args, task_id=task_id)
+    return task_id
+
+
+def acquire(task_id):
+    """
+    Lets a task run, if it is its turn.
+    :param task_id: The id of the task.
+    :returns: STARTED, if the task can run, WAITING, or CANCELLED if all its operations were
+              preempted. Tasks that were not sent through the scheduler are always STARTED.
+    """
+    with transaction.atomic():
+        tasks = get_tasks(get_operations())
+        task = next((other for other in tasks if other.task_id == task_id), None)
+        if task is None or task.status == ScheduledOperation.RUNNING:
+            return STARTED
+        if task.status == ScheduledOperation.CANCELLED:
+            ScheduledOperation.objects.filter(task_id=task_id).delete()
+            update_queue_positions()
+            return CANCELLED
+
+        running = len([other for other in tasks if other.status == ScheduledOperation.RUNNING])
+        if task not in get_order(tasks)[:max(settings.SCHEDULER_MAX_RUNNING - running, 0)]:
+            return WAITING
+        ScheduledOperation.objects.filter(task_id=task_id).\
+            update(status=ScheduledOperation.RUNNING, started_at=timezone.now())
+    update_queue_positions()
+    return STARTED
+
+
+def release(task_id):
+    """
+    Removes a complete task from the ledger.
+    :param task_id: The id of the task.
+    """
+    ScheduledOperation.objects.filter(task_id=task_id).delete()
+    update_queue_positions()
+
+
+def preempt(instance_uuid):
+    """
+    Cancels the queued operation of a lambda instance, if its task has not started yet and it
+    operates only on this lambda instance.
+    :param instance_uuid: The uuid of the lambda instance.
+    :returns: True if an operation was cancelled.
+    """
+    with transaction.atomic():
+        for task in get_tasks(get_operations()):
+            if task.status == ScheduledOperation.QUEUED and \
+                    set(task.operations) == {str(instance_uuid)}:
+                ScheduledOperation.objects.filter(task_id=task.task_id).\
+                    update(status=ScheduledOperation.CANCELLED)
+                break
+        else:
+            return False
+    update_queue_positions()
+    return True
+
+
+def update_queue_positions():
+    """
+    Stores the positions of the queued operations in the cache, after every change of the ledger.
+    :returns: Dictionary with the uuids of the lambda instances as keys, and the names of their
+              queued operations and the positions of their tasks, starting from 1, as values.
+    """
+    positions = {}
+    tasks = get_tasks(ScheduledOperation.objects.order_by('id'))
+    for position, task in enumerate(get_order(tasks), 1):
+        for instance_uuid, operation in task.operations.items():
+            positions[instance_uuid] = {'operation': OPERATION_NAMES[operation],
+                                        'position': position}
+    cache.set(QUEUE_POSITIONS_KEY, positions, None)
+    return positions
+
+
+def get_queue_position(instance_uuid):
+    """
+    :param instance_uuid: The uuid of a lambda instance.
+    :returns: Dictionary with the name of the queued operation of the lambda instance and the
+              position of its task in the queue, or None if the lambda instance has no queued
+              operation.
+    """
+    positions = cache.get(QUEUE_POSITIONS_KEY)
+    if positions is None:
+        positions = update_queue_positions()
+    return positions.get(str(instance_uuid))
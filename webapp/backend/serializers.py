@@ -1,11 +1,20 @@
+import json
+
 from rest_framework import serializers
-from .models import ProjectFile, LambdaInstance, Server, PrivateNetwork
+from .models import ProjectFile, LambdaInstance, Server, PrivateNetwork, AnsibleTaskTiming, \
+    LambdaInstanceEvent, ProjectFileUpload, HDFSTransfer
 
 
 class ProjectFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectFile
-        fields = ('uuid', 'name', 'description')
+        fields = ('uuid', 'name', 'description', 'checksum')
+
+
+class ProjectFileUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectFileUpload
+        fields = ('uuid', 'name', 'description', 'size', 'checksum', 'offset')
 
 
 class ServerSerializer(serializers.ModelSerializer):
@@ -30,7 +39,8 @@ class PrivateNetworkSerializer(serializers.ModelSerializer):
 
 class LambdaInstanceSerializer(serializers.ModelSerializer):
     """
-    A serializer for LambdaInstance objects.
+    A serializer for LambdaInstance objects. The optional argument fields limits the serialized
+    fields to the specified ones.
     """
 
     servers = ServerSerializer(many=True, read_only=True)
@@ -40,3 +50,50 @@ class LambdaInstanceSerializer(serializers.ModelSerializer):
         model = LambdaInstance
         fields = ('id', 'uuid', 'name', 'instance_info', 'status', 'failure_message', 'servers',
                   'private_network')
+        related_fields = ('servers', 'private_network')
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(LambdaInstanceSerializer, self).__init__(*args, **kwargs)
+
+        if fields is not None:
+            for unwanted_field in set(self.fields) - set(fields):
+                self.fields.pop(unwanted_field)
+
+
+class AnsibleTaskTimingSerializer(serializers.ModelSerializer):
+    """
+    A serializer for AnsibleTaskTiming objects.
+    """
+
+    class Meta:
+        model = AnsibleTaskTiming
+        fields = ('playbook', 'task', 'host', 'start_time', 'end_time', 'duration', 'outcome')
+
+
+class LambdaInstanceEventSerializer(serializers.ModelSerializer):
+    """
+    A serializer for LambdaInstanceEvent objects.
+    """
+
+    data = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LambdaInstanceEvent
+        fields = ('id', 'event_type', 'message', 'data', 'timestamp')
+
+    def get_data(self, instance_event):
+        return json.loads(instance_event.data)
+
+
+class HDFSTransferSerializer(serializers.ModelSerializer):
+    """
+    A serializer for HDFSTransfer objects.
+    """
+
+    project_file = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+
+    class Meta:
+        model = HDFSTransfer
+        fields = ('uuid', 'project_file', 'destination', 'size', 'bytes_transferred', 'status',
+                  'failure_message', 'creation_date')
@@ -0,0 +1,75 @@
+import os
+import uuid
+from os import path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import FileBlob
+from .uploads import get_uploads_directory, make_directories
+
+
+def get_blob_path(checksum):
+    """
+    :param checksum: The SHA-256 checksum of the content of a blob.
+    :returns: The path of the blob. Blobs are sharded into directories by the first two bytes of
+              their checksum, so that no directory holds too many files.
+    """
+    return path.join(settings.FILE_STORAGE, 'blobs', checksum[:2], checksum[2:4], checksum)
+
+
+def get_temporary_path():
+    """
+    :returns: A new path for a file that is being written, before its checksum is known. It is
+              on the same file system as the blobs, so that it can be moved to its blob path.
+    """
+    return path.join(get_uploads_directory(), uuid.uuid4().hex)
+
+
+def add_blob(file_path, checksum, size):
+    """
+    Stores a file as a blob. If a blob with the same content already exists, the file is removed
+    and the existing blob gets one more reference, so that every content is stored only once.
+    :param file_path: The path of the file. The file is moved or removed.
+    :param checksum: The SHA-256 checksum of the file.
+    :param size: The size of the file.
+    :returns: The FileBlob of the content.
+    """
+    with transaction.atomic():
+        blob, created = FileBlob.objects.select_for_update().get_or_create(
+            checksum=checksum, defaults={'size': size, 'path': get_blob_path(checksum)})
+        if created:
+            make_directories(path.dirname(blob.path))
+            os.rename(file_path, blob.path)
+        else:
+            FileBlob.objects.filter(id=blob.id).update(references=F('references') + 1)
+            blob.refresh_from_db()
+    if not created:
+        os.remove(file_path)
+    return blob
+
+
+def reference_blob(blob):
+    """
+    Adds a reference to an existing blob, for a file whose content is already stored.
+    :returns: Whether the blob still exists, since it may have just been released.
+    """
+    return FileBlob.objects.filter(id=blob.id, references__gt=0).\
+        update(references=F('references') + 1) == 1
+
+
+def release_blob(blob):
+    """
+    Removes a reference to a blob. The blob is deleted when it is no longer referenced.
+    :param blob: The FileBlob.
+    """
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().get(id=blob.id)
+        blob.references -= 1
+        if blob.references > 0:
+            blob.save(update_fields=['references'])
+            return
+        blob.delete()
+        if path.isfile(blob.path):
+            os.remove(blob.path)
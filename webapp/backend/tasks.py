@@ -1,16 +1,56 @@
+import calendar
 import json
-from celery import shared_task
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+from multiprocessing.pool import ThreadPool
+
+from celery import current_task, shared_task
+from django.conf import settings
+from django.utils import timezone
 
 from kamaki.clients import ClientError
 
 from fokia import utils
+from fokia.activity import ActivityProbe
+from fokia.lifecycle import BulkLifecycle, get_cloud_state
+from fokia.webhdfs import WebHDFSClient, WebHDFSError
 
-from .models import LambdaInstance
+from .models import LambdaInstance, LambdaInstanceEvent, HDFSTransfer, LambdaInstanceActivity, \
+    ProjectFileUpload
 from fokia import lambda_instance_manager
-from . import events
+from . import events, reconciliation, idle, admission, scheduler, uploads
+# The metrics module is imported for its signal handlers, that record the durations of the tasks
+# and the calls to the ~okeanos API.
+from . import metrics  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+def scheduled(run):
+    """
+    Runs a lifecycle task when the scheduler lets it. Until then the task is retried every
+    SCHEDULER_RETRY_INTERVAL seconds, and if its operations are preempted it does nothing.
+    """
+
+    @wraps(run)
+    def run_when_scheduled(*args, **kwargs):
+        task = current_task
+        decision = scheduler.acquire(task.request.id)
+        if decision == scheduler.WAITING:
+            raise task.retry(countdown=settings.SCHEDULER_RETRY_INTERVAL, max_retries=None)
+        if decision == scheduler.CANCELLED:
+            return None
+        try:
+            return run(*args, **kwargs)
+        finally:
+            scheduler.release(task.request.id)
+    return run_when_scheduled
 
 
 @shared_task
+@scheduled
 def lambda_instance_start(instance_uuid, auth_url, auth_token, master_id, slave_ids):
     """
     Starts the VMs of a lambda instance using kamaki. Starting the master node will cause the lambda
@@ -34,6 +74,7 @@ def lambda_instance_start(instance_uuid, auth_url, auth_token, master_id, slave_
 
 
 @shared_task
+@scheduled
 def lambda_instance_stop(instance_uuid, auth_url, auth_token, master_id, slave_ids):
     """
     Stops the VMs of a lambda instance using kamaki. Stopping the master node will cause the lambda
@@ -58,6 +99,7 @@ def lambda_instance_stop(instance_uuid, auth_url, auth_token, master_id, slave_i
 
 
 @shared_task
+@scheduled
 def lambda_instance_destroy(instance_uuid, auth_url, auth_token, master_id, slave_ids,
                             public_ip_id, private_network_id):
     """
@@ -86,6 +128,189 @@ def lambda_instance_destroy(instance_uuid, auth_url, auth_token, master_id, slav
                                                 exception.message)
 
 
+# The status of a lambda instance after every bulk lifecycle operation.
+BULK_OPERATION_STATUSES = {
+    'start': LambdaInstance.STARTED,
+    'stop': LambdaInstance.STOPPED,
+    'destroy': LambdaInstance.DESTROYED,
+}
+
+
+@shared_task
+@scheduled
+def lambda_instances_bulk_operation(operations, auth_url, auth_token):
+    """
+    Starts, stops or destroys many lambda instances of the same user with one job, that shares the
+    kamaki clients and polls the statuses of all the VMs together. The status of every lambda
+    instance is updated as soon as its own operation is complete.
+    :param operations: A list of dictionaries, each one containing the uuid, the operation, the
+                       master_id, the slave_ids and, for destroy, the public_ip_id and the
+                       private_network_id of a lambda instance.
+    :param auth_url: The authentication url for ~okeanos API.
+    :param auth_token: The authentication token of the owner of the lambda instances.
+    :returns: Dictionary with the failure message, or None, of every lambda instance.
+    """
+
+    operation_names = {operation['uuid']: operation['operation'] for operation in operations}
+    results = {}
+
+    def listener(instance_uuid, failure_message):
+        results[instance_uuid] = failure_message
+        if failure_message:
+            events.set_lambda_instance_status.delay(instance_uuid, LambdaInstance.FAILED,
+                                                    failure_message)
+        else:
+            events.set_lambda_instance_status.delay(
+                instance_uuid, BULK_OPERATION_STATUSES[operation_names[instance_uuid]])
+
+    try:
+        bulk_lifecycle = BulkLifecycle(auth_url, auth_token,
+                                       parallelism=settings.LIFECYCLE_BULK_PARALLELISM,
+                                       poll_interval=settings.LIFECYCLE_BULK_POLL_INTERVAL,
+                                       max_wait=settings.LIFECYCLE_BULK_MAX_WAIT)
+        bulk_lifecycle.run(operations, listener=listener)
+    except ClientError as exception:
+        # The lambda instances that were not complete when ~okeanos failed, fail as well.
+        for instance_uuid in set(operation_names) - set(results):
+            listener(instance_uuid, exception.message)
+    return results
+
+
+@shared_task
+def reconcile_lambda_instances():
+    """
+    Corrects the statuses of the lambda instances that differ from the state of their VMs on
+    ~okeanos. The VMs and the networks of every account in RECONCILIATION_AUTH_TOKENS are listed
+    with a fixed number of requests, so a run costs a few requests per account, no matter how
+    many VMs there are. The corrections are sent as status updates with the time of the
+    listings, so that they are ignored for any lambda instance updated after them.
+    """
+
+    auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
+    listing_sequence = int(time.time() * 1000000)
+    deleted_since = (timezone.now() -
+                     timedelta(seconds=settings.RECONCILIATION_DELETED_WINDOW)).\
+        strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    cloud_states = []
+    for auth_token in settings.RECONCILIATION_AUTH_TOKENS:
+        try:
+            cloud_states.append(get_cloud_state(auth_url, auth_token, deleted_since))
+        except ClientError as exception:
+            logger.warning("Could not list the VMs of an account: %s", exception.message)
+    if not cloud_states:
+        return []
+
+    lambda_instances = LambdaInstance.objects.exclude(status=LambdaInstance.DESTROYED).\
+        only('uuid', 'status', 'status_sequence').prefetch_related('servers', 'private_network')
+    stale_sequence = listing_sequence - settings.RECONCILIATION_STALE_AFTER * 1000000
+    corrections = reconciliation.get_corrections(lambda_instances, cloud_states, stale_sequence)
+
+    for instance_uuid, status, failure_message in corrections:
+        events.set_lambda_instance_status.delay(instance_uuid, status, failure_message,
+                                                sequence=listing_sequence)
+    return corrections
+
+
+@shared_task
+def detect_idle_lambda_instances():
+    """
+    Samples the activity of the services of every started lambda instance, concurrently, and
+    stops the lambda instances that have been idle for longer than the idle policy of their
+    project allows. The owners are notified with an idle event some time before their lambda
+    instances are stopped. The lambda instances are stopped with the token of the account in
+    RECONCILIATION_AUTH_TOKENS that owns them.
+    """
+
+    lambda_instances = [lambda_instance for lambda_instance in
+                        LambdaInstance.objects.filter(status=LambdaInstance.STARTED).
+                        select_related('activity').prefetch_related('servers', 'private_network')
+                        if any(server.pub_ip for server in lambda_instance.servers.all())]
+    if not lambda_instances:
+        return {}
+
+    def sample(lambda_instance):
+        master = [server for server in lambda_instance.servers.all() if server.pub_ip][0]
+        return ActivityProbe(master.pub_ip, timeout=settings.IDLE_DETECTION_TIMEOUT).sample()
+
+    pool = ThreadPool(min(settings.IDLE_DETECTION_PARALLELISM, len(lambda_instances)))
+    try:
+        samples = pool.map(sample, lambda_instances)
+    finally:
+        pool.close()
+        pool.join()
+
+    now = timezone.now()
+    activities = []
+    idle_lambda_instances = []
+    actions = {}
+    for lambda_instance, activity_sample in zip(lambda_instances, samples):
+        try:
+            activity = lambda_instance.activity
+        except LambdaInstanceActivity.DoesNotExist:
+            activity = None
+        fields, action, idle_seconds = idle.evaluate(lambda_instance, activity, activity_sample,
+                                                     now)
+        instance_uuid = str(lambda_instance.uuid)
+        activities.append(dict(fields, instance_uuid=instance_uuid,
+                               sampled_at=calendar.timegm(fields['sampled_at'].utctimetuple()),
+                               last_active=calendar.timegm(
+                                   fields['last_active'].utctimetuple())))
+
+        idle_hours = int(idle_seconds // 3600)
+        if action == idle.NOTIFY:
+            policy = idle.get_idle_policy(lambda_instance)
+            stop_at = fields['last_active'] + timedelta(seconds=policy['idle_after'])
+            publish_event(instance_uuid, LambdaInstanceEvent.IDLE,
+                          "The lambda instance has been idle for {} hours and will be stopped "
+                          "at {}".format(idle_hours, stop_at.isoformat()),
+                          {'action': idle.NOTIFY, 'idle_since': fields['last_active'].isoformat(),
+                           'stop_at': stop_at.isoformat()})
+        elif action == idle.STOP:
+            idle_lambda_instances.append((lambda_instance, fields['last_active'], idle_hours))
+        if action:
+            actions[instance_uuid] = action
+
+    events.update_lambda_instance_activities.delay(activities)
+
+    if idle_lambda_instances:
+        auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
+        accounts = []
+        for auth_token in settings.RECONCILIATION_AUTH_TOKENS:
+            try:
+                accounts.append((auth_token, get_cloud_state(auth_url, auth_token)))
+            except ClientError as exception:
+                logger.warning("Could not list the VMs of an account: %s", exception.message)
+
+        for lambda_instance, idle_since, idle_hours in idle_lambda_instances:
+            instance_uuid = str(lambda_instance.uuid)
+            index = reconciliation.find_account(lambda_instance,
+                                                [cloud_state for _, cloud_state in accounts])
+            if index is None:
+                logger.warning("No account owns the idle lambda instance %s", instance_uuid)
+                actions.pop(instance_uuid)
+                continue
+
+            master_id = None
+            slave_ids = []
+            for server in lambda_instance.servers.all():
+                if server.pub_ip:
+                    master_id = server.id
+                else:
+                    slave_ids.append(server.id)
+            scheduler.submit(lambda_instance_stop,
+                             (instance_uuid, auth_url, accounts[index][0], master_id, slave_ids),
+                             [(instance_uuid, 'stop',
+                               scheduler.get_project_name(lambda_instance.instance_info))],
+                             None)
+            events.set_lambda_instance_status.delay(instance_uuid, LambdaInstance.STOPPING)
+            publish_event(instance_uuid, LambdaInstanceEvent.IDLE,
+                          "The lambda instance is being stopped, since it has been idle for "
+                          "{} hours".format(idle_hours),
+                          {'action': idle.STOP, 'idle_since': idle_since.isoformat()})
+    return actions
+
+
 @shared_task
 def create_lambda_instance(auth_token=None, instance_name='Lambda Instance',
                            master_name='lambda-master',
@@ -102,8 +327,59 @@ def create_lambda_instance(auth_token=None, instance_name='Lambda Instance',
     specs = json.dumps(specs_dict)
 
     instance_uuid = create_lambda_instance.request.id
-    events.create_new_lambda_instance.delay(instance_uuid=instance_uuid,
-                                            instance_name=instance_name, specs=specs)
+    first_attempt = create_lambda_instance.request.retries == 0
+    if first_attempt:
+        events.create_new_lambda_instance.delay(instance_uuid=instance_uuid,
+                                                instance_name=instance_name, specs=specs)
+
+    # The build waits for its admission by retrying the task, so that the token of the owner is
+    # only kept in the message of the task.
+    auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
+    try:
+        decision, message = admission.admit(
+            instance_uuid, lambda: utils.get_available_quotas(auth_url, auth_token, project_name))
+    except ClientError as exception:
+        decision, message = admission.REJECTED, exception.message
+    if decision == admission.WAITING:
+        if first_attempt:
+            publish_event(instance_uuid, LambdaInstanceEvent.PROVISIONING, message)
+        raise create_lambda_instance.retry(countdown=settings.ADMISSION_RETRY_INTERVAL,
+                                           max_retries=None)
+
+    try:
+        if decision == admission.REJECTED:
+            events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
+                                                    status=LambdaInstance.CLUSTER_FAILED,
+                                                    failure_message=message)
+            return
+
+        build_lambda_instance(instance_uuid, auth_token, specs_dict)
+    finally:
+        admission.release(instance_uuid)
+
+
+def build_lambda_instance(instance_uuid, auth_token, specs_dict):
+    """
+    Creates the VMs of an admitted lambda instance and installs the lambda services on them.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param auth_token: The authentication token of the owner of the lambda instance.
+    :param specs_dict: The specifications of the lambda instance.
+    """
+
+    def provisioning_listener(message):
+        publish_event(instance_uuid, LambdaInstanceEvent.PROVISIONING, message)
+
+    master_name = specs_dict['master_name']
+    slaves = specs_dict['slaves']
+    vcpus_master = specs_dict['vcpus_master']
+    vcpus_slave = specs_dict['vcpus_slave']
+    ram_master = specs_dict['ram_master']
+    ram_slave = specs_dict['ram_slave']
+    disk_master = specs_dict['disk_master']
+    disk_slave = specs_dict['disk_slave']
+    ip_allocation = specs_dict['ip_allocation']
+    network_request = specs_dict['network_request']
+    project_name = specs_dict['project_name']
 
     try:
         ansible_manager, provisioner_response = \
@@ -118,13 +394,16 @@ def create_lambda_instance(auth_token=None, instance_name='Lambda Instance',
                                                    disk_slave=disk_slave,
                                                    ip_allocation=ip_allocation,
                                                    network_request=network_request,
-                                                   project_name=project_name)
+                                                   project_name=project_name,
+                                                   listener=provisioning_listener)
     except ClientError as exception:
         events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
                                                 status=LambdaInstance.CLUSTER_FAILED,
                                                 failure_message=exception.message)
         return
 
+    # The VMs exist now, so their resources are counted in the quota of the project.
+    admission.mark_provisioned(instance_uuid)
     events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
                                             status=LambdaInstance.CLUSTER_CREATED)
 
@@ -132,60 +411,120 @@ def create_lambda_instance(auth_token=None, instance_name='Lambda Instance',
                                      specs=specs_dict,
                                      provisioner_response=provisioner_response)
 
-    ansible_result = lambda_instance_manager.run_playbook(ansible_manager, 'initialize.yml')
-    check = check_ansible_result(ansible_result)
-    if check != 'Ansible successful':
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.INIT_FAILED,
-                                                failure_message=check)
+    publish_event(instance_uuid, LambdaInstanceEvent.PROVISIONING,
+                  "SSH readiness of the VMs probed",
+                  data={'ssh_latencies': provisioner_response['ssh_latencies']})
+    # The playbooks would fail on the nodes that are not reachable. The build can be resumed
+    # from the first stage once they are.
+    unreachable = lambda_instance_manager.get_unreachable_nodes(provisioner_response)
+    if unreachable:
+        ansible_manager.cleanup()
+        events.set_lambda_instance_status.delay(
+            instance_uuid=instance_uuid, status=LambdaInstance.INIT_FAILED,
+            failure_message="VMs not reachable over SSH: " + ", ".join(unreachable))
         return
-    else:
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.INIT_DONE)
 
-    ansible_result = lambda_instance_manager.run_playbook(ansible_manager, 'common-install.yml')
-    check = check_ansible_result(ansible_result)
-    if check != 'Ansible successful':
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.COMMONS_FAILED,
-                                                failure_message=check)
-        return
-    else:
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.COMMONS_INSTALLED)
+    run_playbook_stages(instance_uuid, ansible_manager)
 
-    ansible_result = lambda_instance_manager.run_playbook(ansible_manager, 'hadoop-install.yml')
-    check = check_ansible_result(ansible_result)
-    if check != 'Ansible successful':
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.HADOOP_FAILED,
-                                                failure_message=check)
-        return
-    else:
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.HADOOP_INSTALLED)
 
-    ansible_result = lambda_instance_manager.run_playbook(ansible_manager, 'kafka-install.yml')
-    check = check_ansible_result(ansible_result)
-    if check != 'Ansible successful':
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.KAFKA_FAILED,
-                                                failure_message=check)
-        return
-    else:
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.KAFKA_INSTALLED)
+@shared_task
+def lambda_instance_resume(instance_uuid, provisioner_response, first_stage):
+    """
+    Resumes the build of a lambda instance whose installation failed, by running the playbooks
+    starting from the stage that failed. The VMs of the lambda instance are not recreated.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param provisioner_response: A dictionary with the ids and the private ips of the master and
+                                 the slave nodes, the cidr of the subnet and the private key of
+                                 the lambda instance, in the format of the cluster creator
+                                 response.
+    :param first_stage: The index in PLAYBOOK_STAGES of the stage to start from.
+    """
 
-    ansible_result = lambda_instance_manager.run_playbook(ansible_manager, 'flink-install.yml')
-    check = check_ansible_result(ansible_result)
-    if check != 'Ansible successful':
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.FLINK_FAILED,
-                                                failure_message=check)
-        return
+    ansible_manager = lambda_instance_manager.create_ansible_manager(provisioner_response)
+    run_playbook_stages(instance_uuid, ansible_manager, first_stage)
+
+
+@shared_task
+@scheduled
+def lambda_instance_pause(instance_uuid, provisioner_response):
+    """
+    Pauses a lambda instance by stopping its lambda services, Hadoop, Kafka and Flink, while its
+    VMs keep running, so that the lambda instance can be unpaused in seconds.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param provisioner_response: A dictionary with the ids and the private ips of the master and
+                                 the slave nodes, the cidr of the subnet and the private key of
+                                 the lambda instance, in the format of the cluster creator
+                                 response.
+    """
+
+    run_services_playbook(instance_uuid, provisioner_response, 'services-stop.yml',
+                          LambdaInstance.PAUSED)
+
+
+@shared_task
+@scheduled
+def lambda_instance_unpause(instance_uuid, provisioner_response):
+    """
+    Unpauses a paused lambda instance by starting its lambda services again.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param provisioner_response: A dictionary with the ids and the private ips of the master and
+                                 the slave nodes, the cidr of the subnet and the private key of
+                                 the lambda instance, in the format of the cluster creator
+                                 response.
+    """
+
+    run_services_playbook(instance_uuid, provisioner_response, 'services-start.yml',
+                          LambdaInstance.STARTED)
+
+
+@shared_task
+def push_file_to_hdfs(transfer_uuid, file_path, size, master_host, destination):
+    """
+    Streams an uploaded file into the HDFS of a lambda instance, through HttpFS on its master.
+    The file is sent in parallel parts, straight from the disk, and the progress of the transfer
+    is stored every few seconds.
+    :param transfer_uuid: The uuid of the transfer.
+    :param file_path: The path of the uploaded file.
+    :param size: The size of the file.
+    :param master_host: The public ip of the master of the lambda instance.
+    :param destination: The HDFS path to transfer the file to.
+    """
+
+    progress = {'reported': time.time()}
+
+    def listener(bytes_transferred):
+        if time.time() - progress['reported'] >= settings.HDFS_TRANSFER_PROGRESS_INTERVAL:
+            progress['reported'] = time.time()
+            events.update_hdfs_transfer.delay(transfer_uuid, HDFSTransfer.RUNNING,
+                                              bytes_transferred)
+
+    events.update_hdfs_transfer.delay(transfer_uuid, HDFSTransfer.RUNNING, 0)
+    client = WebHDFSClient(master_host, port=settings.HDFS_TRANSFER_PORT,
+                           user=settings.HDFS_TRANSFER_USER,
+                           block_size=settings.HDFS_TRANSFER_BLOCK_SIZE)
+    try:
+        client.upload(file_path, destination, size,
+                      parallelism=settings.HDFS_TRANSFER_PARALLELISM, listener=listener)
+    except (WebHDFSError, IOError) as exception:
+        events.update_hdfs_transfer.delay(transfer_uuid, HDFSTransfer.FAILED, 0,
+                                          failure_message=str(exception))
     else:
-        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
-                                                status=LambdaInstance.FLINK_INSTALLED)
+        events.update_hdfs_transfer.delay(transfer_uuid, HDFSTransfer.COMPLETED, size)
+
+
+@shared_task
+def remove_expired_uploads():
+    """
+    Removes the chunked uploads that have not been updated for UPLOAD_EXPIRATION seconds, along
+    with their partial files.
+    :returns: The number of removed uploads.
+    """
+
+    expired = ProjectFileUpload.objects.filter(update_date__lt=uploads.get_expiration_date())
+    for upload in expired:
+        uploads.remove_partial_file(upload.uuid)
+        upload.delete()
+    return len(expired)
 
 
 def on_failure(exc, task_id, args, kwargs, einfo):
@@ -197,6 +536,124 @@ def on_failure(exc, task_id, args, kwargs, einfo):
 setattr(create_lambda_instance, 'on_failure', on_failure)
 
 
+def on_lifecycle_failure(exc, task_id, args, kwargs, einfo):
+    events.set_lambda_instance_status.delay(instance_uuid=args[0],
+                                            status=LambdaInstance.FAILED,
+                                            failure_message=exc.message)
+
+
+setattr(lambda_instance_resume, 'on_failure', on_lifecycle_failure)
+setattr(lambda_instance_pause, 'on_failure', on_lifecycle_failure)
+setattr(lambda_instance_unpause, 'on_failure', on_lifecycle_failure)
+
+# The playbooks that install the lambda services, in the order they are run, along with the
+# statuses of the lambda instance when each one of them succeeds or fails.
+PLAYBOOK_STAGES = (
+    ('initialize.yml', LambdaInstance.INIT_DONE, LambdaInstance.INIT_FAILED),
+    ('common-install.yml', LambdaInstance.COMMONS_INSTALLED, LambdaInstance.COMMONS_FAILED),
+    ('hadoop-install.yml', LambdaInstance.HADOOP_INSTALLED, LambdaInstance.HADOOP_FAILED),
+    ('kafka-install.yml', LambdaInstance.KAFKA_INSTALLED, LambdaInstance.KAFKA_FAILED),
+    ('flink-install.yml', LambdaInstance.FLINK_INSTALLED, LambdaInstance.FLINK_FAILED),
+)
+
+
+def run_playbook_stages(instance_uuid, ansible_manager, first_stage=0):
+    """
+    Runs the playbooks of PLAYBOOK_STAGES on a lambda instance, starting from the specified
+    stage, and updates the status of the lambda instance after each one of them. The playbooks
+    stop at the first stage that fails.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param ansible_manager: The ansible manager of the lambda instance.
+    :param first_stage: The index in PLAYBOOK_STAGES of the stage to start from.
+    :return: True if all the stages succeeded, False otherwise.
+    """
+
+    try:
+        for playbook, success_status, failure_status in PLAYBOOK_STAGES[first_stage:]:
+            ansible_result = run_playbook(instance_uuid, ansible_manager, playbook)
+            check = check_ansible_result(ansible_result)
+            if check != 'Ansible successful':
+                events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
+                                                        status=failure_status,
+                                                        failure_message=check)
+                return False
+            else:
+                events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
+                                                        status=success_status)
+    finally:
+        ansible_manager.cleanup()
+
+    return True
+
+
+def run_services_playbook(instance_uuid, provisioner_response, playbook, success_status):
+    """
+    Runs a playbook that stops or starts the lambda services of a lambda instance and updates the
+    status of the lambda instance. The lambda instance fails if the playbook fails.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param provisioner_response: The cluster creator response of the lambda instance.
+    :param playbook: The name of the playbook to run.
+    :param success_status: The status of the lambda instance when the playbook succeeds.
+    """
+
+    ansible_manager = lambda_instance_manager.create_ansible_manager(provisioner_response)
+    try:
+        check = check_ansible_result(run_playbook(instance_uuid, ansible_manager, playbook))
+    finally:
+        ansible_manager.cleanup()
+
+    if check != 'Ansible successful':
+        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
+                                                status=LambdaInstance.FAILED,
+                                                failure_message=check)
+    else:
+        events.set_lambda_instance_status.delay(instance_uuid=instance_uuid,
+                                                status=success_status)
+
+
+def run_playbook(instance_uuid, ansible_manager, playbook):
+    """
+    Runs a playbook on a lambda instance and creates an event to store the timings of its tasks.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param ansible_manager: The ansible manager of the lambda instance.
+    :param playbook: The name of the playbook to run.
+    :return: The result of the playbook.
+    """
+
+    def task_listener(task_timings):
+        hosts = {}
+        for task_timing in task_timings:
+            hosts[task_timing['host']] = task_timing['outcome']
+        publish_event(instance_uuid, LambdaInstanceEvent.TASK, task_timings[0]['task'],
+                      {'playbook': task_timings[0]['playbook'],
+                       'hosts': hosts,
+                       'duration': max([task_timing['end'] for task_timing in task_timings]) -
+                       task_timings[0]['start']})
+
+    try:
+        return lambda_instance_manager.run_playbook(ansible_manager, playbook,
+                                                    task_listener=task_listener)
+    finally:
+        if ansible_manager.task_timings:
+            events.insert_ansible_task_timings.delay(instance_uuid=instance_uuid,
+                                                     task_timings=ansible_manager.task_timings)
+
+
+def publish_event(instance_uuid, event_type, message, data=None):
+    """
+    Creates an event to publish a progress event of a lambda instance to the API clients.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param event_type: The type of the event. For more information see models.py.
+    :param message: A human readable description of the event.
+    :param data: Optional dictionary with additional information about the event.
+    """
+
+    events.publish_lambda_instance_events.delay(
+        instance_uuid=instance_uuid,
+        instance_events=[{'event_type': event_type, 'message': message, 'data': data or {},
+                          'timestamp': time.time()}])
+
+
 def check_ansible_result(ansible_result):
     for _, value in ansible_result.iteritems():
         if value['unreachable'] != 0:
@@ -0,0 +1,179 @@
+import errno
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+from os import path
+
+from django.conf import settings
+from django.utils import timezone
+
+# Number of bytes read from a request or a file at a time, so that the memory used by an upload
+# does not depend on the size of the file.
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """
+    An upload or a chunk of an upload was rejected. status is the HTTP status code of the
+    response.
+    """
+
+    def __init__(self, message, status=400):
+        super(UploadError, self).__init__(message)
+        self.status = status
+
+
+def make_directories(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+
+def get_uploads_directory():
+    """
+    :returns: The directory where the partial files of the uploads in progress are kept.
+    """
+    uploads_directory = path.join(settings.FILE_STORAGE, '.uploads')
+    if not path.exists(uploads_directory):
+        make_directories(uploads_directory)
+    return uploads_directory
+
+
+def get_partial_file_path(upload_uuid):
+    """
+    :param upload_uuid: The uuid of an upload.
+    :returns: The path of the partial file of the upload.
+    """
+    return path.join(get_uploads_directory(), str(upload_uuid))
+
+
+def remove_partial_file(upload_uuid):
+    """
+    :param upload_uuid: The uuid of an upload.
+    """
+    partial_file_path = get_partial_file_path(upload_uuid)
+    if path.isfile(partial_file_path):
+        os.remove(partial_file_path)
+
+
+def get_expiration_date():
+    """
+    :returns: The time before which the uploads that have not been updated are abandoned.
+    """
+    return timezone.now() - timedelta(seconds=settings.UPLOAD_EXPIRATION)
+
+
+def get_file_name(name):
+    """
+    :param name: The name of a file, as given by a user.
+    :returns: The name without any directories, so that files are only stored in FILE_STORAGE.
+    """
+    file_name = path.basename(name or '')
+    if file_name in ('', '.', '..'):
+        raise UploadError("Bad file name")
+    return file_name
+
+
+def copy_stream(source, destination, length, checksum):
+    """
+    Copies a number of bytes from a stream to a file, updating a checksum with them.
+    :param source: The stream to read from.
+    :param destination: The file to write to.
+    :param length: The number of bytes to copy.
+    :param checksum: A hashlib object.
+    :returns: The number of bytes copied, which is less than length if the stream ended early.
+    """
+    copied = 0
+    while copied < length:
+        block = source.read(min(BLOCK_SIZE, length - copied))
+        if not block:
+            break
+        destination.write(block)
+        checksum.update(block)
+        copied += len(block)
+    return copied
+
+
+def write_file(uploaded_file, file_path):
+    """
+    Writes an uploaded file to disk, one chunk at a time.
+    :param uploaded_file: A django UploadedFile.
+    :param file_path: The path to write the file to.
+    :returns: The SHA-256 checksum of the file.
+    """
+    checksum = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for chunk in uploaded_file.chunks(BLOCK_SIZE):
+            f.write(chunk)
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_file_checksum(file_path):
+    """
+    :param file_path: The path of a file.
+    :returns: The SHA-256 checksum of the file, read one block at a time.
+    """
+    checksum = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+@contextmanager
+def lock_partial_file(partial_file_path):
+    """
+    Opens and locks the partial file of an upload, so that concurrent requests for the same
+    upload are rejected instead of interleaving their chunks.
+    :param partial_file_path: The path of the partial file.
+    """
+    try:
+        f = open(partial_file_path, 'r+b')
+    except IOError:
+        raise UploadError("Upload not found", status=404)
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            raise UploadError("Another chunk of the upload is being uploaded", status=409)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_chunk(partial_file, offset, stream, length, chunk_checksum):
+    """
+    Writes a chunk to the locked partial file of an upload. Bytes that were written past the
+    offset by an interrupted request are discarded before the chunk is written, and the chunk is
+    discarded if its checksum does not match.
+    :param partial_file: The partial file, as returned by lock_partial_file.
+    :param offset: The number of bytes of the upload that have been received and verified.
+    :param stream: The stream to read the chunk from.
+    :param length: The length of the chunk.
+    :param chunk_checksum: The expected SHA-256 checksum of the chunk.
+    """
+    partial_file.truncate(offset)
+    partial_file.seek(offset)
+    checksum = hashlib.sha256()
+    copied = copy_stream(stream, partial_file, length, checksum)
+    if copied != length or checksum.hexdigest() != chunk_checksum.lower():
+        partial_file.truncate(offset)
+        raise UploadError("Chunk checksum mismatch")
+    partial_file.flush()
+    os.fsync(partial_file.fileno())
+
+
+def verify_file(partial_file_path, file_checksum):
+    """
+    Verifies the checksum of a completely uploaded file.
+    :param partial_file_path: The path of the partial file.
+    :param file_checksum: The expected SHA-256 checksum of the whole file.
+    """
+    if get_file_checksum(partial_file_path) != file_checksum.lower():
+        raise UploadError("File checksum mismatch")
@@ -9,11 +9,18 @@ from . import views
 # added later to all urls.
 lambda_instances_router = DefaultRouter()
 lambda_instances_router.register(r'lambda-instances', views.LambdaInstanceViewSet)
+lambda_instances_router.register(r'task-timings', views.AnsibleTaskTimingViewSet)
+lambda_instances_router.register(r'status-transitions',
+                                 views.LambdaInstanceStatusTransitionViewSet)
 lambda_instances_router.include_format_suffixes = False
 
 urlpatterns = [
     url(r'^authenticate/?$', views.authenticate),
     url(r'^user_files/?$', views.ProjectFileList.as_view()),
+    url(r'^user_files/uploads/?$', views.ProjectFileUploadList.as_view()),
+    url(r'^user_files/(?P<file_uuid>[^/.]+)/download/?$', views.ProjectFileDownload.as_view()),
+    url(r'^user_files/uploads/(?P<upload_uuid>[^/.]+)/?$',
+        views.ProjectFileUploadDetail.as_view()),
     url(r'^create_lambda_instance/?$', views.CreateLambdaInstance.as_view(),
         name='create_lambda_instance'),
     url(r'^', include(lambda_instances_router.urls))
@@ -1,28 +1,44 @@
 import json
+import math
+import time
 import uuid
+from datetime import timedelta
 
-from os import path, mkdir, remove
+from os import path, remove
 
 from django.conf import settings
-from django.http import JsonResponse
+from django.db.models import Avg, Count, Max, Sum
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, \
+    StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework_xml.renderers import XMLRenderer
 
 from fokia.utils import check_auth_token
 
-from . import tasks, events
-from .models import ProjectFile, LambdaInstance
-from .serializers import ProjectFileSerializer, LambdaInstanceSerializer
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from . import tasks, events, event_notifications, uploads, downloads, storage, response_cache, \
+    metrics, admission, scheduler
+from .models import ProjectFile, LambdaInstance, AnsibleTaskTiming, LambdaInstanceEvent, \
+    LambdaInstanceStatusTransition, ProjectFileUpload, HDFSTransfer
+from .serializers import ProjectFileSerializer, LambdaInstanceSerializer, \
+    AnsibleTaskTimingSerializer, LambdaInstanceEventSerializer, ProjectFileUploadSerializer, \
+    HDFSTransferSerializer
 from .authenticate_user import KamakiTokenAuthentication
+from .renderers import EventStreamRenderer, FileRenderer
+from .pagination import paginate_by_cursor, BadPaginationParameter
 
 
 def authenticate(request):
@@ -43,6 +59,100 @@ def authenticate(request):
         return JsonResponse({"errors": [error_info]}, status=401)
 
 
+def export_metrics(request):
+    """
+    Exports the metrics of the service in the Prometheus text format, to the addresses of
+    METRICS_ALLOWED_ADDRESSES.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_ADDRESSES:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.export(), content_type=CONTENT_TYPE_LATEST)
+
+
+def get_provisioner_response(lambda_instance):
+    """
+    Creates a dictionary, in the format of the cluster creator response, with the information
+    of an existing lambda instance that is needed to run ansible playbooks on it.
+    :param lambda_instance: The lambda instance.
+    """
+
+    master = None
+    slaves = []
+    for server in lambda_instance.servers.order_by('id'):
+        node = {'id': server.id, 'internal_ip': server.priv_ip,
+                'vcpus': server.cpus, 'ram': server.ram, 'disk': server.disk}
+        if server.pub_ip:
+            master = node
+        else:
+            slaves.append(node)
+
+    private_network = lambda_instance.private_network.all()[0]
+
+    return {'nodes': {'master': master, 'slaves': slaves},
+            'subnet': {'cidr': private_network.subnet, 'gateway_ip': private_network.gateway},
+            'vpn': {'id': private_network.id},
+            'pk': lambda_instance.private_key}
+
+
+def stream_events(instance_uuid, instance_events, cursor, waiting):
+    """
+    Generates the server-sent events stream of the events after the cursor, until
+    LAMBDA_INSTANCE_EVENTS_STREAM_DURATION seconds have passed. A stream that could not get a
+    waiting slot only sends the events published so far, and the client reconnects after
+    LAMBDA_INSTANCE_EVENTS_BUSY_RETRY seconds.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param instance_events: A queryset of the events of the lambda instance, ordered by id.
+    :param cursor: The id of the last event the client has received.
+    :param waiting: Whether the stream holds a waiting slot, which is released when it ends.
+    """
+
+    try:
+        if waiting:
+            retry = settings.LAMBDA_INSTANCE_EVENTS_POLL_INTERVAL
+            deadline = time.time() + settings.LAMBDA_INSTANCE_EVENTS_STREAM_DURATION
+        else:
+            retry = settings.LAMBDA_INSTANCE_EVENTS_BUSY_RETRY
+            deadline = time.time()
+
+        yield "retry: {}\n\n".format(int(retry * 1000))
+        while True:
+            new_events = event_notifications.wait_for_events(
+                instance_uuid, instance_events, cursor,
+                min(deadline, time.time() + settings.LAMBDA_INSTANCE_EVENTS_KEEP_ALIVE_INTERVAL))
+            for instance_event in new_events:
+                data = JSONRenderer().render(LambdaInstanceEventSerializer(instance_event).data)
+                yield "id: {}\nevent: {}\ndata: {}\n\n".format(instance_event.id,
+                                                                 instance_event.event_type, data)
+                cursor = instance_event.id
+
+            if time.time() >= deadline:
+                break
+            if not new_events:
+                # Comment lines keep the connection alive and detect disconnected clients.
+                yield ": keep-alive\n\n"
+    finally:
+        if waiting:
+            event_notifications.release_waiting_slot()
+
+
+def name_exists(user, name):
+    """
+    :returns: Whether a user already has a file, or an upload in progress, with a name. The names
+              of abandoned uploads are not reserved.
+    """
+    return ProjectFile.objects.filter(owner=user, name=name).exists() or \
+        get_uploads(user).filter(name=name).exists()
+
+
+def get_uploads(user):
+    """
+    :returns: The uploads in progress of a user, without the abandoned ones, that are removed by
+              the remove_expired_uploads task.
+    """
+    return ProjectFileUpload.objects.filter(owner=user,
+                                            update_date__gte=uploads.get_expiration_date())
+
+
 class ProjectFileList(APIView):
     """
     List uploaded files, upload a file to the users folder.
@@ -54,34 +164,43 @@ class ProjectFileList(APIView):
 
     def get(self, request, format=None):
         files = ProjectFile.objects.filter(owner=request.user)
+        if 'cursor' not in request.query_params:
+            file_serializer = ProjectFileSerializer(files, many=True)
+            return Response(file_serializer.data, status=200, content_type=format)
+
+        try:
+            files, pagination = paginate_by_cursor(files, request.query_params)
+        except BadPaginationParameter as exception:
+            return Response({"errors": [{"message": exception.message}]}, status=400)
         file_serializer = ProjectFileSerializer(files, many=True)
-        return Response(file_serializer.data, status=200, content_type=format)
+        return Response(dict(pagination, results=file_serializer.data), status=200,
+                        content_type=format)
 
     def put(self, request, format=None):
         uploaded_file = request.FILES.get('file')
         if not uploaded_file:
             return Response({"errors": [{"message": "No file uploaded", "code": 422}]}, status=422)
         description = request.data.get('description', '')
-        new_file_path = path.join(settings.FILE_STORAGE, uploaded_file.name)
-
-        if not path.exists(settings.FILE_STORAGE):
-            mkdir(settings.FILE_STORAGE)
 
-        if ProjectFile.objects.filter(name=uploaded_file.name).count() > 0:
+        if name_exists(request.user, uploaded_file.name):
             return Response({"errors": [{"message": "File name already exists"}]}, status=400)
 
-        with open(new_file_path, 'wb+') as f:
-            f.write(uploaded_file.read())
-        if path.isfile(new_file_path):
-
-            # TODO: Change this to an event call that updates the db
-            file_uuid = uuid.uuid4()
-            ProjectFile.objects.create(name=uploaded_file.name,
-                                       path=new_file_path,
-                                       description=description,
-                                       owner=request.user,
-                                       uuid=file_uuid)
-            return Response({"result": "success"}, status=201)
+        # The file is written one chunk at a time, so that it is never held in memory, and its
+        # checksum is computed while it is written. Files with the same content share a blob.
+        temporary_path = storage.get_temporary_path()
+        checksum = uploads.write_file(uploaded_file, temporary_path)
+        blob = storage.add_blob(temporary_path, checksum, uploaded_file.size)
+
+        # TODO: Change this to an event call that updates the db
+        file_uuid = uuid.uuid4()
+        ProjectFile.objects.create(name=uploaded_file.name,
+                                   path=blob.path,
+                                   description=description,
+                                   owner=request.user,
+                                   uuid=file_uuid,
+                                   checksum=checksum,
+                                   blob=blob)
+        return Response({"result": "success"}, status=201)
 
     def delete(self, request, format=None):
         file_uuid = request.data.get('uuid')
@@ -98,11 +217,191 @@ class ProjectFileList(APIView):
             return Response({"errors": [{"message": "file does not exist"}]},
                             status=400)
         # TODO: Change this to an event call that update the db
-        if path.isfile(file_data.path):
-            remove(file_data.path)
         file_data.delete()
+        if file_data.blob_id:
+            storage.release_blob(file_data.blob)
+        elif path.isfile(file_data.path):
+            remove(file_data.path)
+        return Response({"result": "success"}, status=200)
+
+
+class ProjectFileDownload(APIView):
+    """
+    Download an uploaded file. Byte ranges and conditional requests are supported, so that
+    interrupted downloads can be resumed and unchanged files are not downloaded again.
+    """
+
+    authentication_classes = KamakiTokenAuthentication,
+    permission_classes = IsAuthenticated,
+    renderer_classes = JSONRenderer, XMLRenderer, BrowsableAPIRenderer, FileRenderer
+
+    def get(self, request, file_uuid, format=None):
+        project_file = get_object_or_404(ProjectFile, uuid=file_uuid, owner=request.user)
+        if not path.isfile(project_file.path):
+            return Response({"errors": [{"message": "file does not exist"}]}, status=404)
+        return downloads.build_file_response(request, project_file)
+
+
+class ProjectFileUploadList(APIView):
+    """
+    Start a chunked upload of a file to the users folder. Large files are uploaded in chunks,
+    each one in its own request, so that an interrupted upload can be resumed.
+    """
+
+    authentication_classes = KamakiTokenAuthentication,
+    permission_classes = IsAuthenticated,
+    renderer_classes = JSONRenderer, XMLRenderer, BrowsableAPIRenderer
+
+    def post(self, request, format=None):
+        try:
+            name = uploads.get_file_name(request.data.get('name'))
+            size = int(request.data.get('size'))
+        except uploads.UploadError as exception:
+            return Response({"errors": [{"message": exception.message}]}, status=400)
+        except (TypeError, ValueError):
+            return Response({"errors": [{"message": "Bad parameter"}]}, status=400)
+        checksum = request.data.get('checksum', '').lower()
+        if size <= 0 or len(checksum) != 64:
+            return Response({"errors": [{"message": "Bad parameter"}]}, status=400)
+
+        if name_exists(request.user, name):
+            return Response({"errors": [{"message": "File name already exists"}]}, status=400)
+
+        # If the user already has a file with the same content, the upload is completed without
+        # receiving the content again. Files of other users are not taken into account, so that
+        # their content can not be obtained by just knowing its checksum.
+        owned_file = ProjectFile.objects.filter(owner=request.user, checksum=checksum,
+                                                blob__size=size).select_related('blob').first()
+        if owned_file is not None and storage.reference_blob(owned_file.blob):
+            project_file = ProjectFile.objects.create(
+                name=name, path=owned_file.blob.path,
+                description=request.data.get('description', ''), owner=request.user,
+                checksum=checksum, blob=owned_file.blob)
+            return Response(ProjectFileSerializer(project_file).data, status=200)
+
+        upload = ProjectFileUpload.objects.create(
+            name=name, description=request.data.get('description', ''), owner=request.user,
+            size=size, checksum=checksum)
+        open(uploads.get_partial_file_path(upload.uuid), 'wb').close()
+
+        upload_data = ProjectFileUploadSerializer(upload).data
+        upload_data['max_chunk_size'] = settings.UPLOAD_MAX_CHUNK_SIZE
+        return Response(upload_data, status=201)
+
+
+class ProjectFileUploadDetail(APIView):
+    """
+    Get the offset an upload should be resumed from, upload a chunk of a file, or cancel an
+    upload.
+    """
+
+    authentication_classes = KamakiTokenAuthentication,
+    permission_classes = IsAuthenticated,
+    renderer_classes = JSONRenderer, XMLRenderer, BrowsableAPIRenderer
+
+    def get(self, request, upload_uuid, format=None):
+        upload = get_object_or_404(get_uploads(request.user), uuid=upload_uuid)
+        return Response(ProjectFileUploadSerializer(upload).data, status=200)
+
+    def put(self, request, upload_uuid, format=None):
+        upload = get_object_or_404(get_uploads(request.user), uuid=upload_uuid)
+        try:
+            offset = int(request.META.get('HTTP_UPLOAD_OFFSET'))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (TypeError, ValueError):
+            return Response({"errors": [{"message": "Bad parameter"}]}, status=400)
+        chunk_checksum = request.META.get('HTTP_CHUNK_CHECKSUM', '')
+        if length <= 0 or length > settings.UPLOAD_MAX_CHUNK_SIZE or \
+                offset + length > upload.size or len(chunk_checksum) != 64:
+            return Response({"errors": [{"message": "Bad parameter"}]}, status=400)
+
+        # The chunk is streamed from the request to the partial file. The offset is read again
+        # while the partial file is locked, since another request may have just advanced it.
+        try:
+            partial_file_path = uploads.get_partial_file_path(upload.uuid)
+            with uploads.lock_partial_file(partial_file_path) as partial_file:
+                upload.refresh_from_db()
+                if offset != upload.offset:
+                    raise uploads.UploadError("Offset mismatch, expected {}".
+                                              format(upload.offset), status=409)
+                uploads.write_chunk(partial_file, offset, request.stream, length,
+                                    chunk_checksum)
+                upload.offset = offset + length
+                upload.save(update_fields=['offset', 'update_date'])
+        except uploads.UploadError as exception:
+            return Response({"errors": [{"message": exception.message}],
+                             "offset": upload.offset}, status=exception.status)
+
+        if upload.offset < upload.size:
+            return Response(ProjectFileUploadSerializer(upload).data, status=200)
+
+        # The whole file has been received. An upload whose file does not match its checksum
+        # can not be resumed, so it is removed.
+        try:
+            uploads.verify_file(partial_file_path, upload.checksum)
+        except uploads.UploadError as exception:
+            self.remove_upload(upload)
+            return Response({"errors": [{"message": exception.message}]},
+                            status=exception.status)
+
+        blob = storage.add_blob(partial_file_path, upload.checksum, upload.size)
+        project_file = ProjectFile.objects.create(name=upload.name, path=blob.path,
+                                                  description=upload.description,
+                                                  owner=request.user, checksum=upload.checksum,
+                                                  blob=blob)
+        upload.delete()
+        return Response(ProjectFileSerializer(project_file).data, status=201)
+
+    def delete(self, request, upload_uuid, format=None):
+        upload = get_object_or_404(get_uploads(request.user), uuid=upload_uuid)
+        self.remove_upload(upload)
         return Response({"result": "success"}, status=200)
 
+    def remove_upload(self, upload):
+        uploads.remove_partial_file(upload.uuid)
+        upload.delete()
+
+
+def get_cached_response(request, instance_uuid, representation, build):
+    """
+    Responds with a representation of a lambda instance from the cache, building it only if the
+    lambda instance has been updated since it was cached. A request whose If-None-Match header
+    matches the current ETag of the representation is answered with "304 Not Modified".
+    :param request: The request.
+    :param instance_uuid: The uuid of the lambda instance.
+    :param representation: The name of the representation.
+    :param build: Callable that builds the representation from the DataBase.
+    """
+    version = response_cache.get_version(instance_uuid)
+    etag = response_cache.get_etag(representation, version)
+    # parse_etags returns the tags unquoted before Django 1.11 and quoted since then.
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in etags or etag.strip('"') in etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(response_cache.get_representation(instance_uuid, representation,
+                                                              version, build),
+                            status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    # Clients have to revalidate their copy on every request.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# The statuses of a lambda instance in which its HDFS is running.
+HDFS_AVAILABLE_STATUSES = (LambdaInstance.STARTED, LambdaInstance.HADOOP_INSTALLED,
+                           LambdaInstance.KAFKA_INSTALLED, LambdaInstance.FLINK_INSTALLED)
+
+# The statuses that a lambda instance can be in, for every bulk lifecycle operation, and the
+# status it gets while the operation is in progress.
+BULK_OPERATIONS = {
+    'start': ((LambdaInstance.STOPPED, LambdaInstance.FAILED), LambdaInstance.STARTING),
+    'stop': ((LambdaInstance.STARTED, LambdaInstance.PAUSED, LambdaInstance.FAILED),
+             LambdaInstance.STOPPING),
+    'destroy': ((LambdaInstance.STARTED, LambdaInstance.STOPPED, LambdaInstance.PAUSED,
+                 LambdaInstance.FAILED), LambdaInstance.DESTROYING),
+}
+
 
 class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
 
@@ -115,8 +414,33 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
     lookup_field = 'uuid'
 
     def list(self, request, format=None):
+        # Only the requested fields are retrieved from the database. Related objects are
+        # prefetched with one query for each relation, no matter how many lambda instances are
+        # listed.
+        wanted_fields = request.query_params.get('fields', 'id,uuid,name').split(',')
+        unknown_fields = set(wanted_fields) - set(LambdaInstanceSerializer.Meta.fields)
+        if unknown_fields:
+            return Response({"errors": [{"message": "Unknown fields: " +
+                                         ", ".join(sorted(unknown_fields))}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        related_fields = [field for field in wanted_fields
+                          if field in LambdaInstanceSerializer.Meta.related_fields]
+        column_fields = set(wanted_fields) - set(related_fields) | {'id'}
+        lambda_instances = self.queryset.order_by('id').only(*column_fields).\
+            prefetch_related(*related_fields)
+
         # Calculate pagination parameters and use them to retrieve the requested lambda instances.
-        if 'limit' in request.query_params and 'page' in request.query_params:
+        # Pages are retrieved either by a cursor or by a page number.
+        pagination = None
+        if 'cursor' in request.query_params:
+            try:
+                lambda_instances, pagination = paginate_by_cursor(lambda_instances,
+                                                                  request.query_params)
+            except BadPaginationParameter as exception:
+                return Response({"errors": [{"message": exception.message}]},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif 'limit' in request.query_params and 'page' in request.query_params:
             try:
                 limit = int(request.query_params.get("limit"))
                 page = int(request.query_params.get("page"))
@@ -131,55 +455,177 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
             else:
                 first_to_retrieve = (page - 1) * limit
                 last_to_retrieve = page * limit
-                serializer = LambdaInstanceSerializer(
-                    self.queryset[first_to_retrieve:last_to_retrieve], many=True)
+                lambda_instances = lambda_instances[first_to_retrieve:last_to_retrieve]
         elif 'limit' in request.query_params or 'page' in request.query_params:
                 return Response({"errors": [{"message": "Missing parameter"}]},
                                 status=status.HTTP_400_BAD_REQUEST)
-        else:
-                serializer = LambdaInstanceSerializer(self.queryset, many=True)
 
-        wanted_fields = ['id', 'uuid', 'name']
-        unwanted_fields = set(LambdaInstanceSerializer.Meta.fields) - set(wanted_fields)
+        serializer = LambdaInstanceSerializer(lambda_instances, many=True, fields=wanted_fields)
 
-        lambda_instances_list = []
-        # Remove unwanted fields from lambda instances information.
-        for lambda_instance in serializer.data:
-            for unwanted_field in unwanted_fields:
-                del lambda_instance[unwanted_field]
-            lambda_instances_list.append(lambda_instance)
+        lambda_instances_list = serializer.data
+        # Parse the instance info field.
+        if 'instance_info' in wanted_fields:
+            for lambda_instance in lambda_instances_list:
+                lambda_instance['instance_info'] = json.loads(lambda_instance['instance_info'])
 
+        if pagination is not None:
+            return Response(dict(pagination, results=lambda_instances_list),
+                            status=status.HTTP_200_OK)
         return Response(lambda_instances_list, status=status.HTTP_200_OK)
 
     def retrieve(self, request, uuid, format=None):
-        serializer = LambdaInstanceSerializer(get_object_or_404(self.queryset, uuid=uuid))
+        def build_detail():
+            serializer = LambdaInstanceSerializer(get_object_or_404(self.queryset, uuid=uuid))
 
-        wanted_fields = ['id', 'uuid', 'name', 'instance_info']
-        unwanted_fields = set(LambdaInstanceSerializer.Meta.fields) - set(wanted_fields)
+            wanted_fields = ['id', 'uuid', 'name', 'instance_info']
+            unwanted_fields = set(LambdaInstanceSerializer.Meta.fields) - set(wanted_fields)
 
-        lambda_instance = serializer.data
-        # Remove unwanted fields from lambda instance information.
-        for unwanted_field in unwanted_fields:
-            del lambda_instance[unwanted_field]
+            lambda_instance = dict(serializer.data)
+            # Remove unwanted fields from lambda instance information.
+            for unwanted_field in unwanted_fields:
+                del lambda_instance[unwanted_field]
 
-        # Parse the instance info field.
-        lambda_instance['instance_info'] = json.loads(lambda_instance['instance_info'])
+            # Parse the instance info field.
+            lambda_instance['instance_info'] = json.loads(lambda_instance['instance_info'])
+            return lambda_instance
 
-        return Response(lambda_instance, status=status.HTTP_200_OK)
+        return get_cached_response(request, uuid, 'detail', build_detail)
 
     @detail_route(methods=['get'])
     def status(self, request, uuid, format=None):
-        serializer = LambdaInstanceSerializer(get_object_or_404(self.queryset, uuid=uuid))
+        def build_status():
+            serializer = LambdaInstanceSerializer(get_object_or_404(self.queryset, uuid=uuid))
 
-        wanted_fields = ['id', 'uuid', 'name', 'status', 'failure_message']
-        unwanted_fields = set(LambdaInstanceSerializer.Meta.fields) - set(wanted_fields)
+            wanted_fields = ['id', 'uuid', 'name', 'status', 'failure_message']
+            unwanted_fields = set(LambdaInstanceSerializer.Meta.fields) - set(wanted_fields)
 
-        lambda_instance = serializer.data
-        # Remove unwanted fields from lambda instance information.
-        for unwanted_field in unwanted_fields:
-            del lambda_instance[unwanted_field]
+            lambda_instance = dict(serializer.data)
+            # Remove unwanted fields from lambda instance information.
+            for unwanted_field in unwanted_fields:
+                del lambda_instance[unwanted_field]
+            return lambda_instance
+
+        # The position of a queued operation changes without the lambda instance being updated,
+        # so the status of a lambda instance with a queued operation is not cached.
+        instance_uuid = response_cache.normalize_uuid(uuid)
+        queue = scheduler.get_queue_position(instance_uuid) or \
+            admission.get_queue_position(instance_uuid)
+        if queue is not None:
+            response = Response(dict(build_status(), queue=queue), status=status.HTTP_200_OK)
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return get_cached_response(request, uuid, 'status', build_status)
+
+    @detail_route(methods=['get'], url_path='task-timings')
+    def task_timings(self, request, uuid, format=None):
+        lambda_instance = get_object_or_404(self.queryset, uuid=uuid)
+
+        task_timings = AnsibleTaskTiming.objects.filter(lambda_instance=lambda_instance).\
+            order_by('start_time', 'host')
+        serializer = AnsibleTaskTimingSerializer(task_timings, many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @detail_route(methods=['get', 'post'], url_path='hdfs-transfers')
+    def hdfs_transfers(self, request, uuid, format=None):
+        lambda_instance = get_object_or_404(self.queryset, uuid=uuid)
+
+        if request.method == 'GET':
+            transfers = lambda_instance.hdfs_transfers.select_related('project_file').\
+                order_by('id')
+            serializer = HDFSTransferSerializer(transfers, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        if lambda_instance.status not in HDFS_AVAILABLE_STATUSES:
+            return Response({"detail": "Cannot transfer files to lambda instance while current "
+                                       "status is " + lambda_instance.status},
+                            status=status.HTTP_400_BAD_REQUEST)
+        master = lambda_instance.servers.filter(pub_ip__isnull=False).first()
+        if master is None:
+            return Response({"detail": "The specified lambda instance has no master"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            project_file = ProjectFile.objects.get(uuid=request.data.get('file'),
+                                                   owner=request.user)
+        except (ProjectFile.DoesNotExist, ValueError):
+            project_file = None
+        if project_file is None or not path.isfile(project_file.path):
+            return Response({"errors": [{"message": "file does not exist"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        destination = request.data.get('destination') or \
+            '/user/{}/{}'.format(settings.HDFS_TRANSFER_USER, project_file.name)
+        if not destination.startswith('/'):
+            return Response({"errors": [{"message": "The destination must be an absolute path"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        transfer = HDFSTransfer.objects.create(lambda_instance=lambda_instance,
+                                               project_file=project_file,
+                                               destination=destination,
+                                               size=path.getsize(project_file.path))
+        tasks.push_file_to_hdfs.delay(str(transfer.uuid), project_file.path, transfer.size,
+                                      master.pub_ip, destination)
+
+        return Response(HDFSTransferSerializer(transfer).data, status=status.HTTP_202_ACCEPTED)
+
+    @detail_route(methods=['get'], url_path='events',
+                  renderer_classes=(JSONRenderer, XMLRenderer, BrowsableAPIRenderer,
+                                    EventStreamRenderer))
+    def instance_events(self, request, uuid, format=None):
+        # The cursor is the id of the last event the client has received. Server-sent events
+        # clients send it through the Last-Event-ID header when they reconnect.
+        try:
+            cursor = int(request.query_params.get(
+                'cursor', request.META.get('HTTP_LAST_EVENT_ID', 0)))
+            timeout = float(request.query_params.get(
+                'timeout', settings.LAMBDA_INSTANCE_EVENTS_TIMEOUT))
+        except (TypeError, ValueError):
+            return Response({"errors": [{"message": "Bad parameter"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if cursor < 0 or timeout < 0:
+            return Response({"errors": [{"message": "Negative parameters not supported"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(lambda_instance, status=status.HTTP_200_OK)
+        # Events may be published before the entry of the lambda instance is created.
+        instance_events = LambdaInstanceEvent.objects.filter(instance_uuid=uuid).order_by('id')
+        if not instance_events.exists():
+            get_object_or_404(self.queryset, uuid=uuid)
+
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            response = StreamingHttpResponse(
+                stream_events(uuid, instance_events, cursor,
+                              event_notifications.acquire_waiting_slot()),
+                content_type=EventStreamRenderer.media_type)
+            response['Cache-Control'] = 'no-cache'
+            # Stop nginx from buffering the stream.
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        # Long-poll until new events are published or the timeout expires. If too many requests
+        # are waiting already, the request is answered without waiting.
+        timeout = min(timeout, settings.LAMBDA_INSTANCE_EVENTS_TIMEOUT)
+        waiting = timeout > 0 and event_notifications.acquire_waiting_slot()
+        try:
+            new_events = event_notifications.wait_for_events(
+                uuid, instance_events, cursor, time.time() + (timeout if waiting else 0))
+        finally:
+            if waiting:
+                event_notifications.release_waiting_slot()
+
+        if not new_events and timeout > 0 and not waiting:
+            response = Response({"errors": [{"message": "Too many clients are waiting for "
+                                                        "events, retry later"}]},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(settings.LAMBDA_INSTANCE_EVENTS_BUSY_RETRY)
+            return response
+
+        if new_events:
+            cursor = new_events[-1].id
+        serializer = LambdaInstanceEventSerializer(new_events, many=True)
+
+        return Response({"events": serializer.data, "cursor": str(cursor)},
+                        status=status.HTTP_200_OK)
 
     @detail_route(methods=['post'])
     def start(self, request, uuid, format=None):
@@ -211,8 +657,11 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
         auth_token = request.META.get("HTTP_AUTHORIZATION").split()[-1]
         auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
 
-        tasks.lambda_instance_start.delay(data['uuid'], auth_url, auth_token, master_id,
-                                          slave_ids)
+        scheduler.submit(tasks.lambda_instance_start,
+                         (data['uuid'], auth_url, auth_token, master_id, slave_ids),
+                         [(data['uuid'], 'start',
+                           scheduler.get_project_name(data['instance_info']))],
+                         request.user)
 
         # Create event to update the database.
         events.set_lambda_instance_status.delay(data['uuid'], LambdaInstance.STARTING)
@@ -229,7 +678,8 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({"detail": "The specified lambda instance is already stopped"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        if data['status'] != LambdaInstance.STARTED and data['status'] != LambdaInstance.FAILED:
+        if data['status'] not in (LambdaInstance.STARTED, LambdaInstance.PAUSED,
+                                  LambdaInstance.FAILED):
             return Response({"detail": "Cannot stop lambda instance while current status " +
                              "is " + data['status']},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -249,14 +699,106 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
         auth_token = request.META.get("HTTP_AUTHORIZATION").split()[-1]
         auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
 
-        tasks.lambda_instance_stop.delay(data['uuid'], auth_url, auth_token, master_id,
-                                         slave_ids)
+        scheduler.submit(tasks.lambda_instance_stop,
+                         (data['uuid'], auth_url, auth_token, master_id, slave_ids),
+                         [(data['uuid'], 'stop',
+                           scheduler.get_project_name(data['instance_info']))],
+                         request.user)
 
         # Create event to update the database.
         events.set_lambda_instance_status.delay(data['uuid'], LambdaInstance.STOPPING)
 
         return Response({"result": "Accepted"}, status=status.HTTP_202_ACCEPTED)
 
+    @detail_route(methods=['post'])
+    def pause(self, request, uuid, format=None):
+        lambda_instance = get_object_or_404(self.queryset, uuid=uuid)
+
+        # Check the current status of the lambda instance.
+        if lambda_instance.status == LambdaInstance.PAUSED:
+            return Response({"detail": "The specified lambda instance is already paused"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if lambda_instance.status != LambdaInstance.STARTED:
+            return Response({"detail": "Cannot pause lambda instance while current status " +
+                             "is " + lambda_instance.status},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not lambda_instance.private_key:
+            return Response({"detail": "The specified lambda instance cannot be paused"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Create task to stop the lambda services, while the VMs keep running. It is scheduled
+        # with the priority of a stop.
+        scheduler.submit(tasks.lambda_instance_pause,
+                         (str(lambda_instance.uuid), get_provisioner_response(lambda_instance)),
+                         [(str(lambda_instance.uuid), 'stop',
+                           scheduler.get_project_name(lambda_instance.instance_info))],
+                         request.user)
+
+        # Create event to update the database.
+        events.set_lambda_instance_status.delay(str(lambda_instance.uuid),
+                                                LambdaInstance.PAUSING)
+
+        return Response({"result": "Accepted"}, status=status.HTTP_202_ACCEPTED)
+
+    @detail_route(methods=['post'])
+    def unpause(self, request, uuid, format=None):
+        lambda_instance = get_object_or_404(self.queryset, uuid=uuid)
+
+        # Check the current status of the lambda instance.
+        if lambda_instance.status != LambdaInstance.PAUSED:
+            return Response({"detail": "Cannot unpause lambda instance while current status " +
+                             "is " + lambda_instance.status},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Create task to start the lambda services again. It is scheduled with the priority of a
+        # start.
+        scheduler.submit(tasks.lambda_instance_unpause,
+                         (str(lambda_instance.uuid), get_provisioner_response(lambda_instance)),
+                         [(str(lambda_instance.uuid), 'start',
+                           scheduler.get_project_name(lambda_instance.instance_info))],
+                         request.user)
+
+        # Create event to update the database.
+        events.set_lambda_instance_status.delay(str(lambda_instance.uuid),
+                                                LambdaInstance.UNPAUSING)
+
+        return Response({"result": "Accepted"}, status=status.HTTP_202_ACCEPTED)
+
+    @detail_route(methods=['post'])
+    def resume(self, request, uuid, format=None):
+        lambda_instance = get_object_or_404(self.queryset, uuid=uuid)
+
+        # Find the stage of the build that failed.
+        failed_stages = [stage for stage, (_, _, failure_status) in
+                         enumerate(tasks.PLAYBOOK_STAGES)
+                         if failure_status == lambda_instance.status]
+        if not failed_stages:
+            return Response({"detail": "Cannot resume lambda instance while current status " +
+                             "is " + lambda_instance.status},
+                            status=status.HTTP_400_BAD_REQUEST)
+        first_stage = failed_stages[0]
+
+        if not lambda_instance.private_key:
+            return Response({"detail": "The specified lambda instance cannot be resumed"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Create task to resume the build of the lambda instance.
+        tasks.lambda_instance_resume.delay(str(lambda_instance.uuid),
+                                           get_provisioner_response(lambda_instance),
+                                           first_stage)
+
+        # Create event to update the database. The lambda instance returns to the status it had
+        # before the failed stage started.
+        if first_stage > 0:
+            resumed_status = tasks.PLAYBOOK_STAGES[first_stage - 1][1]
+        else:
+            resumed_status = LambdaInstance.CLUSTER_CREATED
+        events.set_lambda_instance_status.delay(str(lambda_instance.uuid), resumed_status)
+
+        return Response({"result": "Accepted"}, status=status.HTTP_202_ACCEPTED)
+
     def destroy(self, request, uuid, format=None):
         serializer = LambdaInstanceSerializer(get_object_or_404(self.queryset, uuid=uuid))
         data = serializer.data
@@ -266,8 +808,13 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({"detail": "The specified lambda instance is already destroyed"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        if data['status'] != LambdaInstance.STARTED and \
+        # A start or a stop whose task has not started yet is preempted by the destroy.
+        preempted = data['status'] in (LambdaInstance.STARTING, LambdaInstance.STOPPING) and \
+            scheduler.preempt(data['uuid'])
+        if not preempted and \
+            data['status'] != LambdaInstance.STARTED and \
             data['status'] != LambdaInstance.STOPPED and \
+            data['status'] != LambdaInstance.PAUSED and \
                 data['status'] != LambdaInstance.FAILED:
             return Response({"detail": "Cannot destroy lambda instance while current status " +
                              "is " + data['status']},
@@ -290,15 +837,271 @@ class LambdaInstanceViewSet(viewsets.ReadOnlyModelViewSet):
         auth_token = request.META.get("HTTP_AUTHORIZATION").split()[-1]
         auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
 
-        tasks.lambda_instance_destroy.delay(data['uuid'], auth_url, auth_token, master_id,
-                                            slave_ids, public_ip_id,
-                                            data['private_network'][0]['id'])
+        scheduler.submit(tasks.lambda_instance_destroy,
+                         (data['uuid'], auth_url, auth_token, master_id, slave_ids, public_ip_id,
+                          data['private_network'][0]['id']),
+                         [(data['uuid'], 'destroy',
+                           scheduler.get_project_name(data['instance_info']))],
+                         request.user)
 
         # Create event to update the database.
         events.set_lambda_instance_status.delay(data['uuid'], LambdaInstance.DESTROYING)
 
         return Response({"result": "Accepted"}, status=status.HTTP_202_ACCEPTED)
 
+    @list_route(methods=['post'])
+    def bulk(self, request, format=None):
+        """
+        Starts, stops or destroys many lambda instances with one request. The statuses of all the
+        lambda instances are checked with one query, and the accepted operations are run by a
+        single task. The result of the check of every operation is reported separately.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations or \
+                not all(isinstance(operation, dict) for operation in operations):
+            return Response({"errors": [{"message": "A list of operations is required"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > settings.LIFECYCLE_BULK_MAX_INSTANCES:
+            return Response({"errors": [{"message": "At most {} operations are allowed".
+                                        format(settings.LIFECYCLE_BULK_MAX_INSTANCES)}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        instance_uuids = set()
+        for operation in operations:
+            try:
+                instance_uuids.add(uuid.UUID(str(operation.get('uuid'))))
+            except ValueError:
+                pass
+        lambda_instances = {str(lambda_instance.uuid): lambda_instance for lambda_instance in
+                            self.queryset.filter(uuid__in=instance_uuids).
+                            prefetch_related('servers', 'private_network')}
+
+        results = []
+        accepted_operations = []
+        accepted_uuids = set()
+        for operation in operations:
+            instance_uuid = response_cache.normalize_uuid(operation.get('uuid'))
+            operation_name = operation.get('operation')
+            error = None
+            lambda_instance = lambda_instances.get(instance_uuid)
+            if operation_name not in BULK_OPERATIONS:
+                error = "Unknown operation: {}".format(operation_name)
+            elif lambda_instance is None:
+                error = "Lambda instance not found"
+            elif instance_uuid in accepted_uuids:
+                error = "Only one operation is allowed for every lambda instance"
+            elif lambda_instance.status not in BULK_OPERATIONS[operation_name][0]:
+                error = "Cannot {} lambda instance while current status is {}".\
+                    format(operation_name, lambda_instance.status)
+
+            if error:
+                results.append({"uuid": instance_uuid, "operation": operation_name,
+                                "errors": [{"message": error}]})
+                continue
+
+            # Get the id of the master node, the ids of the slave nodes and, for destroy, the ids
+            # of the public ip and of the private network.
+            accepted_operation = {'uuid': instance_uuid, 'operation': operation_name,
+                                  'master_id': None, 'slave_ids': []}
+            for server in lambda_instance.servers.all():
+                if server.pub_ip:
+                    accepted_operation['master_id'] = server.id
+                    accepted_operation['public_ip_id'] = server.pub_ip_id
+                else:
+                    accepted_operation['slave_ids'].append(server.id)
+            private_networks = lambda_instance.private_network.all()
+            accepted_operation['private_network_id'] = \
+                private_networks[0].id if private_networks else None
+            accepted_operations.append(accepted_operation)
+            accepted_uuids.add(instance_uuid)
+            results.append({"uuid": instance_uuid, "operation": operation_name,
+                            "result": "Accepted"})
+
+        if accepted_operations:
+            # Create one task for all the accepted operations.
+            auth_token = request.META.get("HTTP_AUTHORIZATION").split()[-1]
+            auth_url = "https://accounts.okeanos.grnet.gr/identity/v2.0"
+
+            scheduled_operations = [
+                (scheduled['uuid'], scheduled['operation'],
+                 scheduler.get_project_name(lambda_instances[scheduled['uuid']].instance_info))
+                for scheduled in accepted_operations]
+            scheduler.submit(tasks.lambda_instances_bulk_operation,
+                             (accepted_operations, auth_url, auth_token), scheduled_operations,
+                             request.user)
+
+            # Create events to update the database.
+            for accepted_operation in accepted_operations:
+                events.set_lambda_instance_status.delay(
+                    accepted_operation['uuid'],
+                    BULK_OPERATIONS[accepted_operation['operation']][1])
+
+        return Response({"results": results},
+                        status=status.HTTP_202_ACCEPTED if accepted_operations
+                        else status.HTTP_400_BAD_REQUEST)
+
+
+class AnsibleTaskTimingViewSet(viewsets.GenericViewSet):
+    """
+    Queries the timings of the ansible tasks run while building lambda instances, to find the
+    tasks and the hosts that dominate the build time.
+    """
+
+    authentication_classes = KamakiTokenAuthentication,
+    permission_classes = IsAuthenticated,
+    queryset = AnsibleTaskTiming.objects.all()
+
+    def get_limit(self, request):
+        limit = int(request.query_params.get("limit", 10))
+        if limit <= 0:
+            raise ValueError("Zero or negative limit not supported")
+        return limit
+
+    def filter_task_timings(self, request):
+        task_timings = self.queryset
+        if 'playbook' in request.query_params:
+            task_timings = task_timings.filter(playbook=request.query_params.get('playbook'))
+        return task_timings
+
+    @list_route(methods=['get'], url_path='slowest-tasks')
+    def slowest_tasks(self, request, format=None):
+        try:
+            limit = self.get_limit(request)
+        except (TypeError, ValueError):
+            return Response({"errors": [{"message": "Bad parameter"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        slowest_tasks = self.filter_task_timings(request).values('playbook', 'task').annotate(
+            average_duration=Avg('duration'), max_duration=Max('duration'),
+            builds=Count('lambda_instance', distinct=True)).order_by('-average_duration')[:limit]
+
+        return Response(list(slowest_tasks), status=status.HTTP_200_OK)
+
+    @list_route(methods=['get'], url_path='slowest-hosts')
+    def slowest_hosts(self, request, format=None):
+        try:
+            limit = self.get_limit(request)
+        except (TypeError, ValueError):
+            return Response({"errors": [{"message": "Bad parameter"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        slowest_hosts = self.filter_task_timings(request).values(
+            'lambda_instance__uuid', 'host').annotate(
+            total_duration=Sum('duration'), max_duration=Max('duration'),
+            tasks=Count('id')).order_by('-total_duration')[:limit]
+
+        hosts_list = []
+        for host in slowest_hosts:
+            host['lambda_instance'] = host.pop('lambda_instance__uuid')
+            hosts_list.append(host)
+
+        return Response(hosts_list, status=status.HTTP_200_OK)
+
+
+# The stages of the build of a lambda instance, along with the statuses of the lambda instance
+# when each one of them starts and ends.
+BUILD_STAGES = (
+    ('cluster', LambdaInstance.PENDING, LambdaInstance.CLUSTER_CREATED),
+    ('init', LambdaInstance.CLUSTER_CREATED, LambdaInstance.INIT_DONE),
+    ('commons', LambdaInstance.INIT_DONE, LambdaInstance.COMMONS_INSTALLED),
+    ('hadoop', LambdaInstance.COMMONS_INSTALLED, LambdaInstance.HADOOP_INSTALLED),
+    ('kafka', LambdaInstance.HADOOP_INSTALLED, LambdaInstance.KAFKA_INSTALLED),
+    ('flink', LambdaInstance.KAFKA_INSTALLED, LambdaInstance.FLINK_INSTALLED),
+)
+
+STAGE_DURATION_PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, percent):
+    """
+    Calculates a percentile of a list of values, using the nearest-rank method.
+    :param values: A sorted list of values.
+    :param percent: The percentile to calculate, from 0 to 100.
+    """
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def get_stage_durations(status_transitions, since, until):
+    """
+    Calculates the durations of the build stages of lambda instances. A stage lasts from the
+    last time a lambda instance entered its start status until it entered its end status, so
+    that a stage that was resumed after a failure is measured from its last attempt.
+    :param status_transitions: The status transitions of the lambda instances, ordered by
+                               lambda instance and timestamp.
+    :param since: Only the stages that ended at or after this time are taken into account.
+    :param until: Only the stages that ended before this time are taken into account.
+    :returns: A dictionary with the names of the stages as keys and lists of durations in
+              seconds as values.
+    """
+    stage_durations = {stage: [] for stage, _, _ in BUILD_STAGES}
+    started = {}
+    current_instance = None
+    for status_transition in status_transitions:
+        if status_transition.instance_uuid != current_instance:
+            current_instance = status_transition.instance_uuid
+            started = {}
+        for stage, start_status, end_status in BUILD_STAGES:
+            if status_transition.status == end_status and stage in started and \
+                    since <= status_transition.timestamp < until:
+                stage_durations[stage].append(
+                    (status_transition.timestamp - started.pop(stage)).total_seconds())
+        for stage, start_status, end_status in BUILD_STAGES:
+            if status_transition.status == start_status:
+                started[stage] = status_transition.timestamp
+    return stage_durations
+
+
+class LambdaInstanceStatusTransitionViewSet(viewsets.GenericViewSet):
+    """
+    Queries the status transitions of the lambda instances, to find the stages of the builds
+    that dominate the build time.
+    """
+
+    authentication_classes = KamakiTokenAuthentication,
+    permission_classes = IsAuthenticated,
+    queryset = LambdaInstanceStatusTransition.objects.all()
+
+    @list_route(methods=['get'], url_path='stage-durations')
+    def stage_durations(self, request, format=None):
+        until = timezone.now()
+        since = until - timedelta(days=30)
+        try:
+            if 'until' in request.query_params:
+                until = parse_datetime(request.query_params.get('until'))
+            if 'since' in request.query_params:
+                since = parse_datetime(request.query_params.get('since'))
+        except ValueError:
+            since = None
+        if since is None or until is None:
+            return Response({"errors": [{"message": "Bad parameter"}]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.utc)
+        if timezone.is_naive(until):
+            until = timezone.make_aware(until, timezone.utc)
+
+        # Stages that ended in the time window may have started before it, so all the
+        # transitions of the lambda instances with a transition in the time window are needed.
+        instance_uuids = self.queryset.filter(timestamp__gte=since, timestamp__lt=until).\
+            values('instance_uuid').distinct()
+        status_transitions = self.queryset.filter(instance_uuid__in=instance_uuids).\
+            order_by('instance_uuid', 'timestamp', 'id')
+        stage_durations = get_stage_durations(status_transitions, since, until)
+
+        stages_list = []
+        for stage, _, _ in BUILD_STAGES:
+            durations = sorted(stage_durations[stage])
+            stage_statistics = {'stage': stage, 'builds': len(durations)}
+            stage_statistics['mean'] = sum(durations) / len(durations) if durations else None
+            for percent in STAGE_DURATION_PERCENTILES:
+                stage_statistics['p{}'.format(percent)] = \
+                    percentile(durations, percent) if durations else None
+            stage_statistics['max'] = durations[-1] if durations else None
+            stages_list.append(stage_statistics)
+
+        return Response(stages_list, status=status.HTTP_200_OK)
+
 
 class CreateLambdaInstance(APIView):
     """
@@ -329,19 +1132,21 @@ class CreateLambdaInstance(APIView):
         network_request = int(cluster_specs['network_request'])
         project_name = cluster_specs['project_name']
 
-        create = tasks.create_lambda_instance.delay(auth_token=auth_token,
-                                                    instance_name=instance_name,
-                                                    master_name=master_name,
-                                                    slaves=slaves,
-                                                    vcpus_master=vcpus_master,
-                                                    vcpus_slave=vcpus_slave,
-                                                    ram_master=ram_master,
-                                                    ram_slave=ram_slave,
-                                                    disk_master=disk_master,
-                                                    disk_slave=disk_slave,
-                                                    ip_allocation=ip_allocation,
-                                                    network_request=network_request,
-                                                    project_name=project_name)
-        instance_uuid = create.id
+        # The build is queued in the ledger of the admission control before its task is sent.
+        instance_uuid = str(uuid.uuid4())
+        specs = {'master_name': master_name, 'slaves': slaves,
+                 'vcpus_master': vcpus_master, 'vcpus_slave': vcpus_slave,
+                 'ram_master': ram_master, 'ram_slave': ram_slave,
+                 'disk_master': disk_master, 'disk_slave': disk_slave,
+                 'ip_allocation': ip_allocation, 'network_request': network_request,
+                 'project_name': project_name}
+        if not admission.reserve(instance_uuid, request.user, project_name, specs):
+            return Response({"errors": [{"message": "Too many lambda instances are queued for "
+                                                    "project {}".format(project_name)}]},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        tasks.create_lambda_instance.apply_async(kwargs=dict(specs, auth_token=auth_token,
+                                                             instance_name=instance_name),
+                                                 task_id=instance_uuid)
 
         return Response({"uuid": instance_uuid}, status=202)
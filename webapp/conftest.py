@@ -0,0 +1,10 @@
+from django.conf import settings
+
+
+def pytest_configure():
+    # The tests run in a single process, so they do not need the shared cache of the settings.
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
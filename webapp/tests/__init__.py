@@ -1,2 +1,28 @@
 from kamaki.clients.utils import https
 https.patch_ignore_ssl()
+
+# The specifications of the lambda instances that are created by the tests.
+specs = {'vcpus_master': 4, 'vcpus_slave': 2, 'ram_master': 4096, 'ram_slave': 2048,
+         'disk_master': 40, 'disk_slave': 20}
+
+
+def get_provisioner_response(index=0, slaves=1):
+    """
+    :param index: The index of the lambda instance in its test, so that the ids of the VMs, the
+                  floating ip and the private network of every lambda instance are different.
+    :param slaves: The number of slaves, less than 10.
+    :returns: A cluster creator response, like the ones that are inserted by
+              events.insert_cluster_info.
+    """
+    return {
+        'ips': [{'floating_network_id': '2186', 'floating_ip_address': '83.212.116.{}'.
+                 format(index), 'id': str(688160 + index)}],
+        'nodes': {
+            'master': {'internal_ip': '192.168.0.2', 'id': 1000 + index * 10,
+                       'name': 'lambda-master'},
+            'slaves': [{'internal_ip': '192.168.0.{}'.format(3 + slave),
+                        'id': 1001 + index * 10 + slave, 'name': 'lambda-node{}'.format(slave + 1)}
+                       for slave in range(slaves)]},
+        'vpn': {'type': 'MAC_FILTERED', 'id': str(143713 + index)},
+        'pk': 'Dummy pk',
+        'subnet': {'cidr': '192.168.0.0/24', 'gateway_ip': '192.168.0.1', 'id': '142761'}}
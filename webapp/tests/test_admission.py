@@ -0,0 +1,178 @@
+import uuid
+from datetime import timedelta
+
+from celery.exceptions import Retry
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import Mock, patch
+from rest_framework.test import APITestCase
+
+from backend import admission
+from backend.models import User, LambdaInstance, BuildReservation
+from backend.tasks import create_lambda_instance
+from tests import get_provisioner_response
+
+specs = {'master_name': 'lambda-master', 'slaves': 2, 'vcpus_master': 4, 'vcpus_slave': 2,
+         'ram_master': 4096, 'ram_slave': 2048, 'disk_master': 40, 'disk_slave': 20,
+         'ip_allocation': 'master', 'network_request': 1, 'project_name': 'lambda.grnet.gr'}
+
+quotas = {'vms': 10, 'cpus': 20, 'ram': 20480, 'disk': 200, 'floating_ips': 2,
+          'private_networks': 2}
+
+
+def reserve(project_name):
+    instance_uuid = str(uuid.uuid4())
+    admission.reserve(instance_uuid, None, project_name, specs)
+    return instance_uuid
+
+
+@override_settings(ADMISSION_MAX_BUILDS=3, ADMISSION_MAX_BUILDS_PER_PROJECT=2)
+class TestAdmission(TestCase):
+    def test_claims(self):
+        self.assertEqual(admission.get_claims(specs),
+                         {'vms': 3, 'cpus': 8, 'ram': 8192, 'disk': 80, 'floating_ips': 1,
+                          'private_networks': 1})
+        self.assertEqual(admission.get_claims(dict(specs, ip_allocation='all'))['floating_ips'], 3)
+
+    def test_fair_queue(self):
+        first, second, third = reserve('a'), reserve('a'), reserve('a')
+        other = reserve('b')
+
+        self.assertEqual(admission.admit(first, lambda: quotas)[0], admission.ADMITTED)
+        # Project b has no build in progress, so its build goes before the queued builds of a.
+        self.assertEqual(admission.admit(second, lambda: quotas)[0], admission.WAITING)
+        self.assertEqual(admission.admit(other, lambda: quotas)[0], admission.ADMITTED)
+        self.assertEqual(admission.admit(second, lambda: quotas)[0], admission.ADMITTED)
+
+        # Project a has reached its limit and all the builds have reached the global limit.
+        self.assertEqual(admission.admit(third, lambda: quotas)[0], admission.WAITING)
+        admission.release(other)
+        self.assertEqual(admission.admit(third, lambda: quotas)[0], admission.WAITING)
+        admission.release(first)
+        self.assertEqual(admission.admit(third, lambda: quotas)[0], admission.ADMITTED)
+
+    def test_quota(self):
+        first, second = reserve('a'), reserve('a')
+
+        self.assertEqual(admission.admit(first, lambda: quotas)[0], admission.ADMITTED)
+        # The claims of the admitted build are not in the usage of the project yet.
+        decision, message = admission.admit(second, lambda: dict(quotas, cpus=12))
+        self.assertEqual(decision, admission.REJECTED)
+        self.assertEqual(message, "Not enough quota in project a for cpus")
+        self.assertFalse(BuildReservation.objects.filter(instance_uuid=second).exists())
+
+        # The claims of a build whose VMs are created are in the usage of the project.
+        third = reserve('a')
+        admission.mark_provisioned(first)
+        self.assertEqual(admission.admit(third, lambda: dict(quotas, cpus=12))[0],
+                         admission.ADMITTED)
+
+    @override_settings(ADMISSION_QUEUE_TIMEOUT=-1)
+    def test_queue_timeout(self):
+        instance_uuid = reserve('a')
+
+        decision, message = admission.admit(instance_uuid, lambda: quotas)
+        self.assertEqual(decision, admission.REJECTED)
+        self.assertFalse(BuildReservation.objects.exists())
+
+    def test_lost_build(self):
+        lost, queued = reserve('a'), reserve('a')
+        reserve('b')
+        admission.admit(lost, lambda: quotas)
+        # The build in progress of project a counts as its turn.
+        self.assertEqual(admission.get_queue_position(queued)['position'], 2)
+
+        # The positions are refreshed when the reservation of the lost build is dropped.
+        BuildReservation.objects.filter(instance_uuid=lost).\
+            update(created_at=timezone.now() - timedelta(hours=7))
+        admission.admit(str(uuid.uuid4()), lambda: quotas)
+        self.assertFalse(BuildReservation.objects.filter(instance_uuid=lost).exists())
+        self.assertEqual(admission.get_queue_position(queued)['position'], 1)
+
+    @override_settings(ADMISSION_MAX_QUEUED_PER_PROJECT=2)
+    def test_queued_limit(self):
+        reserve('a'), reserve('a')
+
+        self.assertFalse(admission.reserve(str(uuid.uuid4()), None, 'a', specs))
+        self.assertTrue(admission.reserve(str(uuid.uuid4()), None, 'b', specs))
+
+
+class TestCreateLambdaInstance(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+        self.data = dict(specs, instance_name='Lambda Instance')
+
+    @override_settings(ADMISSION_MAX_QUEUED_PER_PROJECT=1)
+    def test_create(self):
+        with patch('backend.views.tasks.create_lambda_instance') as create:
+            response = self.client.post('/backend/create_lambda_instance/', self.data,
+                                        format='json', HTTP_AUTHORIZATION='Token token1')
+
+        self.assertEqual(response.status_code, 202)
+        instance_uuid = response.data['uuid']
+        self.assertEqual(create.apply_async.call_args[1]['task_id'], instance_uuid)
+        self.assertEqual(create.apply_async.call_args[1]['kwargs']['auth_token'], 'token1')
+        self.assertTrue(BuildReservation.objects.filter(instance_uuid=instance_uuid).exists())
+
+        with patch('backend.views.tasks.create_lambda_instance') as create:
+            response = self.client.post('/backend/create_lambda_instance/', self.data,
+                                        format='json', HTTP_AUTHORIZATION='Token token1')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.data['errors'][0]['message'],
+                         "Too many lambda instances are queued for project lambda.grnet.gr")
+        self.assertFalse(create.apply_async.called)
+
+    def test_create_task_waiting(self):
+        with patch('backend.tasks.admission.admit', return_value=(admission.WAITING, "Waiting")), \
+                patch('backend.tasks.events') as events, \
+                patch.object(create_lambda_instance, 'retry', return_value=Retry()) as retry, \
+                patch('backend.tasks.lambda_instance_manager') as manager:
+            with self.assertRaises(Retry):
+                create_lambda_instance(auth_token='token1', **specs)
+
+        self.assertTrue(events.create_new_lambda_instance.delay.called)
+        self.assertTrue(retry.called)
+        self.assertFalse(manager.create_cluster.called)
+
+    def test_create_task_rejected(self):
+        instance_uuid = reserve(specs['project_name'])
+
+        with patch('backend.tasks.admission.admit',
+                   return_value=(admission.REJECTED, "Not enough quota")), \
+                patch('backend.tasks.events') as events, \
+                patch('backend.tasks.lambda_instance_manager') as manager:
+            create_lambda_instance.apply(kwargs=dict(specs, auth_token='token1'),
+                                         task_id=instance_uuid)
+
+        events.set_lambda_instance_status.delay.assert_called_with(
+            instance_uuid=instance_uuid, status=LambdaInstance.CLUSTER_FAILED,
+            failure_message="Not enough quota")
+        self.assertFalse(manager.create_cluster.called)
+        self.assertFalse(BuildReservation.objects.exists())
+
+    def test_create_task_unreachable_nodes(self):
+        instance_uuid = reserve(specs['project_name'])
+        provisioner_response = dict(get_provisioner_response(slaves=2), ssh_latencies={
+            'lambda-master': 40.5, 'lambda-node1': 52.0, 'lambda-node2': None})
+        ansible_manager = Mock()
+
+        with patch('backend.tasks.admission.admit', return_value=(admission.ADMITTED, "")), \
+                patch('backend.tasks.events') as events, \
+                patch('backend.tasks.lambda_instance_manager.create_cluster',
+                      return_value=(ansible_manager, provisioner_response)), \
+                patch('backend.tasks.run_playbook_stages') as run_playbook_stages:
+            create_lambda_instance.apply(kwargs=dict(specs, auth_token='token1'),
+                                         task_id=instance_uuid)
+
+        # The latencies are published and the build fails before the playbooks.
+        instance_events = events.publish_lambda_instance_events.delay.call_args[1]
+        self.assertEqual(instance_events['instance_events'][0]['data']['ssh_latencies'],
+                         provisioner_response['ssh_latencies'])
+        events.set_lambda_instance_status.delay.assert_called_with(
+            instance_uuid=instance_uuid, status=LambdaInstance.INIT_FAILED,
+            failure_message="VMs not reachable over SSH: lambda-node2")
+        self.assertFalse(run_playbook_stages.called)
+        self.assertTrue(ansible_manager.cleanup.called)
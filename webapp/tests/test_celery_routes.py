@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from webapp.celery import app
+
+
+class TestCeleryRoutes(SimpleTestCase):
+    def test_backend_tasks_routed(self):
+        app.loader.import_default_modules()
+        queues = {queue.name: queue.routing_key for queue in settings.CELERY_QUEUES}
+
+        backend_tasks = [name for name in app.tasks if name.startswith('backend.')]
+        self.assertTrue(backend_tasks)
+        for name in backend_tasks:
+            route = settings.CELERY_ROUTES[name]
+            self.assertEqual(queues[route['queue']], route['routing_key'])
+
+    def test_builds_do_not_share_the_events_queue(self):
+        self.assertEqual(
+            settings.CELERY_ROUTES['backend.tasks.create_lambda_instance']['queue'],
+            'provisioning_queue')
+        self.assertEqual(
+            settings.CELERY_ROUTES['backend.events.set_lambda_instance_status']['queue'],
+            'events_queue')
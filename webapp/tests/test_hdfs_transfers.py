@@ -0,0 +1,74 @@
+import uuid
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from mock import patch
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance, Server, ProjectFile, HDFSTransfer
+
+
+class TestHDFSTransfers(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = uuid.uuid4()
+        self.lambda_instance = LambdaInstance.objects.create(
+            uuid=self.instance_uuid, status=LambdaInstance.FLINK_INSTALLED)
+        Server.objects.create(id=1, lambda_instance=self.lambda_instance, pub_ip='83.212.1.1',
+                              pub_ip_id=1, priv_ip='192.168.0.2')
+        Server.objects.create(id=2, lambda_instance=self.lambda_instance,
+                              priv_ip='192.168.0.3')
+
+        self.client.put('/backend/user_files',
+                        {'file': SimpleUploadedFile("test_hdfs_transfer.csv", b"0123456789")},
+                        format='multipart')
+        self.project_file = ProjectFile.objects.get(name="test_hdfs_transfer.csv")
+        self.url = '/backend/lambda-instances/{}/hdfs-transfers/'.format(self.instance_uuid)
+
+    def tearDown(self):
+        self.client.delete('/backend/user_files', {'uuid': self.project_file.uuid})
+
+    @patch('backend.views.tasks.push_file_to_hdfs')
+    def test_transfer(self, push_file_to_hdfs):
+        response = self.client.post(self.url, {'file': str(self.project_file.uuid)},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['destination'], '/user/hduser/test_hdfs_transfer.csv')
+        self.assertEqual(response.data['size'], 10)
+        push_file_to_hdfs.delay.assert_called_once_with(
+            response.data['uuid'], self.project_file.path, 10, '83.212.1.1',
+            '/user/hduser/test_hdfs_transfer.csv')
+
+        # The progress of the transfer is reported through events.
+        events.update_hdfs_transfer(response.data['uuid'], HDFSTransfer.RUNNING, 4)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['bytes_transferred'], 4)
+        self.assertEqual(response.data[0]['status'], HDFSTransfer.RUNNING)
+
+        # Progress that is reported after the transfer has ended is ignored.
+        events.update_hdfs_transfer(response.data[0]['uuid'], HDFSTransfer.COMPLETED, 10)
+        events.update_hdfs_transfer(response.data[0]['uuid'], HDFSTransfer.RUNNING, 8)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['bytes_transferred'], 10)
+        self.assertEqual(response.data[0]['status'], HDFSTransfer.COMPLETED)
+
+    @patch('backend.views.tasks.push_file_to_hdfs')
+    def test_transfer_to_instance_without_hdfs(self, push_file_to_hdfs):
+        self.lambda_instance.status = LambdaInstance.COMMONS_INSTALLED
+        self.lambda_instance.save()
+
+        response = self.client.post(self.url, {'file': str(self.project_file.uuid)},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(push_file_to_hdfs.delay.called)
+
+    @patch('backend.views.tasks.push_file_to_hdfs')
+    def test_transfer_of_other_user(self, push_file_to_hdfs):
+        self.client.force_authenticate(user=User.objects.create(uuid='another_user'))
+
+        response = self.client.post(self.url, {'file': str(self.project_file.uuid)},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(push_file_to_hdfs.delay.called)
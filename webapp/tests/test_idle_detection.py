@@ -0,0 +1,108 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mock import Mock, patch
+
+from backend import events, idle
+from backend.models import LambdaInstance, LambdaInstanceActivity
+from backend.tasks import detect_idle_lambda_instances
+from tests import get_provisioner_response, specs
+
+idle_sample = {'yarn_applications': 0, 'flink_jobs': 0, 'kafka_offset': 42}
+
+
+@override_settings(RECONCILIATION_AUTH_TOKENS=['token1'],
+                   IDLE_SUSPEND_POLICIES={
+                       'default': {'idle_after': 24 * 60 * 60, 'notify_before': 2 * 60 * 60},
+                       'research.grnet.gr': {'idle_after': None}})
+class TestIdleDetection(TestCase):
+    def setUp(self):
+        started_sequence = int((time.time() - 3 * 24 * 60 * 60) * 1000000)
+        now = timezone.now()
+        self.instance_uuids = []
+        self.samples = {}
+        for index, (project_name, idle_hours, idle_notified, sample) in enumerate([
+                ('lambda.grnet.gr', 30, True, idle_sample),
+                ('lambda.grnet.gr', 23, False, idle_sample),
+                ('lambda.grnet.gr', None, False, dict(idle_sample, yarn_applications=1)),
+                ('research.grnet.gr', 48, False, idle_sample)]):
+            instance_uuid = uuid.uuid4()
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance',
+                                              json.dumps({'project_name': project_name}))
+            events.insert_cluster_info(instance_uuid, specs, get_provisioner_response(index))
+            events.update_lambda_instance_status(instance_uuid, LambdaInstance.STARTED,
+                                                 sequence=started_sequence)
+            if idle_hours is not None:
+                LambdaInstanceActivity.objects.create(
+                    lambda_instance=LambdaInstance.objects.get(uuid=instance_uuid),
+                    sampled_at=now, last_active=now - timedelta(hours=idle_hours),
+                    kafka_offset=42, idle_notified=idle_notified)
+            self.instance_uuids.append(str(instance_uuid))
+            self.samples['83.212.116.{}'.format(index)] = sample
+
+    def test_idle_detection(self):
+        cloud_state = ({str(server_id): 'ACTIVE' for server_id in (1000, 1001, 1010, 1011)},
+                       set())
+
+        with patch('backend.tasks.ActivityProbe') as activity_probe, \
+                patch('backend.tasks.get_cloud_state', return_value=cloud_state), \
+                patch('backend.tasks.lambda_instance_stop') as lambda_instance_stop, \
+                patch('backend.tasks.events.set_lambda_instance_status') as set_status, \
+                patch('backend.tasks.events.publish_lambda_instance_events') as publish, \
+                patch('backend.tasks.events.update_lambda_instance_activities') as update:
+            activity_probe.side_effect = lambda host, timeout: \
+                Mock(**{'sample.return_value': self.samples[host]})
+            actions = detect_idle_lambda_instances()
+        events.update_lambda_instance_activities(*update.delay.call_args[0])
+
+        self.assertEqual(actions, {self.instance_uuids[0]: 'stop',
+                                   self.instance_uuids[1]: 'notify'})
+
+        # The lambda instance that has been idle for too long is stopped with the token of its
+        # account.
+        self.assertEqual(lambda_instance_stop.apply_async.call_count, 1)
+        self.assertEqual(lambda_instance_stop.apply_async.call_args[1]['args'],
+                         (self.instance_uuids[0],
+                          'https://accounts.okeanos.grnet.gr/identity/v2.0', 'token1', 1000,
+                          [1001]))
+        set_status.delay.assert_called_once_with(self.instance_uuids[0], LambdaInstance.STOPPING)
+
+        # The owners are notified with idle events.
+        published = {call[1]['instance_uuid']: call[1]['instance_events'][0]
+                     for call in publish.delay.call_args_list}
+        self.assertEqual(published[self.instance_uuids[0]]['data']['action'], 'stop')
+        self.assertEqual(published[self.instance_uuids[1]]['data']['action'], 'notify')
+        self.assertEqual(published[self.instance_uuids[1]]['event_type'], 'idle')
+        self.assertEqual(len(published), 2)
+
+        # The activity of the lambda instance that was busy is recorded.
+        activities = {str(activity.lambda_instance.uuid): activity
+                      for activity in LambdaInstanceActivity.objects.all()}
+        self.assertEqual(len(activities), 4)
+        self.assertLess((timezone.now() - activities[self.instance_uuids[2]].last_active).
+                        total_seconds(), 60)
+        self.assertTrue(activities[self.instance_uuids[1]].idle_notified)
+
+    def test_restarted_instance(self):
+        # The lambda instance was notified and stopped, and it was started again 25 hours ago.
+        now = timezone.now()
+        lambda_instance = LambdaInstance.objects.get(uuid=self.instance_uuids[0])
+        lambda_instance.status_sequence = int((time.time() - 25 * 60 * 60) * 1000000)
+        activity = LambdaInstanceActivity(lambda_instance=lambda_instance, sampled_at=now,
+                                          last_active=now - timedelta(hours=30),
+                                          kafka_offset=42, idle_notified=True)
+
+        # The owner is notified again before it is stopped.
+        fields, action, idle_seconds = idle.evaluate(lambda_instance, activity, idle_sample, now)
+        self.assertEqual(action, idle.NOTIFY)
+        self.assertTrue(fields['idle_notified'])
+
+        activity.last_active = fields['last_active']
+        activity.idle_notified = fields['idle_notified']
+        fields, action, idle_seconds = idle.evaluate(lambda_instance, activity, idle_sample, now)
+        self.assertEqual(action, idle.STOP)
+        self.assertFalse(fields['idle_notified'])
@@ -0,0 +1,97 @@
+import uuid
+
+from mock import patch
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance
+from backend.tasks import lambda_instances_bulk_operation
+from tests import get_provisioner_response, specs
+
+
+class TestLambdaInstanceBulk(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuids = []
+        for index, instance_status in enumerate([LambdaInstance.STARTED, LambdaInstance.STARTED,
+                                                 LambdaInstance.STOPPED]):
+            instance_uuid = uuid.uuid4()
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance')
+            events.insert_cluster_info(instance_uuid, specs, get_provisioner_response(index))
+            events.update_lambda_instance_status(instance_uuid, instance_status)
+            self.instance_uuids.append(str(instance_uuid))
+
+        self.url = '/backend/lambda-instances/bulk/'
+
+    def post(self, operations):
+        with patch('backend.views.tasks.lambda_instances_bulk_operation') as bulk_operation, \
+                patch('backend.views.events.set_lambda_instance_status') as set_status:
+            response = self.client.post(self.url, {'operations': operations}, format='json',
+                                        HTTP_AUTHORIZATION='Token 1234')
+        return response, bulk_operation, set_status
+
+    def test_bulk_operations(self):
+        response, bulk_operation, set_status = self.post([
+            {'uuid': self.instance_uuids[0], 'operation': 'stop'},
+            {'uuid': self.instance_uuids[1], 'operation': 'destroy'},
+            {'uuid': self.instance_uuids[2], 'operation': 'stop'},
+            {'uuid': str(uuid.uuid4()), 'operation': 'start'},
+            {'uuid': self.instance_uuids[0], 'operation': 'reboot'}])
+
+        self.assertEqual(response.status_code, 202)
+        results = response.data['results']
+        self.assertEqual([result.get('result') for result in results],
+                         ['Accepted', 'Accepted', None, None, None])
+        self.assertEqual(results[2]['errors'][0]['message'],
+                         "Cannot stop lambda instance while current status is " +
+                         LambdaInstance.STOPPED)
+        self.assertEqual(results[3]['errors'][0]['message'], "Lambda instance not found")
+        self.assertEqual(results[4]['errors'][0]['message'], "Unknown operation: reboot")
+
+        # All the accepted operations are run by one task.
+        self.assertEqual(bulk_operation.apply_async.call_count, 1)
+        operations, auth_url, auth_token = bulk_operation.apply_async.call_args[1]['args']
+        self.assertEqual(auth_token, '1234')
+        self.assertEqual(operations, [
+            {'uuid': self.instance_uuids[0], 'operation': 'stop', 'master_id': 1000,
+             'slave_ids': [1001], 'public_ip_id': 688160, 'private_network_id': 143713},
+            {'uuid': self.instance_uuids[1], 'operation': 'destroy', 'master_id': 1010,
+             'slave_ids': [1011], 'public_ip_id': 688161, 'private_network_id': 143714}])
+        self.assertEqual([call[0] for call in set_status.delay.call_args_list],
+                         [(self.instance_uuids[0], LambdaInstance.STOPPING),
+                          (self.instance_uuids[1], LambdaInstance.DESTROYING)])
+
+    def test_no_accepted_operations(self):
+        response, bulk_operation, set_status = self.post([
+            {'uuid': self.instance_uuids[0], 'operation': 'start'}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(bulk_operation.apply_async.called)
+
+    def test_bad_request(self):
+        response, bulk_operation, set_status = self.post({'uuid': self.instance_uuids[0]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(bulk_operation.apply_async.called)
+
+    def test_task_reports_every_instance(self):
+        operations = [{'uuid': self.instance_uuids[0], 'operation': 'stop'},
+                      {'uuid': self.instance_uuids[1], 'operation': 'destroy'}]
+
+        def run(operations, listener):
+            listener(self.instance_uuids[0], None)
+            listener(self.instance_uuids[1], "VM 1010 is in ERROR status")
+
+        with patch('backend.tasks.BulkLifecycle') as bulk_lifecycle, \
+                patch('backend.tasks.events.set_lambda_instance_status') as set_status:
+            bulk_lifecycle.return_value.run.side_effect = run
+            results = lambda_instances_bulk_operation(operations, 'https://auth', '1234')
+
+        self.assertEqual(results, {self.instance_uuids[0]: None,
+                                   self.instance_uuids[1]: "VM 1010 is in ERROR status"})
+        self.assertEqual([call[0] for call in set_status.delay.call_args_list],
+                         [(self.instance_uuids[0], LambdaInstance.STOPPED),
+                          (self.instance_uuids[1], LambdaInstance.FAILED,
+                           "VM 1010 is in ERROR status")])
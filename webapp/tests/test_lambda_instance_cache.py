@@ -0,0 +1,47 @@
+import uuid
+
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance
+
+
+class TestLambdaInstanceCache(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = uuid.uuid4()
+        events.create_new_lambda_instance(self.instance_uuid, 'Lambda Instance',
+                                          '{"master_name": "master"}')
+        self.url = '/backend/lambda-instances/{}/status/'.format(self.instance_uuid)
+
+    def test_unchanged_status(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], LambdaInstance.PENDING)
+
+        # Polls of an unchanged lambda instance do not touch the DataBase.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(self.url)
+            self.assertEqual(response.data['status'], LambdaInstance.PENDING)
+
+    def test_updated_status(self):
+        etag = self.client.get(self.url)['ETag']
+
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.CLUSTER_CREATED)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], LambdaInstance.CLUSTER_CREATED)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_representations_are_cached_separately(self):
+        status_response = self.client.get(self.url)
+        response = self.client.get('/backend/lambda-instances/{}/'.format(self.instance_uuid),
+                                   HTTP_IF_NONE_MATCH=status_response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['instance_info'], {'master_name': 'master'})
+        self.assertNotIn('status', response.data)
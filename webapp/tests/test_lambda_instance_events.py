@@ -0,0 +1,97 @@
+import time
+import uuid
+
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from backend import events, event_notifications
+from backend.models import User, LambdaInstance, LambdaInstanceEvent
+
+
+class TestLambdaInstanceEvents(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = uuid.uuid4()
+        events.create_new_lambda_instance(self.instance_uuid, 'Lambda Instance')
+        events.publish_lambda_instance_events(self.instance_uuid, [
+            {'event_type': LambdaInstanceEvent.PROVISIONING, 'message': 'Quotas checked',
+             'timestamp': 100.0},
+            {'event_type': LambdaInstanceEvent.TASK, 'message': 'format hdfs',
+             'data': {'playbook': 'hadoop-install.yml'}, 'timestamp': 101.0}])
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.CLUSTER_CREATED)
+
+        self.url = '/backend/lambda-instances/{}/events/'.format(self.instance_uuid)
+
+    def test_long_poll(self):
+        response = self.client.get(self.url, {'timeout': 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['message'] for event in response.data['events']],
+                         ['PENDING', 'Quotas checked', 'format hdfs', 'CLUSTER_CREATED'])
+        self.assertEqual(response.data['events'][2]['data'],
+                         {'playbook': 'hadoop-install.yml'})
+
+        # Resume from the cursor of the previous response.
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.INIT_DONE)
+        response = self.client.get(self.url, {'timeout': 0, 'cursor': response.data['cursor']})
+        self.assertEqual([event['message'] for event in response.data['events']], ['INIT_DONE'])
+
+        response = self.client.get(self.url, {'timeout': 0, 'cursor': response.data['cursor']})
+        self.assertEqual(response.data['events'], [])
+
+    @override_settings(LAMBDA_INSTANCE_EVENTS_STREAM_DURATION=0)
+    def test_event_stream(self):
+        cursor = LambdaInstanceEvent.objects.order_by('id')[1].id
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream',
+                                   HTTP_LAST_EVENT_ID=str(cursor))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        content = ''.join(response.streaming_content)
+        self.assertIn('id: {}\nevent: task\n'.format(cursor + 1), content)
+        self.assertIn('event: status\n', content)
+        self.assertNotIn('Quotas checked', content)
+
+    @override_settings(LAMBDA_INSTANCE_EVENTS_POLL_INTERVAL=0.01)
+    def test_wait_for_events(self):
+        instance_events = LambdaInstanceEvent.objects.filter(instance_uuid=self.instance_uuid).\
+            order_by('id')
+        cursor = instance_events.last().id
+
+        # The DataBase is not queried again until new events are published.
+        with self.assertNumQueries(1):
+            self.assertEqual(event_notifications.wait_for_events(
+                self.instance_uuid, instance_events, cursor, time.time() + 0.1), [])
+
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.INIT_DONE)
+        new_events = event_notifications.wait_for_events(self.instance_uuid, instance_events,
+                                                         cursor, time.time() + 0.1)
+        self.assertEqual([event.message for event in new_events], ['INIT_DONE'])
+
+    @override_settings(LAMBDA_INSTANCE_EVENTS_MAX_WAITING=0)
+    def test_too_many_waiting(self):
+        cursor = LambdaInstanceEvent.objects.order_by('id').last().id
+        response = self.client.get(self.url, {'timeout': 10, 'cursor': cursor})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+
+        # The events that are published already are returned without waiting.
+        response = self.client.get(self.url, {'timeout': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['events']), 4)
+
+        # The stream is closed at once, and the client reconnects later.
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        content = ''.join(response.streaming_content)
+        self.assertTrue(content.startswith('retry: 10000\n\n'))
+        self.assertIn('event: status\n', content)
+
+    def test_unknown_instance(self):
+        response = self.client.get('/backend/lambda-instances/{}/events/'.format(uuid.uuid4()),
+                                   {'timeout': 0})
+        self.assertEqual(response.status_code, 404)
+
+    def test_bad_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
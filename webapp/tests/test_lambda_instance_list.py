@@ -0,0 +1,62 @@
+import uuid
+
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User
+from tests import get_provisioner_response, specs
+
+
+class TestLambdaInstanceList(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        for i in range(3):
+            instance_uuid = uuid.uuid4()
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance {}'.format(i))
+            events.insert_cluster_info(instance_uuid, specs, get_provisioner_response(i))
+
+    def test_default_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/backend/lambda-instances/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(set(response.data[0].keys()), {'id', 'uuid', 'name'})
+
+    def test_nested_fields(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/backend/lambda-instances/?fields=uuid,status,servers,private_network')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0].keys()),
+                         {'uuid', 'status', 'servers', 'private_network'})
+        self.assertEqual(len(response.data[2]['servers']), 2)
+        self.assertEqual(response.data[2]['private_network'][0]['id'], 143715)
+
+    def test_pagination(self):
+        response = self.client.get('/backend/lambda-instances/?limit=2&page=2&fields=name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'name': 'Lambda Instance 2'}])
+
+    def test_unknown_field(self):
+        response = self.client.get('/backend/lambda-instances/?fields=name,private_key')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/backend/lambda-instances/?cursor=&limit=2&count=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([instance['name'] for instance in response.data['results']],
+                         ['Lambda Instance 0', 'Lambda Instance 1'])
+        self.assertEqual(response.data['count'], 3)
+
+        response = self.client.get('/backend/lambda-instances/?limit=2&cursor={}'.
+                                   format(response.data['next_cursor']))
+        self.assertEqual([instance['name'] for instance in response.data['results']],
+                         ['Lambda Instance 2'])
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertNotIn('count', response.data)
+
+    def test_bad_cursor(self):
+        response = self.client.get('/backend/lambda-instances/?cursor=bad')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+import uuid
+
+from mock import Mock, patch
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance, ScheduledOperation
+from backend.tasks import lambda_instance_pause, lambda_instance_unpause
+from tests import get_provisioner_response, specs
+
+
+class TestLambdaInstancePause(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = uuid.uuid4()
+        events.create_new_lambda_instance(self.instance_uuid, 'Lambda Instance')
+        events.insert_cluster_info(self.instance_uuid, specs, get_provisioner_response())
+
+        self.url = '/backend/lambda-instances/{}/'.format(self.instance_uuid)
+
+    def test_pause(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STARTED)
+
+        with patch('backend.views.tasks.lambda_instance_pause') as pause, \
+                patch('backend.views.events.set_lambda_instance_status') as set_status:
+            response = self.client.post(self.url + 'pause/')
+
+        self.assertEqual(response.status_code, 202)
+        instance_uuid, paused_response = pause.apply_async.call_args[1]['args']
+        self.assertEqual(instance_uuid, str(self.instance_uuid))
+        self.assertEqual(paused_response['nodes']['master']['id'], 1000)
+        self.assertEqual(paused_response['pk'], 'Dummy pk')
+        set_status.delay.assert_called_with(str(self.instance_uuid), LambdaInstance.PAUSING)
+        # The pause is scheduled along with the other lifecycle operations.
+        self.assertEqual(ScheduledOperation.objects.get(instance_uuid=self.instance_uuid).operation,
+                         ScheduledOperation.STOP)
+
+    def test_pause_not_started(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STOPPED)
+
+        with patch('backend.views.tasks.lambda_instance_pause') as pause:
+            response = self.client.post(self.url + 'pause/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(pause.apply_async.called)
+
+    def test_unpause(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.PAUSED)
+
+        with patch('backend.views.tasks.lambda_instance_unpause') as unpause, \
+                patch('backend.views.events.set_lambda_instance_status') as set_status:
+            response = self.client.post(self.url + 'unpause/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(unpause.apply_async.call_args[1]['args'][0], str(self.instance_uuid))
+        set_status.delay.assert_called_with(str(self.instance_uuid), LambdaInstance.UNPAUSING)
+        self.assertEqual(ScheduledOperation.objects.get(instance_uuid=self.instance_uuid).operation,
+                         ScheduledOperation.START)
+
+        # The services of a lambda instance that is already started cannot be started again.
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STARTED)
+        response = self.client.post(self.url + 'unpause/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stop_paused(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.PAUSED)
+
+        with patch('backend.views.tasks.lambda_instance_stop') as stop, \
+                patch('backend.views.events.set_lambda_instance_status'):
+            response = self.client.post(self.url + 'stop/', HTTP_AUTHORIZATION='Token token1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(stop.apply_async.called)
+
+    def test_pause_tasks(self):
+        provisioner_response = get_provisioner_response()
+        ansible_manager = Mock(task_timings=[])
+        with patch('backend.tasks.lambda_instance_manager') as lambda_instance_manager, \
+                patch('backend.tasks.events.set_lambda_instance_status') as set_status:
+            lambda_instance_manager.create_ansible_manager.return_value = ansible_manager
+            lambda_instance_manager.run_playbook.side_effect = [
+                {'snf-1000.vm.okeanos.grnet.gr': {'unreachable': 0, 'failures': 0}},
+                {'snf-1000.vm.okeanos.grnet.gr': {'unreachable': 0, 'failures': 1}}]
+            lambda_instance_pause(str(self.instance_uuid), provisioner_response)
+            lambda_instance_unpause(str(self.instance_uuid), provisioner_response)
+
+        self.assertEqual([call[0][1] for call in
+                          lambda_instance_manager.run_playbook.call_args_list],
+                         ['services-stop.yml', 'services-start.yml'])
+        self.assertEqual(ansible_manager.cleanup.call_count, 2)
+        self.assertEqual([call[1]['status'] for call in set_status.delay.call_args_list],
+                         [LambdaInstance.PAUSED, LambdaInstance.FAILED])
+        self.assertEqual(set_status.delay.call_args[1]['failure_message'],
+                         'Ansible task failed')
@@ -0,0 +1,71 @@
+import time
+import uuid
+
+from django.test import TestCase, override_settings
+from mock import patch
+
+from backend import events
+from backend.models import LambdaInstance
+from backend.tasks import reconcile_lambda_instances
+from tests import get_provisioner_response, specs
+
+
+@override_settings(RECONCILIATION_AUTH_TOKENS=['token1', 'token2'])
+class TestLambdaInstanceReconciliation(TestCase):
+    def setUp(self):
+        self.instance_uuids = []
+        an_hour_ago = int((time.time() - 60 * 60) * 1000000)
+        for index, (instance_status, sequence) in enumerate([
+                (LambdaInstance.STARTED, None), (LambdaInstance.STOPPED, None),
+                (LambdaInstance.STARTING, None), (LambdaInstance.STOPPING, an_hour_ago),
+                (LambdaInstance.STARTED, None), (LambdaInstance.STARTED, None),
+                (LambdaInstance.STARTED, None)]):
+            instance_uuid = uuid.uuid4()
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance')
+            events.insert_cluster_info(instance_uuid, specs, get_provisioner_response(index))
+            events.update_lambda_instance_status(instance_uuid, instance_status, sequence=sequence)
+            self.instance_uuids.append(str(instance_uuid))
+
+    def test_reconciliation(self):
+        cloud_states = [
+            # The first account owns the first four lambda instances.
+            ({'1000': 'STOPPED', '1001': 'STOPPED',
+              '1010': 'STOPPED', '1011': 'STOPPED',
+              '1020': 'ACTIVE', '1021': 'STOPPED',
+              '1030': 'STOPPED', '1031': 'STOPPED'}, {'143713'}),
+            # The second account owns the next two. The VMs of the first one have all been deleted
+            # long ago, only its network is left, the master of the second one was deleted
+            # recently.
+            ({'1051': 'ACTIVE', '1050': 'DELETED'}, {'143717'}),
+        ]
+
+        with patch('backend.tasks.get_cloud_state', side_effect=cloud_states) as get_cloud_state, \
+                patch('backend.tasks.events.set_lambda_instance_status') as set_status:
+            reconcile_lambda_instances()
+
+        # Every account is listed once.
+        self.assertEqual([call[0][1] for call in get_cloud_state.call_args_list],
+                         ['token1', 'token2'])
+        corrections = {call[0][0]: call[0][1:] for call in set_status.delay.call_args_list}
+        self.assertEqual(corrections, {
+            # The VMs were stopped outside the service.
+            self.instance_uuids[0]: (LambdaInstance.STOPPED, ""),
+            # The stop task crashed an hour ago.
+            self.instance_uuids[3]: (LambdaInstance.STOPPED, ""),
+            self.instance_uuids[4]: (LambdaInstance.DESTROYED, ""),
+            self.instance_uuids[5]: (LambdaInstance.FAILED,
+                                     "VMs 1050 were deleted outside the service"),
+        })
+        # The corrections are ignored for lambda instances updated after the listings.
+        sequences = {call[1]['sequence'] for call in set_status.delay.call_args_list}
+        self.assertEqual(len(sequences), 1)
+        self.assertLessEqual(sequences.pop(), int(time.time() * 1000000))
+
+    @override_settings(RECONCILIATION_AUTH_TOKENS=[])
+    def test_no_accounts(self):
+        with patch('backend.tasks.get_cloud_state') as get_cloud_state, \
+                patch('backend.tasks.events.set_lambda_instance_status') as set_status:
+            reconcile_lambda_instances()
+
+        self.assertFalse(get_cloud_state.called)
+        self.assertFalse(set_status.delay.called)
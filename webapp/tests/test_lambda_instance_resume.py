@@ -0,0 +1,54 @@
+import uuid
+
+from mock import patch
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance
+from tests import get_provisioner_response, specs
+
+
+class TestLambdaInstanceResume(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = uuid.uuid4()
+        events.create_new_lambda_instance(self.instance_uuid, 'Lambda Instance')
+        events.insert_cluster_info(self.instance_uuid, specs,
+                                   get_provisioner_response(slaves=2))
+
+        self.url = '/backend/lambda-instances/{}/resume/'.format(self.instance_uuid)
+
+    def test_resume_failed_stage(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.HADOOP_FAILED)
+
+        with patch('backend.views.tasks.lambda_instance_resume') as resume, \
+                patch('backend.views.events.set_lambda_instance_status') as set_status:
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 202)
+        instance_uuid, resumed_response, first_stage = resume.delay.call_args[0]
+        self.assertEqual(instance_uuid, str(self.instance_uuid))
+        self.assertEqual(first_stage, 2)
+        self.assertEqual(resumed_response['nodes']['master'],
+                         {'id': 1000, 'internal_ip': '192.168.0.2',
+                          'vcpus': 4, 'ram': 4096, 'disk': 40})
+        self.assertEqual(resumed_response['nodes']['slaves'],
+                         [{'id': 1001, 'internal_ip': '192.168.0.3',
+                           'vcpus': 2, 'ram': 2048, 'disk': 20},
+                          {'id': 1002, 'internal_ip': '192.168.0.4',
+                           'vcpus': 2, 'ram': 2048, 'disk': 20}])
+        self.assertEqual(resumed_response['subnet']['cidr'], '192.168.0.0/24')
+        self.assertEqual(resumed_response['pk'], 'Dummy pk')
+        set_status.delay.assert_called_with(str(self.instance_uuid),
+                                            LambdaInstance.COMMONS_INSTALLED)
+
+    def test_resume_not_failed(self):
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STARTED)
+
+        with patch('backend.views.tasks.lambda_instance_resume') as resume:
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(resume.delay.called)
@@ -0,0 +1,87 @@
+import uuid
+
+from mock import Mock, patch
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import LambdaInstance, LambdaInstanceEvent
+
+
+class TestLambdaInstanceStatusUpdates(APITestCase):
+    def setUp(self):
+        self.instance_uuids = [uuid.uuid4(), uuid.uuid4()]
+        for instance_uuid in self.instance_uuids:
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance')
+
+    def get_status(self, instance_uuid):
+        return LambdaInstance.objects.get(uuid=instance_uuid).status
+
+    def test_batch_of_status_updates(self):
+        requests = [
+            Mock(args=(str(self.instance_uuids[0]), LambdaInstance.INIT_DONE),
+                 kwargs={'sequence': 20}),
+            Mock(args=(str(self.instance_uuids[0]), LambdaInstance.CLUSTER_CREATED),
+                 kwargs={'sequence': 10}),
+            Mock(args=(), kwargs={'instance_uuid': str(self.instance_uuids[1]),
+                                  'status': LambdaInstance.CLUSTER_FAILED,
+                                  'failure_message': 'Quota exceeded', 'sequence': 15})]
+
+        with self.assertNumQueries(5):
+            events.set_lambda_instance_status(requests)
+
+        self.assertEqual(self.get_status(self.instance_uuids[0]), LambdaInstance.INIT_DONE)
+        lambda_instance = LambdaInstance.objects.get(uuid=self.instance_uuids[1])
+        self.assertEqual(lambda_instance.status, LambdaInstance.CLUSTER_FAILED)
+        self.assertEqual(lambda_instance.failure_message, 'Quota exceeded')
+
+        status_events = LambdaInstanceEvent.objects.filter(
+            instance_uuid=self.instance_uuids[0], event_type=LambdaInstanceEvent.STATUS).\
+            order_by('id')
+        self.assertEqual([status_event.message for status_event in status_events],
+                         ['PENDING', 'CLUSTER_CREATED', 'INIT_DONE'])
+
+    def test_stale_status_update(self):
+        events.update_lambda_instance_status(self.instance_uuids[0], LambdaInstance.STARTED,
+                                             sequence=20)
+        events.update_lambda_instance_status(self.instance_uuids[0], LambdaInstance.STARTING,
+                                             sequence=10)
+
+        self.assertEqual(self.get_status(self.instance_uuids[0]), LambdaInstance.STARTED)
+        self.assertEqual(LambdaInstanceEvent.objects.filter(
+            instance_uuid=self.instance_uuids[0]).count(), 2)
+
+    def test_sequence_assigned_when_sent(self):
+        with patch('backend.events.Batches.apply_async') as apply_async:
+            events.set_lambda_instance_status.delay(str(self.instance_uuids[0]),
+                                                    LambdaInstance.STARTED)
+
+        args, kwargs = apply_async.call_args[0][:2]
+        self.assertEqual(args, (str(self.instance_uuids[0]), LambdaInstance.STARTED))
+        self.assertIn('sequence', kwargs)
+
+    @patch('backend.events.retry_lambda_instance_status.apply_async')
+    def test_status_update_of_unknown_instance_is_sent_again(self, apply_async):
+        instance_uuid = uuid.uuid4()
+        events.update_lambda_instance_status(instance_uuid, LambdaInstance.CLUSTER_CREATED,
+                                             sequence=10)
+
+        (status_update,), = apply_async.call_args[0]
+        self.assertEqual(status_update['instance_uuid'], str(instance_uuid))
+        self.assertEqual(status_update['sequence'], 10)
+        self.assertEqual(status_update['retries'], 1)
+
+        # The lambda instance is inserted before the update is applied again.
+        events.create_new_lambda_instance(instance_uuid, 'Lambda Instance')
+        events.retry_lambda_instance_status(status_update)
+
+        self.assertEqual(self.get_status(instance_uuid), LambdaInstance.CLUSTER_CREATED)
+        self.assertEqual(apply_async.call_count, 1)
+
+    @patch('backend.events.retry_lambda_instance_status.apply_async')
+    def test_status_update_of_unknown_instance_is_dropped_after_retries(self, apply_async):
+        with self.settings(LAMBDA_INSTANCE_STATUS_MAX_RETRIES=3):
+            events.update_lambda_instance_statuses([{
+                'instance_uuid': str(uuid.uuid4()), 'status': LambdaInstance.CLUSTER_CREATED,
+                'sequence': 10, 'retries': 3}])
+
+        self.assertFalse(apply_async.called)
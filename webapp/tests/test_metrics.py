@@ -0,0 +1,73 @@
+import uuid
+
+from django.test import TestCase
+from kamaki.clients import ClientError
+from mock import Mock, patch
+from prometheus_client import REGISTRY
+
+from backend import events, metrics
+from backend.models import LambdaInstance
+
+
+def get_sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        for instance_status in (LambdaInstance.STARTED, LambdaInstance.STARTED,
+                                LambdaInstance.PAUSED):
+            instance_uuid = uuid.uuid4()
+            events.create_new_lambda_instance(instance_uuid, 'Lambda Instance')
+            events.update_lambda_instance_status(instance_uuid, instance_status)
+
+    def test_export(self):
+        requests = get_sample('lambda_request_duration_seconds_count',
+                              view='lambdainstance-list', method='GET', status='401')
+        self.client.get('/backend/lambda-instances/')
+
+        with patch('backend.metrics.get_queue_depths',
+                   return_value={'events_queue': 3, 'provisioning_queue': 0}):
+            response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('lambda_instances{status="STARTED"} 2.0', response.content)
+        self.assertIn('lambda_instances{status="PAUSED"} 1.0', response.content)
+        self.assertIn('lambda_celery_queue_messages{queue="events_queue"} 3.0', response.content)
+        self.assertEqual(get_sample('lambda_request_duration_seconds_count',
+                                    view='lambdainstance-list', method='GET', status='401'),
+                         requests + 1)
+
+    def test_export_not_allowed(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_cloud_api(self):
+        self.assertEqual(metrics.get_endpoint('/servers/666976/action?x=1'), 'servers/{id}/action')
+        labels = {'service': 'compute', 'method': 'POST', 'endpoint': 'servers/{id}/action'}
+        calls = get_sample('lambda_cloud_api_duration_seconds_count', **labels)
+        errors = get_sample('lambda_cloud_api_errors_total', status='409', **labels)
+
+        self.assertEqual(metrics.observe_cloud_api('compute', 'post', '/servers/1/action',
+                                                   lambda: 'result'), 'result')
+        with self.assertRaises(ClientError):
+            metrics.observe_cloud_api('compute', 'post', '/servers/2/action',
+                                      Mock(side_effect=ClientError('Conflict', status=409)))
+
+        self.assertEqual(get_sample('lambda_cloud_api_duration_seconds_count', **labels),
+                         calls + 2)
+        self.assertEqual(get_sample('lambda_cloud_api_errors_total', status='409', **labels),
+                         errors + 1)
+
+    def test_task_duration(self):
+        labels = {'task': 'backend.tasks.lambda_instance_start', 'state': 'SUCCESS'}
+        durations = get_sample('lambda_celery_task_duration_seconds_count', **labels)
+
+        task = Mock()
+        task.name = labels['task']
+        metrics.on_task_prerun(task_id='1')
+        metrics.on_task_postrun(task_id='1', task=task, state='SUCCESS')
+
+        self.assertEqual(get_sample('lambda_celery_task_duration_seconds_count', **labels),
+                         durations + 1)
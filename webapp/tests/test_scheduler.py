@@ -0,0 +1,168 @@
+import json
+import uuid
+from datetime import timedelta
+
+from celery.exceptions import Retry
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import Mock, patch
+from rest_framework.test import APITestCase
+
+from backend import events, scheduler
+from backend.models import User, LambdaInstance, ScheduledOperation
+from backend.tasks import lambda_instance_start
+from tests import get_provisioner_response, specs
+
+
+def submit(operation, owner, project_name='lambda.grnet.gr', instance_uuid=None):
+    return scheduler.submit(Mock(), (), [(instance_uuid or str(uuid.uuid4()), operation,
+                                          project_name)], owner)
+
+
+@override_settings(SCHEDULER_MAX_RUNNING=1)
+class TestScheduler(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(uuid='user{}'.format(index)) for index in range(3)]
+
+    def get_order(self):
+        return [task.task_id for task in
+                scheduler.get_order(scheduler.get_tasks(ScheduledOperation.objects.all()))]
+
+    def test_fair_order(self):
+        # The batch of the first user does not delay the operation of the second user.
+        batch = [submit('stop', self.users[0]) for _ in range(3)]
+        other = submit('stop', self.users[1])
+        self.assertEqual(self.get_order(), [batch[0], other, batch[1], batch[2]])
+
+    @override_settings(SCHEDULER_PROJECT_WEIGHTS={'default': 1, 'heavy': 2})
+    def test_project_weights(self):
+        light = [submit('stop', self.users[0], 'light') for _ in range(2)]
+        heavy = [submit('stop', self.users[1], 'heavy') for _ in range(4)]
+        self.assertEqual(self.get_order(), [heavy[0], light[0], heavy[1], heavy[2], light[1],
+                                            heavy[3]])
+
+    def test_priorities(self):
+        start = submit('start', self.users[0])
+        stop = submit('stop', self.users[0])
+        destroy = submit('destroy', self.users[1])
+        self.assertEqual(self.get_order(), [destroy, stop, start])
+
+    def test_acquire(self):
+        first = submit('start', self.users[0])
+        second = submit('destroy', self.users[1])
+
+        # The destroy was requested later, but it runs first.
+        self.assertEqual(scheduler.acquire(first), scheduler.WAITING)
+        self.assertEqual(scheduler.acquire(second), scheduler.STARTED)
+        # Only one task runs at a time.
+        self.assertEqual(scheduler.acquire(first), scheduler.WAITING)
+        scheduler.release(second)
+        self.assertEqual(scheduler.acquire(first), scheduler.STARTED)
+
+        # The tasks that were not sent through the scheduler are not delayed.
+        self.assertEqual(scheduler.acquire(str(uuid.uuid4())), scheduler.STARTED)
+
+    def test_preempt(self):
+        instance_uuid, running_instance_uuid = str(uuid.uuid4()), str(uuid.uuid4())
+        running = submit('stop', self.users[0], instance_uuid=running_instance_uuid)
+        queued = submit('start', self.users[1], instance_uuid=instance_uuid)
+        scheduler.acquire(running)
+
+        self.assertEqual(scheduler.get_queue_position(instance_uuid),
+                         {'operation': 'start', 'position': 1})
+        self.assertTrue(scheduler.preempt(instance_uuid))
+        self.assertIsNone(scheduler.get_queue_position(instance_uuid))
+        self.assertEqual(scheduler.acquire(queued), scheduler.CANCELLED)
+        self.assertFalse(ScheduledOperation.objects.filter(task_id=queued).exists())
+
+        # Running operations are not preempted.
+        self.assertFalse(scheduler.preempt(running_instance_uuid))
+
+    def test_lost_task(self):
+        lost = submit('stop', self.users[0])
+        queued_instance_uuid = str(uuid.uuid4())
+        queued = submit('start', self.users[1], instance_uuid=queued_instance_uuid)
+        scheduler.acquire(lost)
+        self.assertEqual(scheduler.get_queue_position(queued_instance_uuid),
+                         {'operation': 'start', 'position': 1})
+
+        # The running task is dropped once it times out, while the queued task waits for it.
+        expired = timezone.now() - timedelta(hours=7)
+        ScheduledOperation.objects.filter(task_id=lost).update(started_at=expired)
+        ScheduledOperation.objects.filter(task_id=queued).update(created_at=expired)
+        self.assertEqual(scheduler.acquire(queued), scheduler.STARTED)
+        self.assertFalse(ScheduledOperation.objects.filter(task_id=lost).exists())
+        self.assertIsNone(scheduler.get_queue_position(queued_instance_uuid))
+
+    def test_lost_task_positions(self):
+        lost = submit('stop', self.users[0])
+        scheduler.acquire(lost)
+        # The running task of the first user counts as its turn.
+        first_instance_uuid, second_instance_uuid = str(uuid.uuid4()), str(uuid.uuid4())
+        submit('stop', self.users[0], instance_uuid=first_instance_uuid)
+        submit('stop', self.users[1], instance_uuid=second_instance_uuid)
+        self.assertEqual(scheduler.get_queue_position(first_instance_uuid)['position'], 2)
+
+        # The positions are refreshed when the operations of the lost task are dropped.
+        ScheduledOperation.objects.filter(task_id=lost).\
+            update(started_at=timezone.now() - timedelta(hours=7))
+        scheduler.preempt(str(uuid.uuid4()))
+        self.assertFalse(ScheduledOperation.objects.filter(task_id=lost).exists())
+        self.assertEqual(scheduler.get_queue_position(first_instance_uuid)['position'], 1)
+
+    def test_scheduled_task(self):
+        task_id = submit('start', self.users[0])
+        submit('destroy', self.users[1])
+
+        with patch('backend.tasks.utils') as utils, \
+                patch('backend.tasks.events'), \
+                patch.object(lambda_instance_start, 'retry', return_value=Retry()) as retry:
+            lambda_instance_start.apply(('1', 'https://auth', '1234', 1, [2]), task_id=task_id)
+
+        self.assertTrue(retry.called)
+        self.assertFalse(utils.lambda_instance_start.called)
+
+
+class TestScheduledOperations(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuid = str(uuid.uuid4())
+        instance_specs = dict(specs, project_name='lambda.grnet.gr')
+        events.create_new_lambda_instance(self.instance_uuid, 'Lambda Instance',
+                                          json.dumps(instance_specs))
+        events.insert_cluster_info(self.instance_uuid, instance_specs,
+                                   get_provisioner_response())
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STOPPED)
+
+        self.url = '/backend/lambda-instances/{}/'.format(self.instance_uuid)
+
+    @override_settings(SCHEDULER_MAX_RUNNING=0)
+    def test_queued_operation(self):
+        with patch('backend.views.tasks.lambda_instance_start') as start, \
+                patch('backend.views.events.set_lambda_instance_status'):
+            response = self.client.post(self.url + 'start/', HTTP_AUTHORIZATION='Token token1')
+
+        self.assertEqual(response.status_code, 202)
+        task_id = start.apply_async.call_args[1]['task_id']
+        operation = ScheduledOperation.objects.get(task_id=task_id)
+        self.assertEqual(operation.operation, ScheduledOperation.START)
+        self.assertEqual(operation.owner, self.user)
+        self.assertEqual(operation.project_name, 'lambda.grnet.gr')
+
+        # The status shows the position of the queued operation.
+        events.update_lambda_instance_status(self.instance_uuid, LambdaInstance.STARTING)
+        response = self.client.get(self.url + 'status/')
+        self.assertEqual(response.data['queue'], {'operation': 'start', 'position': 1})
+
+        # The queued start is preempted by a destroy.
+        with patch('backend.views.tasks.lambda_instance_destroy'), \
+                patch('backend.views.events.set_lambda_instance_status'):
+            response = self.client.delete(self.url, HTTP_AUTHORIZATION='Token token1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(scheduler.acquire(task_id), scheduler.CANCELLED)
+        response = self.client.get(self.url + 'status/')
+        self.assertEqual(response.data['queue'], {'operation': 'destroy', 'position': 1})
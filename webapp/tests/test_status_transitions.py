@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from backend.models import User, LambdaInstance, LambdaInstanceStatusTransition
+
+
+def at(minute):
+    return datetime(2016, 3, 1, 12, minute, tzinfo=timezone.utc)
+
+
+class TestStageDurations(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        # The first lambda instance failed while installing Apache Hadoop and was resumed.
+        self.create_transitions(uuid.uuid4(), [
+            (LambdaInstance.PENDING, 0), (LambdaInstance.CLUSTER_CREATED, 4),
+            (LambdaInstance.INIT_DONE, 5), (LambdaInstance.COMMONS_INSTALLED, 7),
+            (LambdaInstance.CLUSTER_FAILED, 9), (LambdaInstance.COMMONS_INSTALLED, 20),
+            (LambdaInstance.HADOOP_INSTALLED, 26)])
+        self.create_transitions(uuid.uuid4(), [
+            (LambdaInstance.PENDING, 30), (LambdaInstance.CLUSTER_CREATED, 32),
+            (LambdaInstance.INIT_DONE, 33), (LambdaInstance.COMMONS_INSTALLED, 35),
+            (LambdaInstance.HADOOP_INSTALLED, 37)])
+
+    def create_transitions(self, instance_uuid, transitions):
+        for status, minute in transitions:
+            LambdaInstanceStatusTransition.objects.create(
+                instance_uuid=instance_uuid, status=status, timestamp=at(minute))
+
+    def get_stages(self, query=''):
+        response = self.client.get('/backend/status-transitions/stage-durations/' + query)
+        self.assertEqual(response.status_code, 200)
+        return {stage['stage']: stage for stage in response.data}
+
+    def test_stage_durations(self):
+        stages = self.get_stages('?since=2016-03-01T00:00:00Z&until=2016-03-02T00:00:00Z')
+
+        self.assertEqual(stages['cluster']['builds'], 2)
+        self.assertEqual(stages['cluster']['mean'], 180.0)
+        self.assertEqual(stages['cluster']['p50'], 120.0)
+        self.assertEqual(stages['cluster']['max'], 240.0)
+
+        # The failed attempt to install Apache Hadoop is not taken into account.
+        self.assertEqual(stages['hadoop']['builds'], 2)
+        self.assertEqual(stages['hadoop']['p99'], 360.0)
+
+        self.assertEqual(stages['flink']['builds'], 0)
+        self.assertIsNone(stages['flink']['mean'])
+
+    def test_stage_durations_time_window(self):
+        # Only the stages that ended in the time window are taken into account, even if they
+        # started before it.
+        stages = self.get_stages('?since=2016-03-01T12:10:00Z&until=2016-03-01T12:33:00Z')
+
+        self.assertEqual(stages['hadoop']['builds'], 1)
+        self.assertEqual(stages['hadoop']['max'], 360.0)
+        self.assertEqual(stages['cluster']['builds'], 1)
+        self.assertEqual(stages['cluster']['max'], 120.0)
+        self.assertEqual(stages['init']['builds'], 0)
+
+    def test_bad_time_window(self):
+        response = self.client.get('/backend/status-transitions/stage-durations/?since=yesterday')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,54 @@
+import uuid
+
+from rest_framework.test import APITestCase
+
+from backend import events
+from backend.models import User, LambdaInstance
+
+
+class TestTaskTimings(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+
+        self.instance_uuids = [uuid.uuid4(), uuid.uuid4()]
+        for instance_uuid in self.instance_uuids:
+            LambdaInstance.objects.create(uuid=instance_uuid)
+
+        events.insert_ansible_task_timings(self.instance_uuids[0], [
+            {'playbook': 'hadoop-install.yml', 'task': 'format hdfs', 'host': 'snf-1.local',
+             'start': 100.0, 'end': 130.0, 'outcome': 'changed'},
+            {'playbook': 'hadoop-install.yml', 'task': 'format hdfs', 'host': 'snf-2.local',
+             'start': 100.0, 'end': 110.0, 'outcome': 'changed'},
+            {'playbook': 'common-install.yml', 'task': 'install java', 'host': 'snf-1.local',
+             'start': 10.0, 'end': 12.0, 'outcome': 'ok'}])
+        events.insert_ansible_task_timings(self.instance_uuids[1], [
+            {'playbook': 'hadoop-install.yml', 'task': 'format hdfs', 'host': 'snf-3.local',
+             'start': 200.0, 'end': 260.0, 'outcome': 'failed'}])
+
+    def test_instance_task_timings(self):
+        response = self.client.get('/backend/lambda-instances/{}/task-timings/'.
+                                   format(self.instance_uuids[0]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([timing['task'] for timing in response.data],
+                         ['install java', 'format hdfs', 'format hdfs'])
+        self.assertEqual(response.data[1]['duration'], 30.0)
+
+    def test_slowest_tasks(self):
+        response = self.client.get('/backend/task-timings/slowest-tasks/?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['task'], 'format hdfs')
+        self.assertEqual(response.data[0]['builds'], 2)
+        self.assertEqual(response.data[0]['max_duration'], 60.0)
+
+    def test_slowest_hosts(self):
+        response = self.client.get('/backend/task-timings/slowest-hosts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([host['host'] for host in response.data],
+                         ['snf-3.local', 'snf-1.local', 'snf-2.local'])
+        self.assertEqual(response.data[1]['total_duration'], 32.0)
+
+    def test_bad_limit(self):
+        response = self.client.get('/backend/task-timings/slowest-tasks/?limit=0')
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,17 @@
 # coding=utf8
+import hashlib
+import os
+from datetime import timedelta
+
 from rest_framework.test import APITestCase
+from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
 
-from backend.models import User
+from backend import uploads
+from backend.models import User, ProjectFile, ProjectFileUpload, FileBlob
+from backend.tasks import remove_expired_uploads
 
 
 class TestFileUpload(APITestCase):
@@ -35,3 +44,222 @@ class TestFileUpload(APITestCase):
         self.client.delete('/backend/user_files', {'uuid': uuid})
         response = self.client.get('/backend/user_files')
         self.assertEqual(len(response.data), 0)
+
+    def test_list_files_by_cursor(self):
+        for name in ["test_file_page1", "test_file_page2", "test_file_page3"]:
+            self.upload_test_file(name=name)
+        response = self.client.get('/backend/user_files', {'cursor': '', 'limit': 2})
+        self.assertEqual([f['name'] for f in response.data['results']],
+                         [u'test_file_page1', u'test_file_page2'])
+        response = self.client.get('/backend/user_files',
+                                   {'cursor': response.data['next_cursor'], 'limit': 2})
+        self.assertEqual([f['name'] for f in response.data['results']], [u'test_file_page3'])
+        self.assertIsNone(response.data['next_cursor'])
+
+
+class TestChunkedUpload(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+        self.content = b"0123456789" * 10
+
+    def start_upload(self, name, checksum=None):
+        response = self.client.post('/backend/user_files/uploads/', {
+            'name': name, 'size': len(self.content),
+            'checksum': checksum or hashlib.sha256(self.content).hexdigest()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['uuid']
+
+    def upload_chunk(self, upload_uuid, offset, chunk, checksum=None):
+        return self.client.put('/backend/user_files/uploads/{}/'.format(upload_uuid), chunk,
+                               content_type='application/octet-stream',
+                               HTTP_UPLOAD_OFFSET=str(offset),
+                               HTTP_CHUNK_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest())
+
+    def test_chunked_upload(self):
+        upload_uuid = self.start_upload("test_chunked_upload")
+        response = self.upload_chunk(upload_uuid, 0, self.content[:60])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['offset'], 60)
+
+        response = self.upload_chunk(upload_uuid, 60, self.content[60:])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['checksum'], hashlib.sha256(self.content).hexdigest())
+
+        project_file = ProjectFile.objects.get(name="test_chunked_upload")
+        with open(project_file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(ProjectFileUpload.objects.exists())
+        self.client.delete('/backend/user_files', {'uuid': project_file.uuid})
+
+    def test_resume_upload(self):
+        upload_uuid = self.start_upload("test_resume_upload")
+        self.upload_chunk(upload_uuid, 0, self.content[:30])
+
+        # A chunk that does not match its checksum is discarded.
+        response = self.upload_chunk(upload_uuid, 30, self.content[30:60],
+                                     checksum=hashlib.sha256(b"corrupted").hexdigest())
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/backend/user_files/uploads/{}/'.format(upload_uuid))
+        self.assertEqual(response.data['offset'], 30)
+
+        # A chunk at a different offset than the one expected is rejected.
+        response = self.upload_chunk(upload_uuid, 60, self.content[60:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 30)
+
+        response = self.upload_chunk(upload_uuid, 30, self.content[30:])
+        self.assertEqual(response.status_code, 201)
+        self.client.delete('/backend/user_files', {'uuid': response.data['uuid']})
+
+    def test_file_checksum_mismatch(self):
+        upload_uuid = self.start_upload("test_file_checksum_mismatch",
+                                        checksum=hashlib.sha256(b"another file").hexdigest())
+        response = self.upload_chunk(upload_uuid, 0, self.content)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProjectFile.objects.exists())
+        self.assertFalse(ProjectFileUpload.objects.exists())
+
+    def test_expired_upload(self):
+        upload_uuid = self.start_upload("test_expired_upload")
+        self.upload_chunk(upload_uuid, 0, self.content[:30])
+        ProjectFileUpload.objects.filter(uuid=upload_uuid).\
+            update(update_date=timezone.now() - timedelta(seconds=settings.UPLOAD_EXPIRATION + 1))
+
+        # The abandoned upload can not be resumed and its name is released.
+        response = self.upload_chunk(upload_uuid, 30, self.content[30:])
+        self.assertEqual(response.status_code, 404)
+        other_uuid = self.start_upload("test_expired_upload")
+
+        self.assertEqual(remove_expired_uploads(), 1)
+        self.assertFalse(os.path.exists(uploads.get_partial_file_path(upload_uuid)))
+        self.assertEqual([str(upload.uuid) for upload in ProjectFileUpload.objects.all()],
+                         [str(other_uuid)])
+        self.client.delete('/backend/user_files/uploads/{}/'.format(other_uuid))
+
+
+class TestFileDownload(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.client.force_authenticate(user=self.user)
+        self.content = b"0123456789" * 10
+        self.client.put('/backend/user_files',
+                        {'file': SimpleUploadedFile("test_file_download.csv", self.content)},
+                        format='multipart')
+        self.project_file = ProjectFile.objects.get(name="test_file_download.csv")
+        self.url = '/backend/user_files/{}/download/'.format(self.project_file.uuid)
+
+    def tearDown(self):
+        self.client.delete('/backend/user_files', {'uuid': self.project_file.uuid})
+
+    def test_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['ETag'], '"{}"'.format(self.project_file.checksum))
+
+    def test_download_compressed(self):
+        self.client.put('/backend/user_files',
+                        {'file': SimpleUploadedFile("test_file_download.csv.gz", self.content)},
+                        format='multipart')
+        project_file = ProjectFile.objects.get(name="test_file_download.csv.gz")
+        response = self.client.get('/backend/user_files/{}/download/'.format(project_file.uuid))
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.client.delete('/backend/user_files', {'uuid': project_file.uuid})
+
+    def test_download_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+
+        # The range is ignored if the file has changed.
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_download(self):
+        response = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD='x-sendfile')
+    def test_download_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], self.project_file.path)
+        self.assertEqual(response.content, b'')
+
+    def test_download_of_other_user(self):
+        self.client.force_authenticate(user=User.objects.create(uuid='another_user'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestDeduplicatedStorage(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(uuid='209230923ur92r029u3r')
+        self.content = b"the same dataset"
+
+    def upload(self, user, name):
+        self.client.force_authenticate(user=user)
+        response = self.client.put('/backend/user_files',
+                                   {'file': SimpleUploadedFile(name, self.content)},
+                                   format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return ProjectFile.objects.get(owner=user, name=name)
+
+    def delete(self, project_file):
+        self.client.force_authenticate(user=project_file.owner)
+        self.client.delete('/backend/user_files', {'uuid': project_file.uuid})
+
+    def test_identical_uploads_share_a_blob(self):
+        first_file = self.upload(self.user, "test_dedup_first")
+        second_file = self.upload(User.objects.create(uuid='another_user'), "test_dedup_second")
+
+        blob = FileBlob.objects.get()
+        self.assertEqual(blob.references, 2)
+        self.assertEqual(first_file.path, second_file.path)
+        self.assertTrue(blob.path.endswith(hashlib.sha256(self.content).hexdigest()))
+
+        # The content is deleted along with the last file that has it.
+        self.delete(first_file)
+        self.assertEqual(FileBlob.objects.get().references, 1)
+        self.assertTrue(os.path.isfile(blob.path))
+        self.delete(second_file)
+        self.assertFalse(FileBlob.objects.exists())
+        self.assertFalse(os.path.isfile(blob.path))
+
+    def test_chunked_upload_of_owned_content(self):
+        project_file = self.upload(self.user, "test_dedup_owned")
+
+        # An upload of content the user already has completes without receiving it again.
+        response = self.client.post('/backend/user_files/uploads/', {
+            'name': "test_dedup_copy", 'size': len(self.content),
+            'checksum': hashlib.sha256(self.content).hexdigest()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], "test_dedup_copy")
+        self.assertEqual(FileBlob.objects.get().references, 2)
+
+        # Content of other users has to be uploaded.
+        self.client.force_authenticate(user=User.objects.create(uuid='another_user'))
+        response = self.client.post('/backend/user_files/uploads/', {
+            'name': "test_dedup_other", 'size': len(self.content),
+            'checksum': hashlib.sha256(self.content).hexdigest()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.delete('/backend/user_files/uploads/{}/'.format(response.data['uuid']))
+
+        self.delete(project_file)
+        self.delete(ProjectFile.objects.get(name="test_dedup_copy"))
@@ -0,0 +1,16 @@
+"""
+Settings for the benchmark_api command, e.g.
+    python manage.py benchmark_api --settings=webapp.benchmark_settings
+The command seeds a large number of lambda instances, servers and files, so it runs on its own
+DataBase, named after the one of the service with a _benchmark suffix, which should be created
+beforehand. The Celery workers and the periodic tasks of the service never use it.
+"""
+
+from webapp.settings import *  # noqa: F401,F403
+from webapp.settings import DATABASES
+
+DATABASES = {
+    'default': dict(DATABASES['default'], NAME=DATABASES['default']['NAME'] + '_benchmark'),
+}
+
+BENCHMARK_DATABASE = True
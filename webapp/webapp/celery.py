@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import os
+import time
 
 from celery import Celery
 
@@ -20,3 +21,12 @@ app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
+
+
+@app.task
+def occupy_worker(seconds):
+    """
+    Keeps a worker process busy for the specified number of seconds. Used by the
+    benchmark_event_latency command to saturate a queue.
+    """
+    time.sleep(seconds)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.8/ref/settings/
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+from datetime import timedelta
 
 BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
 
@@ -43,6 +44,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'backend.metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -114,31 +116,279 @@ STATIC_URL = '/static/'
 from kombu import Queue
 
 CELERY_QUEUES = (
+    # Multi-minute builds of lambda instances.
+    Queue('provisioning_queue', routing_key='provisioning_key'),
+    # Starting, stopping, pausing and destroying lambda instances. Every task of this queue is
+    # sent through backend.scheduler, which counts the processes of the lifecycle worker, so no
+    # other tasks are routed here. Resuming a build runs the playbooks of the provisioning queue.
+    Queue('lifecycle_queue', routing_key='lifecycle_key'),
+    # Periodic reconciliation and idle detection of lambda instances, sent by celery beat.
+    Queue('maintenance_queue', routing_key='maintenance_key'),
+    # Transfers of uploaded files into the HDFS of lambda instances.
+    Queue('transfers_queue', routing_key='transfers_key'),
+    # Short DataBase writes. They have their own worker, so that they are never queued behind
+    # the builds of lambda instances.
     Queue('events_queue', routing_key='event_key'),
-    Queue('tasks_queue', routing_key='task_key'),
 )
 
+CELERY_DEFAULT_QUEUE = 'events_queue'
+CELERY_DEFAULT_ROUTING_KEY = 'event_key'
+
+# Status updates are buffered by the events worker and applied in batches (see
+# backend.events.set_lambda_instance_status), which requires the events worker not to limit the
+# number of prefetched messages. The workers of the long running tasks reserve one task at a
+# time instead, so that a task never waits behind a build while another process is idle. The
+# prefetch multiplier of every worker is set in its environment.
+CELERYD_PREFETCH_MULTIPLIER = int(os.environ.get('CELERYD_PREFETCH_MULTIPLIER', 0))
+
 CELERY_ROUTES = {
+    'backend.tasks.create_lambda_instance': {
+        'queue': 'provisioning_queue',
+        'routing_key': 'provisioning_key',
+    },
+    'backend.tasks.lambda_instance_resume': {
+        'queue': 'provisioning_queue',
+        'routing_key': 'provisioning_key',
+    },
     'backend.tasks.lambda_instance_start': {
-        'queue': 'tasks_queue',
-        'routing_key': 'task_key',
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
+    },
+    'backend.tasks.lambda_instance_pause': {
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
+    },
+    'backend.tasks.lambda_instance_unpause': {
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
     },
     'backend.tasks.lambda_instance_stop': {
-        'queue': 'tasks_queue',
-        'routing_key': 'task_key',
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
     },
     'backend.tasks.lambda_instance_destroy': {
-        'queue': 'tasks_queue',
-        'routing_key': 'task_key',
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
+    },
+    'backend.tasks.lambda_instances_bulk_operation': {
+        'queue': 'lifecycle_queue',
+        'routing_key': 'lifecycle_key',
+    },
+    'backend.tasks.reconcile_lambda_instances': {
+        'queue': 'maintenance_queue',
+        'routing_key': 'maintenance_key',
+    },
+    'backend.tasks.detect_idle_lambda_instances': {
+        'queue': 'maintenance_queue',
+        'routing_key': 'maintenance_key',
+    },
+    'backend.tasks.push_file_to_hdfs': {
+        'queue': 'transfers_queue',
+        'routing_key': 'transfers_key',
+    },
+    'backend.tasks.remove_expired_uploads': {
+        'queue': 'transfers_queue',
+        'routing_key': 'transfers_key',
+    },
+    'backend.events.create_new_lambda_instance': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
     },
     'backend.events.set_lambda_instance_status': {
         'queue': 'events_queue',
         'routing_key': 'event_key',
     },
+    'backend.events.update_hdfs_transfer': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
+    'backend.events.update_lambda_instance_activities': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
+    'backend.events.insert_cluster_info': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
+    'backend.events.insert_ansible_task_timings': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
+    'backend.events.publish_lambda_instance_events': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
+    'backend.events.retry_lambda_instance_status': {
+        'queue': 'events_queue',
+        'routing_key': 'event_key',
+    },
 }
 
+# Progress events of lambda instances #
+# Seconds between two checks for new events, while a client is waiting for them. A check reads
+# the cache, and the DataBase is only queried after new events have been published.
+LAMBDA_INSTANCE_EVENTS_POLL_INTERVAL = 1
+# Maximum seconds a long-poll request waits for new events.
+LAMBDA_INSTANCE_EVENTS_TIMEOUT = 30
+# Seconds after which a server-sent events stream is closed. Clients reconnect and resume the
+# stream using the Last-Event-ID header.
+LAMBDA_INSTANCE_EVENTS_STREAM_DURATION = 300
+# Seconds between the comment lines that keep an idle server-sent events stream open.
+LAMBDA_INSTANCE_EVENTS_KEEP_ALIVE_INTERVAL = 15
+# Every waiting request holds a process of the web server, so at most
+# LAMBDA_INSTANCE_EVENTS_MAX_WAITING long-poll requests and streams wait for events at a time.
+# Above it, a long-poll request without new events is answered with "503 Service Unavailable" and
+# a stream is closed after the events published so far, and the clients retry after
+# LAMBDA_INSTANCE_EVENTS_BUSY_RETRY seconds.
+LAMBDA_INSTANCE_EVENTS_MAX_WAITING = 10
+LAMBDA_INSTANCE_EVENTS_BUSY_RETRY = 10
+# A status update of a lambda instance that has not been inserted into the DataBase yet is sent
+# again after LAMBDA_INSTANCE_STATUS_RETRY_DELAY seconds, at most
+# LAMBDA_INSTANCE_STATUS_MAX_RETRIES times, keeping its original sequence number.
+LAMBDA_INSTANCE_STATUS_RETRY_DELAY = 2
+LAMBDA_INSTANCE_STATUS_MAX_RETRIES = 30
+
 FILE_STORAGE = os.path.join(BASE_DIR, 'uploaded_files')
 
+# Maximum size of every chunk of a chunked upload, in bytes. It should be lower than the
+# LimitRequestBody of the web server.
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Chunked uploads that do not receive a chunk for UPLOAD_EXPIRATION seconds are abandoned. Their
+# names are released, and they are removed with their partial files every
+# UPLOAD_CLEANUP_INTERVAL seconds.
+UPLOAD_EXPIRATION = 24 * 60 * 60
+UPLOAD_CLEANUP_INTERVAL = 60 * 60
+
+# How the web server is asked to send the downloaded files, instead of the workers of the
+# service. One of 'x-sendfile' (Apache with mod_xsendfile), 'x-accel-redirect' (nginx) or None,
+# to stream the files from the workers. For nginx, FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX is the
+# internal location that is an alias of FILE_STORAGE.
+FILE_DOWNLOAD_OFFLOAD = None
+FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX = '/protected-files/'
+
+# Uploaded files are transferred into the HDFS of the lambda instances through HttpFS, that runs
+# on the masters. Every file is sent in HDFS_TRANSFER_PARALLELISM parts concurrently, and the
+# progress of a transfer is stored every HDFS_TRANSFER_PROGRESS_INTERVAL seconds.
+HDFS_TRANSFER_PORT = 14000
+HDFS_TRANSFER_USER = 'hduser'
+HDFS_TRANSFER_BLOCK_SIZE = 128 * 1024 * 1024
+HDFS_TRANSFER_PARALLELISM = 4
+HDFS_TRANSFER_PROGRESS_INTERVAL = 2
+
+# Bulk lifecycle operations start, stop or destroy up to LIFECYCLE_BULK_MAX_INSTANCES lambda
+# instances with one task, that sends up to LIFECYCLE_BULK_PARALLELISM requests to ~okeanos
+# concurrently and lists the VMs every LIFECYCLE_BULK_POLL_INTERVAL seconds, for at most
+# LIFECYCLE_BULK_MAX_WAIT seconds.
+LIFECYCLE_BULK_MAX_INSTANCES = 100
+LIFECYCLE_BULK_PARALLELISM = 8
+LIFECYCLE_BULK_POLL_INTERVAL = 5
+LIFECYCLE_BULK_MAX_WAIT = 20 * 60
+
+# The statuses of the lambda instances are reconciled with the state of their VMs every
+# RECONCILIATION_INTERVAL seconds, by listing the VMs of the ~okeanos accounts whose tokens are in
+# RECONCILIATION_AUTH_TOKENS. VMs deleted in the last RECONCILIATION_DELETED_WINDOW seconds are
+# listed as well. Lifecycle statuses that have not changed for RECONCILIATION_STALE_AFTER seconds
+# are considered to belong to tasks that crashed.
+RECONCILIATION_AUTH_TOKENS = []
+RECONCILIATION_INTERVAL = 10 * 60
+RECONCILIATION_DELETED_WINDOW = 24 * 60 * 60
+RECONCILIATION_STALE_AFTER = 60 * 60
+
+# The activity of the services of every started lambda instance is sampled every
+# IDLE_DETECTION_INTERVAL seconds, up to IDLE_DETECTION_PARALLELISM lambda instances at a time.
+# IDLE_SUSPEND_POLICIES maps the names of ~okeanos projects to the idle policy of their lambda
+# instances, with the 'default' policy used for the rest: a lambda instance is stopped after it
+# has been idle for idle_after seconds (None to never stop it), and its owner is notified
+# notify_before seconds earlier.
+IDLE_DETECTION_INTERVAL = 15 * 60
+IDLE_DETECTION_PARALLELISM = 16
+IDLE_DETECTION_TIMEOUT = 5
+IDLE_SUSPEND_POLICIES = {
+    'default': {'idle_after': 24 * 60 * 60, 'notify_before': 2 * 60 * 60},
+}
+
+# The lifecycle operations are run in the order of the scheduler (see backend.scheduler). At most
+# SCHEDULER_MAX_RUNNING tasks, the concurrency of the lifecycle worker, run at a time, and the
+# queued tasks check for their turn every SCHEDULER_RETRY_INTERVAL seconds. The operations of
+# tasks that have not ended SCHEDULER_OPERATION_TIMEOUT seconds after they started are dropped.
+# SCHEDULER_PROJECT_WEIGHTS maps the names of ~okeanos projects to their share of the turns, with
+# the 'default' weight used for the rest. The builds are admitted in the same fair order.
+SCHEDULER_MAX_RUNNING = 2
+SCHEDULER_RETRY_INTERVAL = 5
+SCHEDULER_OPERATION_TIMEOUT = 6 * 60 * 60
+SCHEDULER_PROJECT_WEIGHTS = {
+    'default': 1,
+}
+
+# Admission control of the builds of lambda instances. At most ADMISSION_MAX_BUILDS builds, the
+# concurrency of the provisioning worker, and ADMISSION_MAX_BUILDS_PER_PROJECT builds of every
+# ~okeanos project are in progress at a time. Up to ADMISSION_MAX_QUEUED_PER_PROJECT builds of
+# every project wait for their turn, checking every ADMISSION_RETRY_INTERVAL seconds, and they are
+# rejected after ADMISSION_QUEUE_TIMEOUT seconds. The reservations of builds that have not ended
+# after ADMISSION_RESERVATION_TIMEOUT seconds are dropped.
+ADMISSION_MAX_BUILDS = 4
+ADMISSION_MAX_BUILDS_PER_PROJECT = 2
+ADMISSION_MAX_QUEUED_PER_PROJECT = 20
+ADMISSION_RETRY_INTERVAL = 10
+ADMISSION_QUEUE_TIMEOUT = 2 * 60 * 60
+ADMISSION_RESERVATION_TIMEOUT = 6 * 60 * 60
+
+CELERYBEAT_SCHEDULE = {
+    'reconcile-lambda-instances': {
+        'task': 'backend.tasks.reconcile_lambda_instances',
+        'schedule': timedelta(seconds=RECONCILIATION_INTERVAL),
+    },
+    'detect-idle-lambda-instances': {
+        'task': 'backend.tasks.detect_idle_lambda_instances',
+        'schedule': timedelta(seconds=IDLE_DETECTION_INTERVAL),
+    },
+    'remove-expired-uploads': {
+        'task': 'backend.tasks.remove_expired_uploads',
+        'schedule': timedelta(seconds=UPLOAD_CLEANUP_INTERVAL),
+    },
+}
+
+# Verified ~okeanos tokens are cached, in memory and in the database, until they expire or
+# TOKEN_VERIFICATION_TIMEOUT seconds have passed since they were verified with Astakos.
+TOKEN_VERIFICATION_TIMEOUT = 5 * 24 * 60 * 60
+TOKEN_VERIFICATION_CACHE_SIZE = 1000
+
+# Seconds that a request waits for a verification of the same token that is in progress.
+TOKEN_VERIFICATION_WAIT = 10
+
+# The directory where every process of the web server and of the Celery workers writes its
+# Prometheus metrics, so that they are aggregated by the /metrics endpoint. It must be writable
+# by all of them. If it is None, the endpoint only exports the metrics of the process that
+# serves it.
+METRICS_DIRECTORY = None
+
+# The addresses that are allowed to read the /metrics endpoint.
+METRICS_ALLOWED_ADDRESSES = ('127.0.0.1',)
+
+# Cache of the representations of the lambda instances, the events versions, the number of
+# requests that wait for events and the queue positions of the scheduler and the admission
+# control. They are written by the Celery workers and read by the web server, so the cache must be
+# shared by all the processes. The tests, that run in a single process, use a local memory cache
+# instead (see conftest.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }
+}
+# Seconds after which the cached representations of a lambda instance expire, even if the
+# lambda instance has not been updated.
+LAMBDA_INSTANCE_CACHE_TIMEOUT = 60 * 60
+
+# Number of objects in every page of the lists that are paginated by a cursor.
+PAGINATION_DEFAULT_LIMIT = 20
+PAGINATION_MAX_LIMIT = 1000
+
+# Whether the DataBase is a dedicated one, that the benchmark_api command may seed with lambda
+# instances. It is only set by webapp.benchmark_settings.
+BENCHMARK_DATABASE = False
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework_xml.renderers.XMLRenderer',
@@ -15,6 +15,9 @@ Including another URLconf
 """
 from django.conf.urls import include, url
 
+from backend.views import export_metrics
+
 urlpatterns = [
     url(r'^backend/', include('backend.urls')),
+    url(r'^metrics/?$', export_metrics),
 ]